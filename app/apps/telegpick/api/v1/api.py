@@ -3,8 +3,18 @@ from uuid import UUID
 from fastapi import APIRouter, Depends, File, Form, Query, UploadFile, status
 from fastapi.responses import FileResponse, ORJSONResponse
 
-from app.apps.telegpick.dtos import ListPicsDTO, PicsDTO, SchedulesDTO
+from app.apps.telegpick.dtos import (
+    BulkPicsDTO,
+    BulkPicsResultDTO,
+    BulkSchedulesDTO,
+    BulkSchedulesResultDTO,
+    ListPicsDTO,
+    PicsDTO,
+    SchedulesDTO,
+)
 from app.apps.telegpick.use_cases import (
+    BulkPicsForUserUseCase,
+    BulkSchedulesForPicUseCase,
     CreatePicForUserUseCase,
     CreateScheduleForPicUseCase,
     DeletePicForUserUseCase,
@@ -15,6 +25,7 @@ from app.apps.telegpick.use_cases import (
     ReturnPicFileByIdUseCase,
     UploadPicOnDiskUseCase,
 )
+from app.apps.telegpick.utils import UTC_OFFSET_PATTERN, encode_cursor
 from app.apps.users.dependencies import get_current_user
 from app.apps.users.models import Users
 from app.lib.classes import MessageDTO
@@ -30,10 +41,12 @@ router: APIRouter = APIRouter(
 async def get_pics(
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
+    cursor: str | None = Query(None),
     user: Users = Depends(get_current_user),
 ) -> ListPicsDTO:
-    pics = await FetchPicsForUserUseCase(user=user, page=page, limit=limit).execute()
-    return ListPicsDTO(pics=pics)
+    pics = await FetchPicsForUserUseCase(user=user, page=page, limit=limit, cursor=cursor).execute()
+    next_cursor = encode_cursor(UUID(str(pics[-1].id))) if len(pics) == limit else None
+    return ListPicsDTO(pics=pics, next_cursor=next_cursor)
 
 
 @router.post('/pic/create', response_model=PicsDTO, status_code=status.HTTP_201_CREATED)
@@ -49,6 +62,11 @@ async def patch_pic(
     return PicsDTO.from_orm(await PatchPicForUserUseCase(pic=pic, user=user).execute())
 
 
+@router.post('/pic/bulk', response_model=BulkPicsResultDTO, status_code=status.HTTP_200_OK)
+async def bulk_pics(operations: BulkPicsDTO, user: Users = Depends(get_current_user)) -> BulkPicsResultDTO:
+    return await BulkPicsForUserUseCase(operations=operations, user=user).execute()
+
+
 @router.delete('/{pic_id}/delete', response_model=MessageDTO, status_code=status.HTTP_200_OK)
 async def delete_pic(
     pic_id: str,
@@ -68,6 +86,13 @@ async def patch_schedule(schedule: SchedulesDTO, pic_id: str) -> SchedulesDTO:
     return SchedulesDTO.from_orm(await PatchScheduleForPicUseCase(schedule=schedule, pic_id=pic_id).execute())
 
 
+@router.post('/{pic_id}/schedule/bulk', response_model=BulkSchedulesResultDTO, status_code=status.HTTP_200_OK)
+async def bulk_schedules(
+    operations: BulkSchedulesDTO, pic_id: str, user: Users = Depends(get_current_user)
+) -> BulkSchedulesResultDTO:
+    return await BulkSchedulesForPicUseCase(pic_id=pic_id, operations=operations, user=user).execute()
+
+
 @router.delete('/{pic_id}/{schedule_id}/delete', response_model='', status_code=status.HTTP_200_OK)
 async def delete_schedule(schedule_id: str, pic_id: str, user: Users = Depends(get_current_user)) -> MessageDTO:
     await DeleteScheduleForPicUseCase(pic_id=pic_id, schedule_id=schedule_id).execute()
@@ -78,13 +103,19 @@ async def delete_schedule(schedule_id: str, pic_id: str, user: Users = Depends(g
 async def upload(
     file: UploadFile = File(...),
     filename: str = Form(...),
-    timezone: str = Form(...),
+    timezone: str | None = Form(None, regex=UTC_OFFSET_PATTERN.pattern),
+    zone: str | None = Form(None, max_length=64),
     user: Users = Depends(get_current_user),
 ) -> MessageDTO:
-    await UploadPicOnDiskUseCase(file=file, filename=filename, timezone=timezone, user=user).execute()
+    await UploadPicOnDiskUseCase(file=file, filename=filename, timezone=timezone, zone=zone, user=user).execute()
     return MessageDTO(message=f'Successfully uploaded file {filename}!')
 
 
 @router.get("/{pic_id}/picture")
-async def get_picture(pic_id: str, user: Users = Depends(get_current_user)) -> FileResponse:
-    return await ReturnPicFileByIdUseCase(pic_id).execute()
+async def get_picture(
+    pic_id: str,
+    thumbnail: bool = Query(False),
+    version: str | None = Query(None, alias='v'),
+    user: Users = Depends(get_current_user),
+) -> FileResponse:
+    return await ReturnPicFileByIdUseCase(pic_id, thumbnail=thumbnail, version=version).execute()
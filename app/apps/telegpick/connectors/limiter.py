@@ -0,0 +1,150 @@
+import asyncio
+import time
+import weakref
+from functools import lru_cache
+
+from redis import asyncio as aioredis
+from redis.commands.core import AsyncScript
+
+from app.core.logging_conf import get_logger
+
+logger = get_logger(__name__)
+
+
+class TokenBucket:
+    """
+    Token bucket, that lets `capacity` calls through at once and `rate` calls per second after that.
+    Calls reserve tokens in advance, so waiting callers are served in order without any locks
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+
+    @property
+    def blocked_for(self) -> float:
+        return max(self._blocked_until - time.monotonic(), 0.0)
+
+    @property
+    def is_idle(self) -> bool:
+        now = time.monotonic()
+        return self._blocked_until <= now and self._tokens + (now - self._updated_at) * self.rate >= self.capacity
+
+    def reserve(self) -> float:
+        """Takes a token and returns how many seconds to wait before using it"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate) - 1
+        self._updated_at = now
+        return max(-self._tokens / self.rate, self._blocked_until - now, 0.0)
+
+    def block(self, seconds: float) -> None:
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class RedisTokenBucket:
+    """
+    Token bucket in Redis, so the limit holds for all processes together instead of each of them.
+    Tokens are refilled and reserved by one script on the Redis clock, so processes never race for them
+    """
+
+    KEY = 'telegpick:telegram:global-bucket'
+    # Wait is returned as a string, since Lua numbers are truncated to integers on the way out
+    SCRIPT = """
+        local rate, capacity = tonumber(ARGV[1]), tonumber(ARGV[2])
+        local time = redis.call('TIME')
+        local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+        local tokens = tonumber(state[1]) or capacity
+        local updated_at = tonumber(state[2]) or now
+        tokens = math.min(capacity, tokens + math.max(now - updated_at, 0) * rate) - 1
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+        return tostring(math.max(-tokens / rate, 0))
+    """
+
+    def __init__(self, redis_url: str, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._redis_url = redis_url
+        # Redis connections are bound to the loop they were opened in, so every loop gets its own client
+        self._scripts: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncScript] = weakref.WeakKeyDictionary()
+
+    async def reserve(self) -> float:
+        """Takes a token and returns how many seconds to wait before using it"""
+        loop = asyncio.get_running_loop()
+        if (script := self._scripts.get(loop)) is None:
+            script = self._scripts[loop] = aioredis.from_url(self._redis_url).register_script(self.SCRIPT)
+        return float(await script(keys=[self.KEY], args=[self.rate, self.capacity]))
+
+
+class TelegramRateLimiter:
+    """
+    Global and per account limits for outbound Telegram calls.
+    Global limit is shared by all processes through Redis, if `redis_url` is given, and is per process otherwise.
+    Accounts, that got a FloodWait, are blocked until it's over, so no calls are wasted on them
+    """
+
+    MAX_BUCKETS = 10_000
+
+    def __init__(
+        self,
+        global_rate: float,
+        global_burst: int,
+        account_rate: float,
+        account_burst: int,
+        redis_url: str | None = None,
+    ) -> None:
+        self._global = TokenBucket(global_rate, global_burst)
+        self._shared = RedisTokenBucket(redis_url, global_rate, global_burst) if redis_url else None
+        self._account_rate = account_rate
+        self._account_burst = account_burst
+        self._accounts: dict[str, TokenBucket] = {}
+
+    async def acquire(self, account: str) -> None:
+        account_wait = self._get_bucket(account).reserve()
+        if account_wait:
+            await asyncio.sleep(account_wait)
+        # Global token is taken only when account is ready, so a blocked account doesn't hold it
+        if global_wait := await self._reserve_global():
+            await asyncio.sleep(global_wait)
+
+    async def _reserve_global(self) -> float:
+        if self._shared is not None:
+            try:
+                return await self._shared.reserve()
+            except Exception as e:
+                # Calls aren't stopped by Redis being down, they're only limited per process until it's back
+                logger.warning(f'Error reserving shared Telegram rate limit: {e}')
+        return self._global.reserve()
+
+    def get_wait(self, account: str) -> float:
+        """Seconds left until FloodWait of the account is over"""
+        if (bucket := self._accounts.get(account)) is None:
+            return 0.0
+        return bucket.blocked_for
+
+    def block(self, account: str, seconds: float) -> None:
+        self._get_bucket(account).block(seconds)
+
+    def _get_bucket(self, account: str) -> TokenBucket:
+        if (bucket := self._accounts.get(account)) is None:
+            if len(self._accounts) >= self.MAX_BUCKETS:
+                self._accounts = {key: bucket for key, bucket in self._accounts.items() if not bucket.is_idle}
+            bucket = self._accounts[account] = TokenBucket(self._account_rate, self._account_burst)
+        return bucket
+
+
+@lru_cache
+def get_rate_limiter() -> TelegramRateLimiter:
+    from app.core.init_app import settings
+
+    return TelegramRateLimiter(
+        global_rate=settings.TELEGRAM_GLOBAL_RATE,
+        global_burst=settings.TELEGRAM_GLOBAL_BURST,
+        account_rate=settings.TELEGRAM_ACCOUNT_RATE,
+        account_burst=settings.TELEGRAM_ACCOUNT_BURST,
+        redis_url=settings.TELEGRAM_LIMITER_REDIS_URL,
+    )
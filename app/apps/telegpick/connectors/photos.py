@@ -0,0 +1,56 @@
+from typing import Iterable
+from uuid import UUID
+
+from sqlalchemy import Select, delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from telethon.tl.types import InputPhoto, Photo
+
+from app.apps.telegpick.models import TelegramPhotos
+from app.lib.classes import SQLAlchemySessionBaseUseCase, alchemy_session_decorator
+
+
+class LoadTelegramPhotoUseCase(SQLAlchemySessionBaseUseCase):
+    def __init__(self, pic_id: str) -> None:
+        super().__init__()
+        self.pic_id = pic_id
+
+    @alchemy_session_decorator
+    async def execute(self, session: AsyncSession) -> InputPhoto | None:
+        q = select(TelegramPhotos).where(TelegramPhotos.pic_id == self.pic_id)
+        photo: TelegramPhotos | None = (await session.scalars(q)).first()
+        if not photo:
+            return None
+        return InputPhoto(id=photo.photo_id, access_hash=photo.access_hash, file_reference=photo.file_reference)
+
+
+class SaveTelegramPhotoUseCase(SQLAlchemySessionBaseUseCase):
+    def __init__(self, pic_id: str, photo: Photo | InputPhoto) -> None:
+        super().__init__()
+        self.pic_id = pic_id
+        self.photo = photo
+
+    @alchemy_session_decorator
+    async def execute(self, session: AsyncSession) -> None:
+        values = {
+            'photo_id': self.photo.id,
+            'access_hash': self.photo.access_hash,
+            'file_reference': self.photo.file_reference,
+        }
+        q = (
+            insert(TelegramPhotos)
+            .values(pic_id=self.pic_id, **values)
+            .on_conflict_do_update(index_elements=[TelegramPhotos.pic_id], set_=values)
+        )
+        await session.execute(q)
+
+
+async def pop_telegram_photos(session: AsyncSession, pic_ids: Iterable[str | UUID] | Select) -> list[InputPhoto]:
+    """Drops cached photos of pics, that are deleted or get another file, so they could be deleted from Telegram"""
+    q = (
+        delete(TelegramPhotos)
+        .where(TelegramPhotos.pic_id.in_(pic_ids))
+        .returning(TelegramPhotos.photo_id, TelegramPhotos.access_hash, TelegramPhotos.file_reference)
+    )
+    rows = await session.execute(q, execution_options={'synchronize_session': False})
+    return [InputPhoto(id=photo_id, access_hash=access_hash, file_reference=ref) for photo_id, access_hash, ref in rows]
@@ -0,0 +1,124 @@
+import asyncio
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable
+
+from telethon import TelegramClient
+from telethon.errors import AuthKeyError, UnauthorizedError
+
+from app.core.logging_conf import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class _PooledClient:
+    client: TelegramClient
+    in_use: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class TelegramClientPool:
+    """
+    Pool of connected `TelegramClient`s keyed by user id, so repeated calls for the same account skip MTProto handshake.
+    No more than `max_size` clients are connected at once: least recently used idle clients are disconnected
+    to make room for new ones, and clients idle for more than `idle_ttl` seconds are disconnected as well
+    """
+
+    def __init__(self, max_size: int, idle_ttl: float) -> None:
+        self._max_size = max_size
+        self._idle_ttl = idle_ttl
+        self._clients: OrderedDict[str, _PooledClient] = OrderedDict()
+        self._locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+        self._slots = asyncio.Semaphore(max_size)
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    @asynccontextmanager
+    async def acquire(self, key: str, factory: Callable[[], TelegramClient]) -> AsyncIterator[TelegramClient]:
+        pooled = await self._get(key, factory)
+        pooled.in_use += 1
+        try:
+            yield pooled.client
+        except (ConnectionError, AuthKeyError, UnauthorizedError):
+            # Connection is dead or its auth key is, so there's no reason to keep it for the next caller
+            await self._discard(key, pooled)
+            raise
+        finally:
+            pooled.in_use -= 1
+            pooled.last_used = time.monotonic()
+            await self._evict_idle()
+
+    async def close(self) -> None:
+        for key, pooled in list(self._clients.items()):
+            await self._discard(key, pooled)
+
+    async def _get(self, key: str, factory: Callable[[], TelegramClient]) -> _PooledClient:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+
+        async with lock:
+            await self._evict_idle()
+            pooled = self._clients.get(key)
+            if pooled is None:
+                while self._slots.locked() and await self._evict_lru():
+                    pass
+                await self._slots.acquire()
+                pooled = _PooledClient(client=factory())
+                try:
+                    await pooled.client.connect()
+                except Exception:
+                    self._slots.release()
+                    raise
+                self._clients[key] = pooled
+            elif not pooled.client.is_connected():
+                logger.info(f'Reconnecting telegram client {key}')
+                await pooled.client.connect()
+            self._clients.move_to_end(key)
+            return pooled
+
+    async def _evict_idle(self) -> None:
+        expire_before = time.monotonic() - self._idle_ttl
+        for key, pooled in list(self._clients.items()):
+            if not pooled.in_use and pooled.last_used < expire_before:
+                await self._discard(key, pooled)
+
+    async def _evict_lru(self) -> bool:
+        for key, pooled in self._clients.items():
+            if not pooled.in_use:
+                await self._discard(key, pooled)
+                return True
+        return False
+
+    async def _discard(self, key: str, pooled: _PooledClient) -> None:
+        if self._clients.get(key) is not pooled:
+            return
+        del self._clients[key]
+        self._slots.release()
+        try:
+            await pooled.client.disconnect()
+        except Exception as e:
+            logger.warning(f'Error disconnecting telegram client {key}: {e}')
+
+
+_pools: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, TelegramClientPool] = weakref.WeakKeyDictionary()
+
+
+def get_client_pool() -> TelegramClientPool:
+    """
+    Pool for the running event loop.
+    Telethon clients are bound to the loop they were connected in, so every loop gets its own pool
+    """
+    from app.core.init_app import settings
+
+    loop = asyncio.get_running_loop()
+    if (pool := _pools.get(loop)) is None:
+        pool = _pools[loop] = TelegramClientPool(
+            max_size=settings.TELEGRAM_POOL_SIZE, idle_ttl=settings.TELEGRAM_POOL_IDLE_TTL
+        )
+    return pool
@@ -0,0 +1,111 @@
+import asyncio
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from telethon.sessions import SQLiteSession, StringSession
+
+from app.apps.telegpick.models import TelegramSessions
+from app.core.logging_conf import get_logger
+from app.lib.classes import SQLAlchemySessionBaseUseCase, alchemy_session_decorator
+
+logger = get_logger(__name__)
+
+
+class LoadTelegramSessionUseCase(SQLAlchemySessionBaseUseCase):
+    def __init__(self, user_id: str) -> None:
+        super().__init__()
+        self.user_id = user_id
+
+    @alchemy_session_decorator
+    async def execute(self, session: AsyncSession) -> str | None:
+        q = select(TelegramSessions.session).where(TelegramSessions.user_id == self.user_id)
+        return (await session.scalars(q)).first()
+
+
+class SaveTelegramSessionUseCase(SQLAlchemySessionBaseUseCase):
+    def __init__(self, user_id: str, telegram_session: str) -> None:
+        super().__init__()
+        self.user_id = user_id
+        self.telegram_session = telegram_session
+
+    @alchemy_session_decorator
+    async def execute(self, session: AsyncSession) -> None:
+        q = (
+            insert(TelegramSessions)
+            .values(user_id=self.user_id, session=self.telegram_session)
+            .on_conflict_do_update(index_elements=[TelegramSessions.user_id], set_={'session': self.telegram_session})
+        )
+        await session.execute(q)
+
+
+class TelegramSessionStorage:
+    """
+    Telethon sessions stored in Postgres, so any worker on any node could serve any account.
+    Sessions only change on sign in or DC migration, so they are cached in memory and written only when changed.
+    Another worker may sign the account in again meanwhile, so cached ones are reloaded after `ttl` seconds,
+    or right away once they got an auth error
+    """
+
+    def __init__(self, ttl: float = 60) -> None:
+        self._ttl = ttl
+        # Session and the time it's reloaded after, the session is still compared on save once it's expired
+        self._cache: dict[str, tuple[str, float]] = {}
+
+    async def load(self, user_id: str) -> StringSession:
+        cached = self._cache.get(user_id)
+        if cached is None or cached[1] < time.monotonic():
+            telegram_session = await LoadTelegramSessionUseCase(user_id).execute() or ''
+            self._cache[user_id] = (telegram_session, time.monotonic() + self._ttl)
+            return StringSession(telegram_session)
+        return StringSession(cached[0])
+
+    async def save(self, user_id: str, telegram_session: StringSession) -> None:
+        value = telegram_session.save()
+        # Unchanged session isn't written back, so it doesn't overwrite a newer one saved by another worker
+        if not value or ((cached := self._cache.get(user_id)) is not None and cached[0] == value):
+            return
+        await SaveTelegramSessionUseCase(user_id, value).execute()
+        self._cache[user_id] = (value, time.monotonic() + self._ttl)
+
+    def invalidate(self, user_id: str) -> None:
+        self._cache.pop(user_id, None)
+
+
+@lru_cache
+def get_session_storage() -> TelegramSessionStorage:
+    from app.core.init_app import settings
+
+    return TelegramSessionStorage(ttl=settings.TELEGRAM_SESSION_CACHE_TTL)
+
+
+async def import_session_files(directory: str) -> int:
+    """Import `{user_id}.session` SQLite files, that were used before sessions moved to the database"""
+    imported = 0
+    for path in sorted(Path(directory).glob('*.session')):
+        file_session = SQLiteSession(str(path.with_suffix('')))
+        try:
+            value = StringSession.save(file_session)
+        finally:
+            file_session.close()
+        if not value:
+            logger.info(f'Skipping {path}: no auth key')
+            continue
+        try:
+            await SaveTelegramSessionUseCase(path.stem, value).execute()
+        except Exception as e:
+            logger.warning(f'Error importing {path}: {e}')
+            continue
+        imported += 1
+    return imported
+
+
+if __name__ == '__main__':
+    from app.core.config import get_settings
+
+    settings = get_settings()
+    count = asyncio.run(import_session_files(settings.SESSIONS_DIRECTORY))
+    logger.info(f'Imported {count} telegram sessions from {settings.SESSIONS_DIRECTORY}')
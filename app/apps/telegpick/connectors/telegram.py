@@ -1,14 +1,34 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi.concurrency import run_in_threadpool
 from telethon import TelegramClient, functions
+from telethon.errors import AuthKeyError, BadRequestError, FileReferenceExpiredError, FloodWaitError, UnauthorizedError
+from telethon.sessions import StringSession
 from telethon.tl.types import InputPhoto
 
+from app.apps.telegpick.connectors.limiter import get_rate_limiter
+from app.apps.telegpick.connectors.photos import LoadTelegramPhotoUseCase, SaveTelegramPhotoUseCase
+from app.apps.telegpick.connectors.pool import get_client_pool
+from app.apps.telegpick.connectors.sessions import get_session_storage
+from app.apps.telegpick.renditions import get_avatar_path
 from app.apps.users.models import Users
 from app.apps.users.use_cases import UpdatePhoneHashUseCase
+from app.core.logging_conf import get_logger
+
+logger = get_logger(__name__)
 
 
 class TelegramException(Exception):
     pass
 
 
+class TelegramFloodWaitException(TelegramException):
+    def __init__(self, seconds: float) -> None:
+        super().__init__(f'Flood wait for {seconds}s')
+        self.seconds = seconds
+
+
 class TelegramConnector:
     def __init__(self, user: Users) -> None:
         from app.core.init_app import settings
@@ -17,59 +37,117 @@ class TelegramConnector:
         self.api_id = settings.TELEGRAM_API_ID
         self.api_hash = settings.TELEGRAM_API_HASH
         self.pic_directory = settings.PICS_DIRECTORY
-        self.sessions_directory = settings.SESSIONS_DIRECTORY
         self.session = str(user.id)
         self.phone = user.phone
 
     async def send_code(self) -> None:
-        client = TelegramClient(f'{self.sessions_directory}/{self.session}', self.api_id, self.api_hash)
         try:
-            await client.connect()
-            if not await client.is_user_authorized():
-                code_request = await client.send_code_request(self.phone)
-                await UpdatePhoneHashUseCase(self.user, code_request.phone_code_hash).execute()
+            async with self._acquire_client() as client:
+                if not await client.is_user_authorized():
+                    code_request = await client.send_code_request(self.phone)
+                    await UpdatePhoneHashUseCase(self.user, code_request.phone_code_hash).execute()
 
+        except TelegramException:
+            raise
         except Exception as e:
             raise TelegramException(f'Error sending code: {e}')
 
     async def sign_in(self, code: str) -> None:
-        client = TelegramClient(f'{self.sessions_directory}/{self.session}', self.api_id, self.api_hash)
         try:
-            await client.connect()
-            await client.sign_in(phone=self.phone, code=code, phone_code_hash=self.user.phone_hash)
+            async with self._acquire_client() as client:
+                await client.sign_in(phone=self.phone, code=code, phone_code_hash=self.user.phone_hash)
+        except TelegramException:
+            raise
         except Exception as e:
             raise TelegramException(f'Error signing in: {e}')
 
-    async def set_avatar(self, filename: str) -> None:
-        client = TelegramClient(f'{self.sessions_directory}/{self.session}', self.api_id, self.api_hash)
+    async def set_avatar(self, pic_id: str, filename: str) -> None:
+        """
+        Pics, that were already uploaded, are made current again with a metadata-only call,
+        since their photos are kept in the profile instead of being deleted on each change
+        """
         try:
-            await client.connect()
-            await self.delete_avatar(client)
-            input_file = await client.upload_file(f'{self.pic_directory}/{filename}')
-            result = await client(functions.photos.UploadProfilePhotoRequest(file=input_file))
+            async with self._acquire_client() as client:
+                photo = await LoadTelegramPhotoUseCase(pic_id).execute()
+                if not photo or not await self._set_existing_avatar(client, pic_id, photo):
+                    await self._upload_avatar(client, pic_id, filename)
+        except TelegramException:
+            raise
         except Exception as e:
             raise TelegramException(f'Error setting avatar: {e}')
-        finally:
-            await client.disconnect()
 
-    async def delete_avatar(self, client: TelegramClient = None) -> None:
-        if not client:
-            client = TelegramClient(f'{self.sessions_directory}/{self.session}', self.api_id, self.api_hash)
-            try:
-                await client.connect()
-            except Exception as e:
-                raise TelegramException(f'Error connecting to delete existing avatar: {e}')
+    async def _set_existing_avatar(self, client: TelegramClient, pic_id: str, photo: InputPhoto) -> bool:
         try:
-            p = await client.get_profile_photos('me')
-            in_scope = p[0]
-            await client(
-                functions.photos.DeletePhotosRequest(
-                    id=[
-                        InputPhoto(
-                            id=in_scope.id, access_hash=in_scope.access_hash, file_reference=in_scope.file_reference
-                        )
-                    ]
+            result = await client(functions.photos.UpdateProfilePhotoRequest(id=photo))
+        except FileReferenceExpiredError:
+            refreshed = await self._refresh_file_reference(client, photo)
+            if refreshed is None:
+                return False
+            return await self._set_existing_avatar(client, pic_id, refreshed)
+        except BadRequestError as e:
+            # Photo was most likely deleted from the profile by the user
+            logger.info(f'Error reusing photo {photo.id} for pic {pic_id}, uploading it again: {e}')
+            return False
+        await SaveTelegramPhotoUseCase(pic_id, result.photo).execute()
+        return True
+
+    async def _refresh_file_reference(self, client: TelegramClient, photo: InputPhoto) -> InputPhoto | None:
+        async for profile_photo in client.iter_profile_photos('me'):
+            if profile_photo.id == photo.id and profile_photo.file_reference != photo.file_reference:
+                return InputPhoto(
+                    id=profile_photo.id,
+                    access_hash=profile_photo.access_hash,
+                    file_reference=profile_photo.file_reference,
                 )
-            )
+        return None
+
+    async def _upload_avatar(self, client: TelegramClient, pic_id: str, filename: str) -> None:
+        input_file = await client.upload_file(await self._get_upload_path(filename))
+        result = await client(functions.photos.UploadProfilePhotoRequest(file=input_file))
+        await SaveTelegramPhotoUseCase(pic_id, result.photo).execute()
+
+    async def delete_photos(self, photos: list[InputPhoto]) -> None:
+        """Photos of deleted or replaced pics, so they don't pile up in the profile"""
+        try:
+            async with self._acquire_client() as client:
+                await client(functions.photos.DeletePhotosRequest(id=photos))
+        except TelegramException:
+            raise
         except Exception as e:
-            raise TelegramException(f'Error deleting existing avatar: {e}')
+            raise TelegramException(f'Error deleting photos: {e}')
+
+    async def _get_upload_path(self, filename: str) -> str:
+        avatar_path = get_avatar_path(self.pic_directory, filename)
+        if await run_in_threadpool(avatar_path.exists):
+            return str(avatar_path)
+        return f'{self.pic_directory}/{filename}'
+
+    @asynccontextmanager
+    async def _acquire_client(self) -> AsyncIterator[TelegramClient]:
+        limiter = get_rate_limiter()
+        if wait := limiter.get_wait(self.session):
+            raise TelegramFloodWaitException(wait)
+        await limiter.acquire(self.session)
+
+        storage = get_session_storage()
+        telegram_session = await storage.load(self.session)
+        async with get_client_pool().acquire(self.session, lambda: self._create_client(telegram_session)) as client:
+            revoked = False
+            try:
+                yield client
+            except FloodWaitError as e:
+                limiter.block(self.session, e.seconds)
+                raise TelegramFloodWaitException(e.seconds) from e
+            except (AuthKeyError, UnauthorizedError):
+                # Auth key was revoked or replaced by another worker, so the session is reloaded instead of saved
+                revoked = True
+                storage.invalidate(self.session)
+                raise
+            finally:
+                # Auth key is created on the first connect and gets authorized on sign in, so keep it up to date
+                if not revoked:
+                    await storage.save(self.session, client.session)
+
+    def _create_client(self, telegram_session: StringSession) -> TelegramClient:
+        # FloodWait is handled by deferring the call, instead of Telethon sleeping through it
+        return TelegramClient(telegram_session, self.api_id, self.api_hash, flood_sleep_threshold=0)
@@ -1,26 +1,107 @@
 from datetime import datetime
 from uuid import UUID
 
-from pydantic import Field
+from pydantic import Field, validator
 
+from app.apps.telegpick.utils import (
+    DAY_TIME_PATTERN,
+    UTC_OFFSET_PATTERN,
+    format_day_time,
+    format_days_of_week,
+    format_utc_offset,
+    get_zone,
+)
 from app.core.config import get_settings
 from app.core.pydantic_base import BaseModel, BaseModelORM
 
 settings = get_settings()
 
+BULK_MAX_ITEMS = 100
+
 
 class SchedulesDTO(BaseModelORM):
     id: UUID | str | None = None
-    days_of_week: str | None = None
-    day_time: str | None = None
+    # `1010000`, Monday first, it's stored as a bitmask
+    days_of_week: str | None = Field(None, regex=r'^[01]{7}$')
+    # `HH:MM` in pic's timezone, it's stored as a minute of day
+    day_time: str | None = Field(None, regex=DAY_TIME_PATTERN.pattern)
+
+    @validator('days_of_week', pre=True)
+    def format_days_of_week(cls, value: int | str | None) -> str | None:
+        return format_days_of_week(value) if isinstance(value, int) else value
+
+    @validator('day_time', pre=True)
+    def format_day_time(cls, value: int | str | None) -> str | None:
+        return format_day_time(value) if isinstance(value, int) else value
 
 
 class PicsDTO(BaseModelORM):
     id: UUID | str | None = None
-    filename: str | None = None
-    timezone: str | None = None
+    filename: str | None = Field(None, max_length=256)
+    # `+HH:MM`/`-HH:MM`, it's stored as signed minutes. It follows `zone`, if that is set
+    timezone: str | None = Field(None, regex=UTC_OFFSET_PATTERN.pattern)
+    # IANA name, e.g. `Europe/Berlin`, so schedules follow its daylight saving time. Setting `timezone` clears it
+    zone: str | None = Field(None, max_length=64)
     schedules: list[SchedulesDTO] | None = None
+    # Hash of the uploaded content, it's ignored in requests. Pass it as `v` to get the picture cached for good
+    sha256: str | None = None
+
+    @validator('timezone', pre=True)
+    def format_timezone(cls, value: int | str | None) -> str | None:
+        return format_utc_offset(value) if isinstance(value, int) else value
+
+    @validator('zone')
+    def check_zone(cls, value: str | None) -> str | None:
+        if value is not None and get_zone(value) is None:
+            raise ValueError('Unknown time zone')
+        return value
 
 
 class ListPicsDTO(BaseModel):
     pics: list[PicsDTO] = Field(default_factory=list)
+    # Pass it as `cursor` to get the next page, `None` on the last one
+    next_cursor: str | None = None
+
+
+class BulkErrorDTO(BaseModel):
+    operation: str
+    # Position of the failed item in the list of its operation
+    index: int
+    detail: str
+
+
+class BulkPicsDTO(BaseModel):
+    create: list[PicsDTO] = Field(default_factory=list, max_items=BULK_MAX_ITEMS)
+    update: list[PicsDTO] = Field(default_factory=list, max_items=BULK_MAX_ITEMS)
+    delete: list[UUID] = Field(default_factory=list, max_items=BULK_MAX_ITEMS)
+
+
+class BulkPicsResultDTO(BaseModel):
+    created: list[PicsDTO] = Field(default_factory=list)
+    updated: list[PicsDTO] = Field(default_factory=list)
+    deleted: list[UUID] = Field(default_factory=list)
+    errors: list[BulkErrorDTO] = Field(default_factory=list)
+
+
+class BulkSchedulesDTO(BaseModel):
+    create: list[SchedulesDTO] = Field(default_factory=list, max_items=BULK_MAX_ITEMS)
+    update: list[SchedulesDTO] = Field(default_factory=list, max_items=BULK_MAX_ITEMS)
+    delete: list[UUID] = Field(default_factory=list, max_items=BULK_MAX_ITEMS)
+
+
+class BulkSchedulesResultDTO(BaseModel):
+    created: list[SchedulesDTO] = Field(default_factory=list)
+    updated: list[SchedulesDTO] = Field(default_factory=list)
+    deleted: list[UUID] = Field(default_factory=list)
+    errors: list[BulkErrorDTO] = Field(default_factory=list)
+
+
+class TickStatsDTO(BaseModel):
+    done: int = 0
+    failed: int = 0
+    timed_out: int = 0
+    deferred: int = 0
+    # Sent to shard tasks instead of being made by the tick itself
+    dispatched: int = 0
+    # Dropped in favor of another change of the same user
+    coalesced: int = 0
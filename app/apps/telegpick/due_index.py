@@ -0,0 +1,201 @@
+import asyncio
+import datetime
+import weakref
+from typing import AsyncIterable, Iterable, NamedTuple
+from uuid import UUID
+
+import pytz
+from redis import asyncio as aioredis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.apps.telegpick.models import Schedules
+from app.apps.telegpick.utils import DAYS_IN_WEEK, MINUTES_IN_DAY, MINUTES_IN_HOUR
+from app.core.logging_conf import get_logger
+from app.lib.classes import SQLAlchemySessionBaseUseCase, alchemy_session_decorator
+
+logger = get_logger(__name__)
+
+REBUILD_CHUNK_SIZE = 10_000
+
+
+class FireTime(NamedTuple):
+    schedule_id: UUID
+    fire_minute: int | None
+    fire_days: int | None
+
+
+def get_minute_of_week(time: datetime.datetime) -> int:
+    time = time.astimezone(pytz.utc)
+    return time.weekday() * MINUTES_IN_DAY + time.hour * MINUTES_IN_HOUR + time.minute
+
+
+def get_week_ranges(start: datetime.datetime, end: datetime.datetime) -> list[tuple[int, int]]:
+    """Inclusive ranges of UTC minutes of week from `start` to `end`, split in two if they wrap around Sunday"""
+    minutes_in_week = DAYS_IN_WEEK * MINUTES_IN_DAY
+    if (end - start) >= datetime.timedelta(minutes=minutes_in_week - 1):
+        return [(0, minutes_in_week - 1)]
+    first, last = get_minute_of_week(start), get_minute_of_week(end)
+    if first <= last:
+        return [(first, last)]
+    return [(first, minutes_in_week - 1), (0, last)]
+
+
+def get_index_entries(fire_time: FireTime) -> dict[str, int]:
+    """Members of the index for a schedule, with UTC minutes of week they are due at, as a score"""
+    schedule_id, fire_minute, fire_days = fire_time
+    if fire_minute is None or fire_days is None:
+        return {}
+    return {
+        f'{schedule_id}:{day}': day * MINUTES_IN_DAY + fire_minute
+        for day in range(DAYS_IN_WEEK)
+        if fire_days & (1 << day)
+    }
+
+
+def get_schedule_id(member: bytes | str) -> UUID:
+    if isinstance(member, bytes):
+        member = member.decode()
+    return UUID(member.split(':', 1)[0])
+
+
+class ScheduleDueIndex:
+    """
+    Schedules in a Redis sorted set scored by UTC minute of week, so schedules due at a minute are a range read.
+    Postgres stays the source of truth: the index is rebuilt from it, and due schedules are checked against it
+    """
+
+    KEY = 'telegpick:schedules:due'
+
+    def __init__(self, redis_url: str) -> None:
+        self._redis = aioredis.from_url(redis_url)
+
+    async def get_due(self, start: datetime.datetime, end: datetime.datetime) -> set[UUID]:
+        """Schedules due at any minute from `start` to `end`"""
+        due: set[UUID] = set()
+        for first, last in get_week_ranges(start, end):
+            due.update(get_schedule_id(member) for member in await self._redis.zrangebyscore(self.KEY, first, last))
+        return due
+
+    async def update(self, fire_times: Iterable[FireTime]) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            for fire_time in fire_times:
+                pipe.zrem(self.KEY, *self._get_members(fire_time.schedule_id))
+                if entries := get_index_entries(fire_time):
+                    pipe.zadd(self.KEY, entries)
+            await pipe.execute()
+
+    async def remove(self, schedule_ids: Iterable[UUID]) -> None:
+        members = [member for schedule_id in schedule_ids for member in self._get_members(schedule_id)]
+        if members:
+            await self._redis.zrem(self.KEY, *members)
+
+    async def rebuild(self, fire_times: AsyncIterable[FireTime]) -> int:
+        """
+        Index is built aside and swapped in at once, so ticks running meanwhile still read the old one.
+        Fire times are written in chunks as they arrive, so they're never all held in memory.
+        Changes committed during the rebuild only reach the old index, so run it when schedules aren't edited much
+        """
+        tmp_key = f'{self.KEY}:rebuild'
+        await self._redis.delete(tmp_key)
+        count = 0
+        entries: dict[str, int] = {}
+        async for fire_time in fire_times:
+            entries.update(get_index_entries(fire_time))
+            count += 1
+            if len(entries) >= REBUILD_CHUNK_SIZE:
+                await self._redis.zadd(tmp_key, entries)
+                entries = {}
+        if entries:
+            await self._redis.zadd(tmp_key, entries)
+        if await self._redis.exists(tmp_key):
+            await self._redis.rename(tmp_key, self.KEY)
+        else:
+            await self._redis.delete(self.KEY)
+        return count
+
+    async def close(self) -> None:
+        await self._redis.close()
+
+    @staticmethod
+    def _get_members(schedule_id: UUID) -> list[str]:
+        return [f'{schedule_id}:{day}' for day in range(DAYS_IN_WEEK)]
+
+
+_indexes: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ScheduleDueIndex] = weakref.WeakKeyDictionary()
+
+
+def get_due_index() -> ScheduleDueIndex | None:
+    """
+    Index for the running event loop, `None` if it's not enabled.
+    Redis connections are bound to the loop they were opened in, so every loop gets its own client
+    """
+    from app.core.init_app import settings
+
+    if not settings.SCHEDULER_REDIS_URL:
+        return None
+    loop = asyncio.get_running_loop()
+    if (index := _indexes.get(loop)) is None:
+        index = _indexes[loop] = ScheduleDueIndex(settings.SCHEDULER_REDIS_URL)
+    return index
+
+
+async def index_schedules(fire_times: Iterable[FireTime]) -> None:
+    """
+    Called once changes are committed. Failures are only logged, since the change itself is already saved,
+    so schedules may be missed by the index until it's rebuilt
+    """
+    fire_times = list(fire_times)
+    if not fire_times or (index := get_due_index()) is None:
+        return
+    try:
+        await index.update(fire_times)
+    except Exception as e:
+        logger.warning(f'Error indexing {len(fire_times)} schedules, rebuild the due index: {e}')
+
+
+async def unindex_schedules(schedule_ids: Iterable[UUID]) -> None:
+    schedule_ids = list(schedule_ids)
+    if not schedule_ids or (index := get_due_index()) is None:
+        return
+    try:
+        await index.remove(schedule_ids)
+    except Exception as e:
+        # Leftovers are harmless, they're dropped when due schedules are loaded from the database
+        logger.warning(f'Error removing {len(schedule_ids)} schedules from the due index: {e}')
+
+
+async def close_due_index() -> None:
+    loop = asyncio.get_running_loop()
+    if (index := _indexes.pop(loop, None)) is not None:
+        await index.close()
+
+
+class RebuildDueIndexUseCase(SQLAlchemySessionBaseUseCase):
+    """Streams fire times of all schedules into the index with a server side cursor, a chunk at a time"""
+
+    def __init__(self, index: ScheduleDueIndex) -> None:
+        super().__init__()
+        self.index = index
+
+    @alchemy_session_decorator
+    async def execute(self, session: AsyncSession) -> int:
+        q = select(Schedules.id, Schedules.fire_minute, Schedules.fire_days)
+        result = await session.stream(q, execution_options={'yield_per': REBUILD_CHUNK_SIZE})
+        return await self.index.rebuild(FireTime(*row) async for row in result)
+
+
+async def rebuild_due_index() -> int:
+    """Rebuild the index from scratch, e.g. after it was enabled or Redis lost its data"""
+    index = get_due_index()
+    if index is None:
+        raise RuntimeError('Due index is disabled, set SCHEDULER_REDIS_URL to enable it')
+    try:
+        return await RebuildDueIndexUseCase(index).execute()
+    finally:
+        await close_due_index()
+
+
+if __name__ == '__main__':
+    count = asyncio.run(rebuild_due_index())
+    logger.info(f'Rebuilt due index of {count} schedules')
@@ -0,0 +1,44 @@
+import asyncio
+from typing import Iterable
+
+from app.apps.telegpick.dtos import TickStatsDTO
+from app.core.logging_conf import get_logger
+from app.lib.classes import AbstractUseCase
+
+logger = get_logger(__name__)
+
+
+class UseCaseDeferred(Exception):
+    """Raised by a use case, that can't run now and was rescheduled to run later"""
+
+
+class ConcurrentUseCaseExecutor:
+    """
+    Runs use cases concurrently, but no more than `concurrency` at once and no longer than `timeout` seconds each.
+    A failing or hanging use case is only counted in stats, so it can't hold back or break the rest of them
+    """
+
+    def __init__(self, concurrency: int, timeout: float) -> None:
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._timeout = timeout
+        self.stats = TickStatsDTO()
+
+    async def run(self, use_cases: Iterable[AbstractUseCase]) -> TickStatsDTO:
+        await asyncio.gather(*(self._run_one(use_case) for use_case in use_cases))
+        return self.stats
+
+    async def _run_one(self, use_case: AbstractUseCase) -> None:
+        async with self._semaphore:
+            try:
+                await asyncio.wait_for(use_case.execute(), timeout=self._timeout)
+            except UseCaseDeferred as e:
+                self.stats.deferred += 1
+                logger.info(f'{use_case!r} deferred: {e}')
+            except asyncio.TimeoutError:
+                self.stats.timed_out += 1
+                logger.warning(f'{use_case!r} timed out after {self._timeout}s')
+            except Exception as e:
+                self.stats.failed += 1
+                logger.warning(f'{use_case!r} failed: {e}')
+            else:
+                self.stats.done += 1
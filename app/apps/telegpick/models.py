@@ -1,7 +1,8 @@
+import datetime
 import uuid
 from typing import TYPE_CHECKING
 
-from sqlalchemy import ForeignKey, String
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, Integer, LargeBinary, String, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.models import DBBaseModel
@@ -12,20 +13,86 @@ if TYPE_CHECKING:
 
 class Pics(DBBaseModel):
     __tablename__: str = 'pics'
+    # Pics are paged by `id` within a user, see `FetchPicsForUserUseCase`,
+    # and pics of a zone are moved by the scheduler tick, once it switches to or from DST, see `ProcessPicsTaskUseCase`
+    __table_args__ = (
+        Index('ix_pics_user_id_id', 'user_id', 'id'),
+        Index('ix_pics_zone_timezone', 'zone', 'timezone'),
+    )
 
     filename: Mapped[str] = mapped_column(String(length=(256)), nullable=False)
+    # Content of uploaded pics, `None` for pics created with a filename as is
+    sha256: Mapped[str | None] = mapped_column(ForeignKey('pic_files.sha256'), nullable=True, index=True)
     schedules: Mapped[list['Schedules']] = relationship(back_populates='pic', cascade='all, delete')
-    timezone: Mapped[str] = mapped_column(String(6), default='0')
+    # Signed UTC offset in minutes, `None` if it was malformed before offsets were stored as minutes
+    timezone: Mapped[int | None] = mapped_column(Integer, nullable=True, default=0)
+    # IANA zone name, `timezone` is then its current offset, that is moved by the scheduler along with DST
+    zone: Mapped[str | None] = mapped_column(String(length=64), nullable=True)
 
-    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey('users.id'), index=True)
+    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey('users.id'))
     user: Mapped['Users'] = relationship(back_populates='pics')
 
 
+class PicZones(DBBaseModel):
+    __tablename__: str = 'pic_zones'
+
+    # Zones of pics, that scheduler ticks check instead of pics themselves, rows are kept once zones are unused
+    name: Mapped[str] = mapped_column(String(length=64), unique=True, index=True)
+    # Offset, that pics of the zone were last moved to
+    utc_offset: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class PicFiles(DBBaseModel):
+    __tablename__: str = 'pic_files'
+
+    # Files are stored by their content, so identical uploads share one file, see `UploadPicOnDiskUseCase`
+    sha256: Mapped[str] = mapped_column(String(length=64), unique=True, index=True)
+    filename: Mapped[str] = mapped_column(String(length=(256)), nullable=False)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    # Pics referencing the file, it's removed along with the row once none of them are left
+    refs: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+
+
 class Schedules(DBBaseModel):
     __tablename__: str = 'schedules'
-
-    days_of_week: Mapped[str] = mapped_column(String(length=(7)), default='0000000')
-    day_time: Mapped[str] = mapped_column(String(length=(7)), default='00:00')
+    # Bitmask of weekdays in pic's timezone, Monday is the lowest bit, none of them means every day
+    days_of_week: Mapped[int] = mapped_column(Integer, default=0)
+    # Minute of day in pic's timezone, `None` if it was malformed before day times were stored as minutes
+    day_time: Mapped[int | None] = mapped_column(Integer, nullable=True, default=0)
+    # UTC minute of day derived from `day_time` and pic's timezone, so the scheduler doesn't parse them
+    fire_minute: Mapped[int] = mapped_column(Integer, nullable=True)
+    # UTC weekdays derived from `days_of_week`, they are shifted when the timezone moves `fire_minute` to another day
+    fire_days: Mapped[int] = mapped_column(Integer, nullable=True)
+    # Next time the schedule fires at, moved forward by the scheduler, so due rows are a range read of the index
+    next_run_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), nullable=True, index=True)
 
     pic_id: Mapped[uuid.UUID] = mapped_column(ForeignKey('pics.id'), index=True)
     pic: Mapped['Pics'] = relationship(back_populates='schedules')
+
+
+class TelegramSessions(DBBaseModel):
+    __tablename__: str = 'telegram_sessions'
+
+    # Telethon `StringSession`: dc, server address and auth key of the account
+    session: Mapped[str] = mapped_column(Text, nullable=False)
+
+    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), unique=True, index=True)
+
+
+class TelegramPhotos(DBBaseModel):
+    __tablename__: str = 'telegram_photos'
+
+    # Profile photo, that was uploaded to Telegram for the pic, so it could be made current again without re-upload
+    photo_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    access_hash: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    file_reference: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+    pic_id: Mapped[uuid.UUID] = mapped_column(ForeignKey('pics.id', ondelete='CASCADE'), unique=True, index=True)
+
+
+class SchedulerWatermarks(DBBaseModel):
+    __tablename__: str = 'scheduler_watermarks'
+
+    name: Mapped[str] = mapped_column(String(length=64), unique=True, index=True)
+    # Last UTC minute, that the scheduler has looked due schedules up for, `None` until the first tick
+    processed_minute: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), nullable=True)
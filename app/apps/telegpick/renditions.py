@@ -0,0 +1,64 @@
+import os
+from functools import lru_cache
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+from app.lib.processes import ProcessPool
+
+RENDITIONS_DIRECTORY = 'renditions'
+# Telegram shows avatars at most 640x640, anything bigger is only uploaded to be downscaled
+AVATAR_SIZE = 640
+THUMBNAIL_SIZE = 160
+JPEG_QUALITY = 85
+
+
+def get_avatar_path(pics_directory: str, filename: str) -> Path:
+    return Path(pics_directory) / RENDITIONS_DIRECTORY / f'{Path(filename).stem}.avatar.jpg'
+
+
+def get_thumbnail_path(pics_directory: str, filename: str) -> Path:
+    return Path(pics_directory) / RENDITIONS_DIRECTORY / f'{Path(filename).stem}.thumbnail.jpg'
+
+
+def remove_pic_file(pics_directory: str, filename: str) -> None:
+    """Blocking, removes a pic file along with its renditions"""
+    for path in (
+        Path(pics_directory) / filename,
+        get_avatar_path(pics_directory, filename),
+        get_thumbnail_path(pics_directory, filename),
+    ):
+        path.unlink(missing_ok=True)
+
+
+def make_renditions(pics_directory: str, filename: str) -> None:
+    """
+    CPU bound, so run it in a process pool.
+    Makes a square avatar, that's ready to be uploaded to Telegram as is, and a small thumbnail of it
+    """
+    with Image.open(Path(pics_directory) / filename) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        side = min(*image.size, AVATAR_SIZE)
+        avatar = ImageOps.fit(image, (side, side), method=Image.Resampling.LANCZOS)
+
+    _save_jpeg(avatar, get_avatar_path(pics_directory, filename))
+    avatar.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), resample=Image.Resampling.LANCZOS)
+    _save_jpeg(avatar, get_thumbnail_path(pics_directory, filename))
+
+
+def _save_jpeg(image: Image.Image, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    image.save(tmp_path, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    os.replace(tmp_path, path)
+
+
+@lru_cache
+def get_renditions_pool() -> ProcessPool:
+    from app.core.init_app import settings
+
+    return ProcessPool(workers=settings.RENDITIONS_WORKERS)
+
+
+async def create_renditions(pics_directory: str, filename: str) -> None:
+    await get_renditions_pool().run(make_renditions, pics_directory, filename)
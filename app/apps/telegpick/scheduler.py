@@ -0,0 +1,100 @@
+import asyncio
+import signal
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable
+
+import pytz
+
+from app.apps.telegpick.connectors.pool import get_client_pool
+from app.apps.telegpick.due_index import close_due_index
+from app.apps.telegpick.use_cases import ProcessPicsTaskUseCase
+from app.core.db_config import engine
+from app.core.logging_conf import get_logger
+
+logger = get_logger(__name__)
+
+# Ticks starting later than that are logged, since the process is most likely overloaded
+TICK_LAG_WARNING = 5
+
+
+def get_next_tick(now: float, interval: float) -> float:
+    return (now // interval + 1) * interval
+
+
+class MinuteScheduler:
+    """
+    Runs `tick` at every interval boundary of the wall clock, every minute by default, with the boundary as its time.
+    The next boundary is computed from the wall clock every time, so neither slow ticks nor clock adjustments
+    make it drift. Ticks run as tasks, so a slow one doesn't delay the next minute
+    """
+
+    INTERVAL: float = 60
+
+    def __init__(self, tick: Callable[[datetime], Awaitable[Any]], interval: float | None = None) -> None:
+        self._tick = tick
+        self._interval = interval or self.INTERVAL
+        self._stopped = asyncio.Event()
+        self._running: set[asyncio.Task] = set()
+
+    async def run(self) -> None:
+        while not self._stopped.is_set():
+            tick_at = get_next_tick(time.time(), self._interval)
+            if not await self._sleep_until(tick_at):
+                break
+            task = asyncio.create_task(self._run_tick(tick_at))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+        if self._running:
+            logger.info(f'Waiting for {len(self._running)} running ticks to finish')
+            await asyncio.gather(*self._running)
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    async def _sleep_until(self, timestamp: float) -> bool:
+        """Returns `False` if stopped meanwhile. Sleeps again if woken up early, since loop clock isn't wall clock"""
+        while (delay := timestamp - time.time()) > 0:
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                continue
+            return False
+        return True
+
+    async def _run_tick(self, tick_at: float) -> None:
+        if (lag := time.time() - tick_at) > TICK_LAG_WARNING:
+            logger.warning(f'Tick {tick_at} started {lag:.1f}s late')
+        try:
+            await self._tick(datetime.fromtimestamp(tick_at, tz=pytz.utc))
+        except Exception as e:
+            logger.exception(f'Tick {tick_at} failed: {e}')
+
+
+async def process_pics(tick_time: datetime) -> None:
+    await ProcessPicsTaskUseCase(tick_time).execute()
+
+
+async def run_scheduler() -> None:
+    """
+    Runs as a single long-lived process, so DB connections and Telegram clients are reused between ticks.
+    Changes due between ticks are caught up by the next one, so `SCHEDULER_INTERVAL` may be raised under load
+    """
+    from app.core.init_app import settings
+
+    scheduler = MinuteScheduler(process_pics, interval=settings.SCHEDULER_INTERVAL)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, scheduler.stop)
+    logger.info('Scheduler started')
+    try:
+        await scheduler.run()
+    finally:
+        await get_client_pool().close()
+        await close_due_index()
+        await engine.dispose()
+    logger.info('Scheduler stopped')
+
+
+if __name__ == '__main__':
+    asyncio.run(run_scheduler())
@@ -1,23 +1,80 @@
-import asyncio
-import threading
 from datetime import datetime
 
 import pytz
 from asgiref.sync import async_to_sync
+from telethon.tl.types import InputPhoto
 
-from app.apps.telegpick.use_cases import ProcessPicsTaskUseCase
-from app.core.celery_app import celery_app
-
-celery_app.loop = asyncio.new_event_loop()
-celery_app.loop_runner = threading.Thread(
-    target=celery_app.loop.run_forever,
-    daemon=True,
+from app.apps.telegpick.connectors.pool import get_client_pool
+from app.apps.telegpick.due_index import close_due_index
+from app.apps.telegpick.use_cases import (
+    ChangeDeferredAvatarUseCase,
+    DeleteTelegramPhotosUseCase,
+    ProcessPicsShardUseCase,
+    ProcessPicsTaskUseCase,
 )
-celery_app.loop_runner.start()
+from app.core.celery_app import celery_app
+from app.core.db_config import engine
 
 
 @celery_app.task()
 def process_all_pics_task():
     current_time = datetime.now(pytz.utc)
-    async_to_sync(ProcessPicsTaskUseCase(current_time).execute)()
+    async_to_sync(_process_all_pics)(current_time)
     return
+
+
+async def _process_all_pics(current_time: datetime) -> None:
+    try:
+        await ProcessPicsTaskUseCase(current_time).execute()
+    finally:
+        await _release_loop_resources()
+
+
+@celery_app.task()
+def process_pics_shard_task(pic_ids: list[str], due_time: str) -> None:
+    async_to_sync(_process_pics_shard)(pic_ids, datetime.fromisoformat(due_time))
+    return
+
+
+async def _process_pics_shard(pic_ids: list[str], due_time: datetime) -> None:
+    try:
+        await ProcessPicsShardUseCase(pic_ids, due_time).execute()
+    finally:
+        await _release_loop_resources()
+
+
+@celery_app.task()
+def change_avatar_task(pic_id: str, due_time: str) -> None:
+    async_to_sync(_change_deferred_avatar)(pic_id, datetime.fromisoformat(due_time))
+    return
+
+
+async def _change_deferred_avatar(pic_id: str, due_time: datetime) -> None:
+    try:
+        await ChangeDeferredAvatarUseCase(pic_id, due_time, task_time=datetime.now(pytz.utc)).execute()
+    finally:
+        await _release_loop_resources()
+
+
+@celery_app.task()
+def delete_telegram_photos_task(user_id: str, photos: list[list]) -> None:
+    async_to_sync(_delete_telegram_photos)(user_id, photos)
+    return
+
+
+async def _delete_telegram_photos(user_id: str, photos: list[list]) -> None:
+    input_photos = [
+        InputPhoto(id=photo_id, access_hash=access_hash, file_reference=bytes.fromhex(file_reference))
+        for photo_id, access_hash, file_reference in photos
+    ]
+    try:
+        await DeleteTelegramPhotosUseCase(user_id, input_photos).execute()
+    finally:
+        await _release_loop_resources()
+
+
+async def _release_loop_resources() -> None:
+    # `async_to_sync` runs every task in a fresh event loop, so neither clients nor DB connections can outlive it
+    await get_client_pool().close()
+    await close_due_index()
+    await engine.dispose()
@@ -1,21 +1,154 @@
 import datetime
-import re
+import os
 import uuid
-from abc import ABC
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Generic, Iterable, NamedTuple, TypeVar
 from uuid import UUID
 
 import pytz
 from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
-from sqlalchemy import and_, select, update
+from sqlalchemy import (
+    Integer,
+    SQLColumnExpression,
+    and_,
+    any_,
+    bindparam,
+    case,
+    delete,
+    func,
+    insert,
+    literal,
+    null,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.sql.elements import ColumnElement
+from telethon.tl.types import InputPhoto
 
-from app.apps.telegpick.connectors.telegram import TelegramConnector, TelegramException
-from app.apps.telegpick.dtos import PicsDTO, SchedulesDTO
-from app.apps.telegpick.models import Pics, Schedules
+from app.apps.telegpick.connectors.photos import pop_telegram_photos
+from app.apps.telegpick.connectors.telegram import TelegramConnector, TelegramException, TelegramFloodWaitException
+from app.apps.telegpick.dtos import (
+    BulkErrorDTO,
+    BulkPicsDTO,
+    BulkPicsResultDTO,
+    BulkSchedulesDTO,
+    BulkSchedulesResultDTO,
+    PicsDTO,
+    SchedulesDTO,
+    TickStatsDTO,
+)
+from app.apps.telegpick.due_index import FireTime, get_due_index, index_schedules, unindex_schedules
+from app.apps.telegpick.executor import ConcurrentUseCaseExecutor, UseCaseDeferred
+from app.apps.telegpick.models import PicFiles, Pics, PicZones, SchedulerWatermarks, Schedules, TelegramPhotos
+from app.apps.telegpick.renditions import create_renditions, get_thumbnail_path, remove_pic_file
+from app.apps.telegpick.utils import (
+    ALL_DAYS,
+    DAYS_IN_WEEK,
+    MINUTES_IN_DAY,
+    MINUTES_IN_HOUR,
+    decode_cursor,
+    format_utc_offset,
+    get_fire_days,
+    get_fire_minute,
+    get_next_run_at,
+    get_run_times,
+    get_shard,
+    get_zone,
+    get_zone_offset,
+    parse_day_time,
+    parse_days_of_week,
+    parse_utc_offset,
+)
 from app.apps.users.models import Users
-from app.lib.classes import BadRequestException, SQLAlchemySessionBaseUseCase, alchemy_session_decorator
+from app.core.logging_conf import get_logger
+from app.lib.classes import (
+    AbstractUseCase,
+    BadRequestException,
+    SQLAlchemySessionBaseUseCase,
+    alchemy_session_decorator,
+)
+from app.lib.responses import CachedFileResponse
+from app.lib.utils import FileTooLargeError, copy_file_hashed, hash_file
+
+logger = get_logger(__name__)
+
+# Versioned pic urls never change their content, since pic files are stored by it
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+# Other ones are revalidated on every view, which costs a 304 without a body while the pic is the same
+REVALIDATED_CACHE_CONTROL = 'private, no-cache'
+
+
+def get_pic_columns(pic: PicsDTO) -> dict[str, Any]:
+    """Columns set by a pic DTO, `timezone` is stored as signed minutes, and follows `zone` if it's given"""
+    columns = pic.dict(exclude_none=True, exclude={'id', 'schedules', 'sha256'})
+    if 'zone' in columns:
+        columns['timezone'] = get_zone_offset(columns['zone'], datetime.datetime.now(pytz.utc))
+    elif 'timezone' in columns:
+        columns['timezone'] = parse_utc_offset(columns['timezone'])
+        # Fixed offset replaces the zone, so the scheduler doesn't move it anymore
+        columns['zone'] = None
+    return columns
+
+
+async def track_pic_zones(session: AsyncSession, zones: Iterable[str | None]) -> None:
+    """Zones of created or patched pics are tracked with their offsets, see `ProcessPicsTaskUseCase._move_zones`"""
+    now = datetime.datetime.now(pytz.utc)
+    values = [
+        {'name': zone, 'utc_offset': offset}
+        for zone in set(zones)
+        if zone and (offset := get_zone_offset(zone, now)) is not None
+    ]
+    if values:
+        await session.execute(pg_insert(PicZones).values(values).on_conflict_do_nothing(index_elements=[PicZones.name]))
+
+
+async def delete_telegram_photos(user_id: UUID, photos: list[InputPhoto], countdown: float | None = None) -> None:
+    """Photos are deleted from the profile by a task, so pics don't wait for Telegram to be deleted"""
+    from app.core.celery_app import celery_app
+
+    if not photos:
+        return
+    await run_in_threadpool(
+        celery_app.send_task,
+        'app.apps.telegpick.tasks.delete_telegram_photos_task',
+        kwargs={
+            'user_id': str(user_id),
+            'photos': [[photo.id, photo.access_hash, photo.file_reference.hex()] for photo in photos],
+        },
+        countdown=countdown,
+    )
+
+
+async def release_pic_files(session: AsyncSession, hashes: Iterable[str | None]) -> None:
+    """
+    Drops references of deleted pics to their files, files without references left are removed.
+    They're removed before the transaction commits, while their rows are locked, so an upload of the same content
+    waits for it and then stores its file again
+    """
+    from app.core.init_app import settings
+
+    refs = Counter(sha256 for sha256 in hashes if sha256)
+    if not refs:
+        return
+    released = bindparam('released', list(refs), type_=ARRAY(PicFiles.sha256.type))
+    await session.execute(
+        update(PicFiles)
+        .where(PicFiles.sha256 == any_(released))
+        .values(refs=PicFiles.refs - case(refs, value=PicFiles.sha256, else_=0)),
+        execution_options={'synchronize_session': False},
+    )
+    q = delete(PicFiles).where(PicFiles.sha256 == any_(released), PicFiles.refs <= 0).returning(PicFiles.filename)
+    for filename in await session.scalars(q, execution_options={'synchronize_session': False}):
+        await run_in_threadpool(remove_pic_file, settings.PICS_DIRECTORY, filename)
 
 
 class BasePicWithUserUseCase(SQLAlchemySessionBaseUseCase, ABC):
@@ -34,27 +167,41 @@ class BasePicWithUserUseCase(SQLAlchemySessionBaseUseCase, ABC):
 
 
 class FetchPicsForUserUseCase(SQLAlchemySessionBaseUseCase):
-    def __init__(self, user: Users, page: int, limit: int) -> None:
+    """
+    Pages are fetched with `cursor` if it's given, so deep pages cost the same as the first one,
+    `page` is only kept for older clients
+    """
+
+    def __init__(self, user: Users, page: int, limit: int, cursor: str | None = None) -> None:
         super().__init__()
         self._user = user
         self._page = page
         self._limit = limit
+        self._cursor = cursor
 
     @alchemy_session_decorator
     async def execute(self, session: AsyncSession) -> list[PicsDTO]:
         query = (
             select(Pics)
-            .join(Users)
             .options(selectinload(Pics.schedules))
-            .where(Users.id == self._user.id)
+            .where(Pics.user_id == self._user.id)
             .order_by(Pics.id)
-            .offset((self._page - 1) * self._limit)
             .limit(self._limit)
         )
+        if self._cursor:
+            query = query.where(Pics.id > self._get_cursor_id())
+        else:
+            query = query.offset((self._page - 1) * self._limit)
         result = await session.execute(query)
         pics = [PicsDTO.from_orm(pic) for pic in result.scalars()]
         return pics
 
+    def _get_cursor_id(self) -> UUID:
+        try:
+            return decode_cursor(self._cursor or '')
+        except ValueError:
+            raise BadRequestException(detail='Invalid cursor')
+
 
 class CreatePicForUserUseCase(BasePicWithUserUseCase):
     @alchemy_session_decorator
@@ -64,45 +211,288 @@ class CreatePicForUserUseCase(BasePicWithUserUseCase):
 
         pic = Pics(
             user_id=self.user.id,
-            **self.pic.dict(exclude_none=True),
+            **get_pic_columns(self.pic),
         )
         session.add(pic)
         await session.flush()
+        await track_pic_zones(session=session, zones=[pic.zone])
 
         return pic
 
 
 class PatchPicForUserUseCase(BasePicWithUserUseCase):
+    def __init__(self, pic: PicsDTO, user: Users) -> None:
+        super().__init__(pic, user)
+        # Schedules, that got another fire time along with the pic timezone
+        self.rescheduled: list[FireTime] = []
+        # Telegram photo of the previous file, it would be reused instead of uploading the new one
+        self.removed_photos: list[InputPhoto] = []
+
+    async def execute(self) -> Pics:  # type: ignore
+        pic = await self._patch()
+        await index_schedules(self.rescheduled)
+        await delete_telegram_photos(self.user.id, self.removed_photos)
+        return pic
+
     @alchemy_session_decorator
-    async def execute(self, session: AsyncSession) -> Pics:
+    async def _patch(self, session: AsyncSession) -> Pics:
+        return await self.patch(session=session)
+
+    async def patch(self, session: AsyncSession) -> Pics:
+        """Patch within an already open session, so several pics could be patched in one transaction"""
         if not self.pic.id:
             raise BadRequestException(detail='No pic_id provided')
 
-        pic = await self._get_pic_for_user_by_id(session=session)
-        pic_dict = self.pic.dict(exclude_none=True, exclude={'id'})
-        q = update(Pics).where(and_(Pics.user_id == self.user.id, Pics.id == self.pic.id)).values(**pic_dict)
-        await session.execute(q)
-        await session.flush()
+        pic_dict = get_pic_columns(self.pic)
+        if not pic_dict:
+            return await self._get_pic_for_user_by_id(session=session)
+
+        user_pic = and_(Pics.user_id == self.user.id, Pics.id == self.pic.id)
+        # Previous values, so the file reference of the replaced file could be released
+        previous = (
+            select(Pics.id, Pics.filename, Pics.sha256).where(user_pic).with_for_update().subquery('previous_pic')
+        )
+        values = dict(pic_dict)
+        # Telegram photo of the previous file, it's dropped by the same statement, a pic has one at most
+        photo_columns: list[Any] = [null(), null(), null()]
+        if 'filename' in pic_dict:
+            replaced = select(Pics.id).where(user_pic, Pics.filename != pic_dict['filename'])
+            removed = (
+                delete(TelegramPhotos)
+                .where(TelegramPhotos.pic_id.in_(replaced))
+                .returning(TelegramPhotos.photo_id, TelegramPhotos.access_hash, TelegramPhotos.file_reference)
+                .cte('removed_photo')
+            )
+            photo_columns = [select(column).scalar_subquery() for column in removed.c]
+            # Hash belongs to the previous file, content of the new one isn't known
+            values['sha256'] = case((Pics.filename != pic_dict['filename'], None), else_=Pics.sha256)
+        q = (
+            update(Pics)
+            .where(Pics.id == previous.c.id)
+            .values(**values)
+            .returning(Pics, previous.c.filename, previous.c.sha256, *photo_columns)
+        )
+        row = (await session.execute(q)).first()
+        if not row:
+            raise BadRequestException(detail='Pic not found')
+        pic, previous_filename, previous_sha256, photo_id, access_hash, file_reference = row
+        if photo_id is not None:
+            self.removed_photos = [InputPhoto(id=photo_id, access_hash=access_hash, file_reference=file_reference)]
+        if pic.filename != previous_filename:
+            await release_pic_files(session=session, hashes=[previous_sha256])
+        await track_pic_zones(session=session, zones=[pic_dict.get('zone')])
+        if 'timezone' in pic_dict:
+            await self._update_schedules_fire_time(session=session, timezone=pic_dict['timezone'])
         return pic
 
+    async def _update_schedules_fire_time(self, session: AsyncSession, timezone: int) -> None:
+        q = (
+            update(Schedules)
+            .where(Schedules.pic_id == self.pic.id)
+            .values(**get_fire_time_clauses(Schedules.day_time, Schedules.days_of_week, literal(timezone, Integer)))
+            .returning(Schedules.id, Schedules.fire_minute, Schedules.fire_days)
+        )
+        rows = await session.execute(q, execution_options={'synchronize_session': False})
+        self.rescheduled = [FireTime(*row) for row in rows]
+
 
 class DeletePicForUserUseCase(SQLAlchemySessionBaseUseCase):
     def __init__(self, pic_id: str | UUID, user: Users) -> None:
         super().__init__()
         self.user: Users = user
         self.pic_id: str | UUID = pic_id
+        self.removed_photos: list[InputPhoto] = []
+
+    async def execute(self) -> None:  # type: ignore
+        await unindex_schedules(await self._delete())
+        await delete_telegram_photos(self.user.id, self.removed_photos)
 
     @alchemy_session_decorator
-    async def execute(self, session: AsyncSession) -> None:
+    async def _delete(self, session: AsyncSession) -> list[UUID]:
         q = select(Pics).where(and_(Pics.user_id == self.user.id, Pics.id == self.pic_id)).limit(1)
         pic: None | Pics = (await session.scalars(q)).first()
         if not pic:
             raise BadRequestException(detail='Pic not found')
 
+        schedule_ids = list(await session.scalars(select(Schedules.id).where(Schedules.pic_id == pic.id)))
+        self.removed_photos = await pop_telegram_photos(session=session, pic_ids=[pic.id])
         await session.delete(pic)
         await session.flush()
+        await release_pic_files(session=session, hashes=[pic.sha256])
+
+        return schedule_ids
+
+
+BulkResultT = TypeVar('BulkResultT', BulkPicsResultDTO, BulkSchedulesResultDTO)
+
+
+class BaseBulkUseCase(SQLAlchemySessionBaseUseCase, ABC, Generic[BulkResultT]):
+    """
+    Applies all operations in one transaction: creates, then updates, then deletes.
+    Items, that can't be applied, are reported in `errors` and skipped, the rest of them are still applied
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.rescheduled: list[FireTime] = []
+
+    async def execute(self) -> BulkResultT:  # type: ignore
+        result = await self._apply()
+        await index_schedules(self.rescheduled)
+        await self._on_commit(result)
+        return result
+
+    @alchemy_session_decorator
+    async def _apply(self, session: AsyncSession) -> BulkResultT:
+        result = await self._start(session=session)
+        await self._create(session=session, result=result)
+        await self._update(session=session, result=result)
+        await self._delete(session=session, result=result)
+        return result
+
+    @abstractmethod
+    async def _start(self, session: AsyncSession) -> BulkResultT:
+        """Empty result, raises if operations can't be applied at all"""
+
+    @abstractmethod
+    async def _create(self, session: AsyncSession, result: BulkResultT) -> None:
+        pass
+
+    @abstractmethod
+    async def _update(self, session: AsyncSession, result: BulkResultT) -> None:
+        pass
+
+    @abstractmethod
+    async def _delete(self, session: AsyncSession, result: BulkResultT) -> None:
+        pass
+
+    async def _on_commit(self, result: BulkResultT) -> None:
+        """Side effects, that are only made once the transaction is committed"""
+
+
+class BulkPicsForUserUseCase(BaseBulkUseCase[BulkPicsResultDTO]):
+    def __init__(self, operations: BulkPicsDTO, user: Users) -> None:
+        super().__init__()
+        self.operations = operations
+        self.user = user
+        self.unscheduled: list[UUID] = []
+        self.removed_photos: list[InputPhoto] = []
+
+    async def _start(self, session: AsyncSession) -> BulkPicsResultDTO:
+        return BulkPicsResultDTO()
+
+    async def _on_commit(self, result: BulkPicsResultDTO) -> None:
+        await unindex_schedules(self.unscheduled)
+        await delete_telegram_photos(self.user.id, self.removed_photos)
+
+    async def _create(self, session: AsyncSession, result: BulkPicsResultDTO) -> None:
+        values = []
+        for index, pic in enumerate(self.operations.create):
+            if pic.id:
+                result.errors.append(
+                    BulkErrorDTO(operation='create', index=index, detail='Can\'t create already existing Pic')
+                )
+                continue
+            # Rows are inserted at once, so one of them failing a constraint would fail the whole batch
+            if not pic.filename:
+                result.errors.append(BulkErrorDTO(operation='create', index=index, detail='Pic filename is required'))
+                continue
+            values.append({'user_id': self.user.id, **get_pic_columns(pic)})
+        if values:
+            pics = await session.scalars(insert(Pics).returning(Pics, sort_by_parameter_order=True), values)
+            result.created = [PicsDTO.from_orm(pic) for pic in pics]
+            await track_pic_zones(session=session, zones=[value.get('zone') for value in values])
+
+    async def _update(self, session: AsyncSession, result: BulkPicsResultDTO) -> None:
+        for index, pic in enumerate(self.operations.update):
+            use_case = PatchPicForUserUseCase(pic=pic, user=self.user)
+            try:
+                patched = await use_case.patch(session=session)
+            except BadRequestException as e:
+                result.errors.append(BulkErrorDTO(operation='update', index=index, detail=e.detail))
+            else:
+                result.updated.append(PicsDTO.from_orm(patched))
+                self.rescheduled.extend(use_case.rescheduled)
+                self.removed_photos.extend(use_case.removed_photos)
+
+    async def _delete(self, session: AsyncSession, result: BulkPicsResultDTO) -> None:
+        if not self.operations.delete:
+            return
+        pic_ids = bindparam('pic_ids', self.operations.delete, type_=ARRAY(Pics.id.type))
+        user_pics = and_(Pics.user_id == self.user.id, Pics.id == any_(pic_ids))
+        self.removed_photos.extend(await pop_telegram_photos(session=session, pic_ids=select(Pics.id).where(user_pics)))
+        self.unscheduled = list(
+            await session.scalars(
+                delete(Schedules).where(Schedules.pic_id.in_(select(Pics.id).where(user_pics))).returning(Schedules.id),
+                execution_options={'synchronize_session': False},
+            )
+        )
+        rows = await session.execute(
+            delete(Pics).where(user_pics).returning(Pics.id, Pics.sha256),
+            execution_options={'synchronize_session': False},
+        )
+        deleted = dict(rows.tuples().all())
+        await release_pic_files(session=session, hashes=deleted.values())
+        for index, pic_id in enumerate(self.operations.delete):
+            if pic_id in deleted:
+                result.deleted.append(pic_id)
+            else:
+                result.errors.append(BulkErrorDTO(operation='delete', index=index, detail='Pic not found'))
+
+
+def get_schedule_columns(schedule: SchedulesDTO) -> dict[str, Any]:
+    """Columns set by a schedule DTO, `days_of_week` is stored as a bitmask and `day_time` as a minute of day"""
+    columns = schedule.dict(exclude_none=True, exclude={'id'})
+    if 'days_of_week' in columns:
+        columns['days_of_week'] = parse_days_of_week(columns['days_of_week'])
+    if 'day_time' in columns:
+        columns['day_time'] = parse_day_time(columns['day_time'])
+    return columns
 
-        return None
+
+def get_fire_time_columns(columns: dict[str, Any], timezone: int | None) -> dict[str, Any]:
+    """Fire time of a new schedule, columns missing from `columns` get their defaults"""
+    day_time, days_of_week = columns.get('day_time', 0), columns.get('days_of_week', 0)
+    return get_fire_time(day_time, days_of_week, timezone)
+
+
+def get_fire_time(
+    day_time: int | None, days_of_week: int, timezone: int | None, after: datetime.datetime | None = None
+) -> dict[str, Any]:
+    """Fire time columns of a schedule, it's due next at the first of its times after `after`, now by default"""
+    fire_minute, fire_days = get_fire_minute(day_time, timezone), get_fire_days(days_of_week, day_time, timezone)
+    return {
+        'fire_minute': fire_minute,
+        'fire_days': fire_days,
+        'next_run_at': get_next_run_at(fire_minute, fire_days, after or datetime.datetime.now(pytz.utc)),
+    }
+
+
+def get_fire_time_clauses(
+    day_time: SQLColumnExpression[Any], days_of_week: SQLColumnExpression[Any], timezone: SQLColumnExpression[Any]
+) -> dict[str, ColumnElement[Any]]:
+    """SQL counterpart of `get_fire_time` after now, so schedules are rescheduled by the UPDATE, that patches them"""
+    # Fire minute is moved at most a day back or forward, so both are kept positive before rounding down
+    fire_minute = (day_time - timezone + MINUTES_IN_DAY) % MINUTES_IN_DAY
+    shift = (day_time - timezone + MINUTES_IN_DAY * DAYS_IN_WEEK) // MINUTES_IN_DAY % DAYS_IN_WEEK
+    days = case((days_of_week == 0, ALL_DAYS), else_=days_of_week)
+    fire_days = days.op('<<')(shift).op('|')(days.op('>>')(DAYS_IN_WEEK - shift)).op('&')(ALL_DAYS)
+    start = func.date_trunc('minute', func.timezone('utc', func.now())) + datetime.timedelta(minutes=1)
+    day = (
+        func.generate_series(
+            func.date_trunc('day', start),
+            func.date_trunc('day', start) + datetime.timedelta(days=DAYS_IN_WEEK),
+            datetime.timedelta(days=1),
+        )
+        .table_valued('day')
+        .render_derived()
+    )
+    run_time = day.c.day + fire_minute * datetime.timedelta(minutes=1)
+    weekday = literal(1).op('<<')(func.extract('isodow', day.c.day).cast(Integer) - 1)
+    next_run_at = (
+        select(func.min(run_time)).select_from(day).where(run_time >= start, fire_days.op('&')(weekday) != 0)
+    ).scalar_subquery()
+    return {'fire_minute': fire_minute, 'fire_days': fire_days, 'next_run_at': func.timezone('utc', next_run_at)}
 
 
 class BaseScheduleWithUserUseCase(SQLAlchemySessionBaseUseCase, ABC):
@@ -119,16 +509,28 @@ class BaseScheduleWithUserUseCase(SQLAlchemySessionBaseUseCase, ABC):
 
         return res
 
+    async def _get_pic_timezone(self, session: AsyncSession) -> int | None:
+        q = select(Pics.timezone).where(Pics.id == self.pic_id).limit(1)
+        res = (await session.execute(q)).first()
+        if res is None:
+            raise BadRequestException(detail='Pic not found')
+
+        return res.timezone
+
 
 class CreateScheduleForPicUseCase(BaseScheduleWithUserUseCase):
+    async def execute(self) -> Schedules:  # type: ignore
+        schedule = await self._create()
+        await index_schedules([FireTime(schedule.id, schedule.fire_minute, schedule.fire_days)])
+        return schedule
+
     @alchemy_session_decorator
-    async def execute(self, session: AsyncSession) -> Schedules:
+    async def _create(self, session: AsyncSession) -> Schedules:
         if self.schedule.id:
             raise BadRequestException('Can\'t create already existing schedule')
-        schedule = Schedules(
-            pic_id=self.pic_id,
-            **self.schedule.dict(exclude_none=True),
-        )
+        columns = get_schedule_columns(self.schedule)
+        timezone = await self._get_pic_timezone(session=session)
+        schedule = Schedules(pic_id=self.pic_id, **columns, **get_fire_time_columns(columns, timezone))
         session.add(schedule)
         await session.flush()
 
@@ -136,16 +538,41 @@ class CreateScheduleForPicUseCase(BaseScheduleWithUserUseCase):
 
 
 class PatchScheduleForPicUseCase(BaseScheduleWithUserUseCase):
+    async def execute(self) -> Schedules:  # type: ignore
+        schedule = await self._patch()
+        await index_schedules([FireTime(schedule.id, schedule.fire_minute, schedule.fire_days)])
+        return schedule
+
     @alchemy_session_decorator
-    async def execute(self, session: AsyncSession) -> Schedules:
+    async def _patch(self, session: AsyncSession) -> Schedules:
+        return await self.patch(session=session)
+
+    async def patch(self, session: AsyncSession) -> Schedules:
+        """Patch within an already open session, so several schedules could be patched in one transaction"""
         if not self.schedule.id:
             raise BadRequestException(detail='No pic_id provided')
 
-        schedule = await self._get_schedule_by_id(session=session)
-        schedule_dict = self.schedule.dict(exclude_none=True, exclude={'id'})
-        q = update(Schedules).where(Schedules.id == schedule.id).values(**schedule_dict)
-        await session.execute(q)
-        await session.flush()
+        columns = get_schedule_columns(self.schedule)
+        if not columns:
+            return await self._get_schedule_by_id(session=session)
+
+        values: dict[str, Any] = dict(columns)
+        if 'day_time' in columns or 'days_of_week' in columns:
+            # SET sees the row before the update, so the fire time is derived from the patched values as given
+            day_time, days_of_week = (
+                literal(columns[column], Integer) if column in columns else getattr(Schedules, column)
+                for column in ('day_time', 'days_of_week')
+            )
+            values.update(get_fire_time_clauses(day_time, days_of_week, Pics.timezone))
+        q = (
+            update(Schedules)
+            .where(Schedules.pic_id == Pics.id, Schedules.pic_id == self.pic_id, Schedules.id == self.schedule.id)
+            .values(**values)
+            .returning(Schedules)
+        )
+        schedule: None | Schedules = (await session.scalars(q)).first()
+        if not schedule:
+            raise BadRequestException(detail='Schedule not found')
 
         return schedule
 
@@ -156,8 +583,12 @@ class DeleteScheduleForPicUseCase(SQLAlchemySessionBaseUseCase):
         self.pic_id: str = pic_id
         self.schedule_id: str | UUID = schedule_id
 
+    async def execute(self) -> None:  # type: ignore
+        await self._delete()
+        await unindex_schedules([UUID(str(self.schedule_id))])
+
     @alchemy_session_decorator
-    async def execute(self, session: AsyncSession) -> None:
+    async def _delete(self, session: AsyncSession) -> None:
         q = select(Schedules).where(and_(Schedules.pic_id == self.pic_id, Schedules.id == self.schedule_id)).limit(1)
         pic: None | Schedules = (await session.scalars(q)).first()
         if not pic:
@@ -169,82 +600,593 @@ class DeleteScheduleForPicUseCase(SQLAlchemySessionBaseUseCase):
         return None
 
 
-class ProcessPicsTaskUseCase(SQLAlchemySessionBaseUseCase):
+class BulkSchedulesForPicUseCase(BaseBulkUseCase[BulkSchedulesResultDTO]):
+    def __init__(self, pic_id: str, operations: BulkSchedulesDTO, user: Users) -> None:
+        super().__init__()
+        self.pic_id = pic_id
+        self.operations = operations
+        self.user = user
+        # Timezone of the pic, that fire times of created schedules are derived with
+        self.timezone: int | None = None
+
+    async def _start(self, session: AsyncSession) -> BulkSchedulesResultDTO:
+        q = select(Pics.id, Pics.timezone).where(and_(Pics.id == self.pic_id, Pics.user_id == self.user.id))
+        pic = (await session.execute(q)).first()
+        if not pic:
+            raise BadRequestException(detail='Pic not found')
+        self.timezone = pic.timezone
+        return BulkSchedulesResultDTO()
+
+    async def _on_commit(self, result: BulkSchedulesResultDTO) -> None:
+        await unindex_schedules(result.deleted)
+
+    async def _create(self, session: AsyncSession, result: BulkSchedulesResultDTO) -> None:
+        values = []
+        for index, schedule in enumerate(self.operations.create):
+            if schedule.id:
+                result.errors.append(
+                    BulkErrorDTO(operation='create', index=index, detail='Can\'t create already existing schedule')
+                )
+                continue
+            columns = get_schedule_columns(schedule)
+            values.append({'pic_id': self.pic_id, **columns, **get_fire_time_columns(columns, self.timezone)})
+        if values:
+            schedules = (await session.scalars(insert(Schedules).returning(Schedules), values)).all()
+            result.created = [SchedulesDTO.from_orm(schedule) for schedule in schedules]
+            self.rescheduled.extend(
+                FireTime(schedule.id, schedule.fire_minute, schedule.fire_days) for schedule in schedules
+            )
+
+    async def _update(self, session: AsyncSession, result: BulkSchedulesResultDTO) -> None:
+        for index, schedule in enumerate(self.operations.update):
+            try:
+                patched = await PatchScheduleForPicUseCase(pic_id=self.pic_id, schedule=schedule).patch(session=session)
+            except BadRequestException as e:
+                result.errors.append(BulkErrorDTO(operation='update', index=index, detail=e.detail))
+            else:
+                result.updated.append(SchedulesDTO.from_orm(patched))
+                self.rescheduled.append(FireTime(patched.id, patched.fire_minute, patched.fire_days))
+
+    async def _delete(self, session: AsyncSession, result: BulkSchedulesResultDTO) -> None:
+        if not self.operations.delete:
+            return
+        schedule_ids = bindparam('schedule_ids', self.operations.delete, type_=ARRAY(Schedules.id.type))
+        q = (
+            delete(Schedules)
+            .where(and_(Schedules.pic_id == self.pic_id, Schedules.id == any_(schedule_ids)))
+            .returning(Schedules.id)
+        )
+        deleted = set(await session.scalars(q, execution_options={'synchronize_session': False}))
+        for index, schedule_id in enumerate(self.operations.delete):
+            if schedule_id in deleted:
+                result.deleted.append(schedule_id)
+            else:
+                result.errors.append(BulkErrorDTO(operation='delete', index=index, detail='Schedule not found'))
+
+
+class BaseChangeAvatarsUseCase(SQLAlchemySessionBaseUseCase, ABC):
     def __init__(self, task_time: datetime.datetime) -> None:
         super().__init__()
         self.task_time = task_time
 
+    async def _change_avatars(self, pics: list[Pics]) -> TickStatsDTO:
+        from app.core.init_app import settings
+
+        executor = ConcurrentUseCaseExecutor(
+            concurrency=settings.SCHEDULER_CONCURRENCY, timeout=settings.SCHEDULER_CHANGE_TIMEOUT
+        )
+        return await executor.run(
+            ChangeAvatarUseCase(pic.user, pic.id, pic.filename, due_time=self.task_time) for pic in pics
+        )
+
+
+class DueChange(NamedTuple):
+    pic: Pics
+    # When the schedule was due, and when the change is made: at the tick if it's overdue, and at `due_time` otherwise
+    due_time: datetime.datetime
+    fire_at: datetime.datetime
+    days_of_week: int
+
+    @property
+    def precedence(self) -> tuple[datetime.datetime, bool, UUID]:
+        return self.due_time, self.days_of_week != 0, self.pic.id
+
+
+class ProcessPicsTaskUseCase(BaseChangeAvatarsUseCase):
+    """
+    Makes changes of schedules with `next_run_at` up to the tick, and moves it to their next run.
+    Overdue ones, missed while the scheduler was stopped or lagging, are caught up once. Ticks claim minutes with
+    a watermark persisted in the database, and due changes are coalesced into one for every user, see `_coalesce`.
+    With shards, changes due up to `SCHEDULER_DISPATCH_AHEAD` later are sent at once with an `eta`.
+    Offsets of pics with a zone are moved by the tick, once the zone switches to or from DST, see `_move_zones`
+    """
+
+    WATERMARK = 'process_pics'
+
+    def __init__(self, task_time: datetime.datetime) -> None:
+        super().__init__(task_time)
+        self.task_minute = task_time.astimezone(pytz.utc).replace(second=0, microsecond=0)
+        # Minutes claimed by the tick, the last one is later than the tick's own with dispatch ahead
+        self.first_minute = self.last_minute = self.task_minute
+        # Found in the due index, `None` if it's disabled
+        self.due_schedule_ids: set[UUID] | None = None
+        # Due changes, that were dropped for a change of the same user
+        self.coalesced = 0
+        # Schedules, that got another fire time along with the offset of their pic zone
+        self.rescheduled: list[FireTime] = []
+
+    async def execute(self) -> TickStatsDTO:  # type: ignore
+        from app.core.init_app import settings
+
+        if settings.SCHEDULER_SHARDS and settings.SCHEDULER_DISPATCH_AHEAD:
+            self.last_minute += datetime.timedelta(minutes=settings.SCHEDULER_DISPATCH_AHEAD // 60)
+        changes = await self._claim_due_changes()
+        if changes is None:
+            logger.info(f'Pics up to {self.last_minute} are already processed, skipping them')
+            return TickStatsDTO()
+        await index_schedules(self.rescheduled)
+        if settings.SCHEDULER_SHARDS:
+            stats = await self._dispatch(
+                changes, shards=settings.SCHEDULER_SHARDS, queues=settings.SCHEDULER_SHARD_QUEUES
+            )
+        else:
+            stats = await self._change_avatars([change.pic for change in changes])
+        stats.coalesced = self.coalesced
+        logger.info(f'Processed pics from {self.first_minute} to {self.last_minute}: {stats}')
+        return stats
+
     @alchemy_session_decorator
-    async def execute(self, session: AsyncSession) -> None:
-        q = select(Pics).options(selectinload(Pics.schedules), selectinload(Pics.user))
-        result = await session.execute(q)
-        for pic in result.scalars().all():
-            for schedule in pic.schedules:
-                if not await self._pic_for_change(schedule, pic):
-                    continue
-                await ChangeAvatarUseCase(pic.user, pic.filename).execute()
-
-    async def _pic_for_change(self, schedule: Schedules, pic: Pics) -> bool:
-        offset_match = re.match(r'^([+-])(\d{2}):(\d{2})$', pic.timezone)
-        sign, hours, minutes = offset_match.groups()  # type: ignore
-        offset = datetime.timedelta(hours=int(hours), minutes=int(minutes))
-        if sign == '-':
-            offset = -offset
-        current_time = self.task_time + offset
-        current_time = current_time.replace(microsecond=0)
-        database_time = datetime.datetime.strptime(schedule.day_time, "%H:%M").time()
-        return current_time.time() == database_time
-
-
-class ChangeAvatarUseCase:
-    def __init__(self, user: Users, filename: str):
+    async def _claim_due_changes(self, session: AsyncSession) -> list[DueChange] | None:
+        """
+        Due schedules are moved to their next run in the same transaction as the watermark, that stays locked
+        meanwhile, so overlapping ticks never make the same changes. They're claimed before changes are made,
+        so a crashed tick loses its changes rather than repeats them with the next one
+        """
+        if not await self._claim_window(session=session):
+            return None
+        await self._move_zones(session=session)
+        await self._read_due_index()
+        return await self._load_due_changes(session=session)
+
+    async def _claim_window(self, session: AsyncSession) -> bool:
+        """Moves the watermark to the last minute, and starts the window right after the previous one"""
+        from app.core.init_app import settings
+
+        await session.execute(
+            pg_insert(SchedulerWatermarks)
+            .values(name=self.WATERMARK)
+            .on_conflict_do_nothing(index_elements=[SchedulerWatermarks.name])
+        )
+        q = select(SchedulerWatermarks).where(SchedulerWatermarks.name == self.WATERMARK).with_for_update()
+        watermark = (await session.scalars(q)).one()
+        previous = watermark.processed_minute
+        if previous is not None and previous >= self.last_minute:
+            return False
+        watermark.processed_minute = self.last_minute
+        if previous is not None:
+            earliest = self._get_earliest(settings.SCHEDULER_MAX_LOOKBACK)
+            self.first_minute = max(previous + datetime.timedelta(minutes=1), earliest)
+            if previous < earliest:
+                logger.warning(f'Pics were last processed for {previous}, skipping changes due until {earliest}')
+        return True
+
+    async def _move_zones(self, session: AsyncSession) -> None:
+        """
+        Offset of every zone in `pic_zones` is computed once for the tick, so it reads a few hundred rows at most
+        however many pics there are, and DST costs nothing per schedule.
+        Only pics of zones, that have just switched, are updated, and their schedules are rescheduled a zone at once.
+        They're due next from the start of the window, so runs at the very minute of the switch aren't missed
+        """
+        moved: dict[str, int] = {}
+        for zone, utc_offset in await session.execute(select(PicZones.name, PicZones.utc_offset)):
+            offset = get_zone_offset(zone, self.task_minute)
+            if offset is not None and offset != utc_offset:
+                moved[zone] = offset
+        after = self.first_minute - datetime.timedelta(minutes=1)
+        for zone, offset in moved.items():
+            await session.execute(update(PicZones).where(PicZones.name == zone).values(utc_offset=offset))
+            await session.execute(update(Pics).where(Pics.zone == zone).values(timezone=offset))
+            schedules = select(Schedules.id, Schedules.day_time, Schedules.days_of_week).join(Pics)
+            values = [
+                {'id': id_, **get_fire_time(day_time, days_of_week, offset, after=after)}
+                for id_, day_time, days_of_week in await session.execute(schedules.where(Pics.zone == zone))
+            ]
+            if values:
+                await session.execute(update(Schedules), values)
+            self.rescheduled.extend(FireTime(value['id'], value['fire_minute'], value['fire_days']) for value in values)
+            logger.info(f'Zone {zone} moved to {format_utc_offset(offset)}, rescheduled {len(values)} schedules')
+
+    async def _read_due_index(self) -> None:
+        if (index := get_due_index()) is None:
+            return
+        try:
+            self.due_schedule_ids = await index.get_due(self.first_minute, self.last_minute)
+        except Exception as e:
+            logger.warning(f'Error reading due index, looking due schedules up in the database: {e}')
+
+    async def _load_due_changes(self, session: AsyncSession) -> list[DueChange]:
+        from app.core.init_app import settings
+
+        q = (
+            select(
+                Pics,
+                Schedules.id,
+                Schedules.fire_minute,
+                Schedules.fire_days,
+                Schedules.days_of_week,
+                Schedules.next_run_at,
+            )
+            .join(Pics.schedules)
+            .where(Schedules.next_run_at <= self.last_minute)
+            .options(joinedload(Pics.user))
+        )
+        if self.due_schedule_ids is not None:
+            # Index only has schedules due in the window, ones left behind it are still looked up by `next_run_at`
+            schedule_ids = bindparam('schedule_ids', list(self.due_schedule_ids), type_=ARRAY(Schedules.id.type))
+            q = q.where(or_(Schedules.id == any_(schedule_ids), Schedules.next_run_at < self.first_minute))
+        earliest = self._get_earliest(settings.SCHEDULER_MAX_LOOKBACK)
+        changes, next_runs = [], []
+        for pic, schedule_id, fire_minute, fire_days, days_of_week, next_run_at in await session.execute(q):
+            run_times = get_run_times(fire_minute, fire_days, max(next_run_at, earliest), self.last_minute)
+            if overdue := [run_time for run_time in run_times if run_time <= self.task_minute]:
+                changes.append(DueChange(pic, overdue[-1], self.task_minute, days_of_week))
+            changes.extend(
+                DueChange(pic, run_time, run_time, days_of_week)
+                for run_time in run_times
+                if run_time > self.task_minute
+            )
+            next_runs.append(
+                {'id': schedule_id, 'next_run_at': get_next_run_at(fire_minute, fire_days, self.last_minute)}
+            )
+        if next_runs:
+            await session.execute(update(Schedules), next_runs)
+        winners = self._coalesce(changes)
+        self.coalesced = len(changes) - len(winners)
+        return winners
+
+    def _get_earliest(self, lookback: int) -> datetime.datetime:
+        return self.task_minute - datetime.timedelta(minutes=lookback // 60)
+
+    @staticmethod
+    def _coalesce(changes: list[DueChange]) -> list[DueChange]:
+        """
+        Every change replaces the previous one at once, so a single change is made for a user at a time.
+        The latest due one wins, then one of a schedule with days of week chosen over an every day one,
+        then the one of the greatest pic id, so the same pic wins however rows are ordered
+        """
+        winners: dict[tuple[UUID, datetime.datetime], DueChange] = {}
+        for change in changes:
+            key = (change.pic.user_id, change.fire_at)
+            if key not in winners or change.precedence > winners[key].precedence:
+                winners[key] = change
+        return list(winners.values())
+
+    async def _dispatch(self, changes: list[DueChange], shards: int, queues: bool) -> TickStatsDTO:
+        """
+        All pics of a user are sent to the same shard task, so no user is changed by two workers at once.
+        Changes due later are sent with an `eta`, a task for every minute
+        """
+        from app.core.celery_app import MAIN_QUEUE, celery_app
+
+        shard_pic_ids: dict[tuple[int, datetime.datetime], list[str]] = defaultdict(list)
+        for change in changes:
+            shard_pic_ids[(get_shard(change.pic.user_id, shards), change.fire_at)].append(str(change.pic.id))
+        for (shard, fire_at), pic_ids in shard_pic_ids.items():
+            await run_in_threadpool(
+                celery_app.send_task,
+                'app.apps.telegpick.tasks.process_pics_shard_task',
+                kwargs={'pic_ids': pic_ids, 'due_time': max(fire_at, self.task_time).isoformat()},
+                queue=f'{MAIN_QUEUE}-shard-{shard}' if queues else MAIN_QUEUE,
+                eta=fire_at if fire_at > self.task_time else None,
+            )
+        return TickStatsDTO(dispatched=len(changes))
+
+
+class ProcessPicsShardUseCase(BaseChangeAvatarsUseCase):
+    """Makes changes, that were dispatched to a shard by `ProcessPicsTaskUseCase`"""
+
+    def __init__(self, pic_ids: list[str], task_time: datetime.datetime) -> None:
+        super().__init__(task_time)
+        self.pic_ids = pic_ids
+
+    async def execute(self) -> TickStatsDTO:  # type: ignore
+        stats = await self._change_avatars(await self._get_pics())
+        logger.info(f'Processed shard of {len(self.pic_ids)} pics for {self.task_time}: {stats}')
+        return stats
+
+    @alchemy_session_decorator
+    async def _get_pics(self, session: AsyncSession) -> list[Pics]:
+        # Pics deleted since the tick are just skipped
+        pic_ids = bindparam('pic_ids', [UUID(pic_id) for pic_id in self.pic_ids], type_=ARRAY(Pics.id.type))
+        q = select(Pics).where(Pics.id == any_(pic_ids)).options(joinedload(Pics.user))
+        return list((await session.scalars(q)).all())
+
+
+class ChangeAvatarUseCase(AbstractUseCase):
+    """Account, that hit a FloodWait, gets its change requeued after the wait with the original due time"""
+
+    def __init__(self, user: Users, pic_id: str | UUID, filename: str, due_time: datetime.datetime):
         self.user = user
+        self.pic_id = str(pic_id)
         self.filename = filename
+        self.due_time = due_time
 
     async def execute(self):
-        await TelegramConnector(self.user).set_avatar(filename=self.filename)
+        try:
+            await TelegramConnector(self.user).set_avatar(pic_id=self.pic_id, filename=self.filename)
+        except TelegramFloodWaitException as e:
+            await self._requeue(countdown=e.seconds)
+            raise UseCaseDeferred(f'requeued in {e.seconds}s') from e
 
+    async def _requeue(self, countdown: float) -> None:
+        from app.core.celery_app import celery_app
 
-class UploadPicOnDiskUseCase:
-    def __init__(self, file: UploadFile, filename: str, timezone: str, user: Users) -> None:
+        await run_in_threadpool(
+            celery_app.send_task,
+            'app.apps.telegpick.tasks.change_avatar_task',
+            kwargs={'pic_id': self.pic_id, 'due_time': self.due_time.isoformat()},
+            countdown=countdown,
+        )
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__}(user_id={self.user.id}, pic_id={self.pic_id})>'
+
+
+class ChangeDeferredAvatarUseCase(SQLAlchemySessionBaseUseCase):
+    """
+    Runs a change, that was deferred by a FloodWait.
+    It's skipped if another pic of the user was due since then, so an outdated avatar doesn't replace a newer one
+    """
+
+    def __init__(self, pic_id: str, due_time: datetime.datetime, task_time: datetime.datetime) -> None:
+        super().__init__()
+        self.pic_id = pic_id
+        self.due_time = due_time
+        self.task_time = task_time
+
+    async def execute(self) -> None:  # type: ignore
+        pic = await self._get_pic()
+        if not pic:
+            logger.info(f'Pic {self.pic_id} was deleted, skipping deferred change')
+            return
+        if await self._is_superseded():
+            logger.info(f'Deferred change of pic {self.pic_id} is superseded by a later one, skipping it')
+            return
+        await ChangeAvatarUseCase(pic.user, pic.id, pic.filename, due_time=self.due_time).execute()
+
+    @alchemy_session_decorator
+    async def _get_pic(self, session: AsyncSession) -> Pics | None:
+        q = select(Pics).where(Pics.id == self.pic_id).options(joinedload(Pics.user))
+        return (await session.scalars(q)).first()
+
+    @alchemy_session_decorator
+    async def _is_superseded(self, session: AsyncSession) -> bool:
+        user_id = select(Pics.user_id).where(Pics.id == self.pic_id).scalar_subquery()
+        q = (
+            select(Schedules.fire_minute, Schedules.fire_days)
+            .join(Pics)
+            .where(Pics.user_id == user_id, Pics.id != self.pic_id, Schedules.fire_minute.is_not(None))
+        )
+        fire_times = (await session.execute(q)).all()
+        due_time = self.due_time.astimezone(pytz.utc)
+        due_minute = self._get_minute(due_time)
+        elapsed = int((self.task_time - self.due_time).total_seconds()) // 60
+        for fire_minute, fire_days in fire_times:
+            delay = (fire_minute - due_minute) % MINUTES_IN_DAY
+            fire_day = (due_time + datetime.timedelta(minutes=delay)).weekday()
+            if 0 < delay <= elapsed and fire_days & (1 << fire_day):
+                return True
+        return False
+
+    @staticmethod
+    def _get_minute(time: datetime.datetime) -> int:
+        time = time.astimezone(pytz.utc)
+        return time.hour * MINUTES_IN_HOUR + time.minute
+
+
+class DeleteTelegramPhotosUseCase(SQLAlchemySessionBaseUseCase):
+    """Deletes photos of deleted or replaced pics from the profile, it's requeued after a FloodWait"""
+
+    def __init__(self, user_id: str, photos: list[InputPhoto]) -> None:
+        super().__init__()
+        self.user_id = user_id
+        self.photos = photos
+
+    async def execute(self) -> None:  # type: ignore
+        user = await self._get_user()
+        if not user:
+            logger.info(f'User {self.user_id} was deleted, skipping deleting their photos')
+            return
+        try:
+            await TelegramConnector(user).delete_photos(self.photos)
+        except TelegramFloodWaitException as e:
+            await delete_telegram_photos(user.id, self.photos, countdown=e.seconds)
+
+    @alchemy_session_decorator
+    async def _get_user(self, session: AsyncSession) -> Users | None:
+        return await session.get(Users, self.user_id)
+
+
+class UploadPicOnDiskUseCase(SQLAlchemySessionBaseUseCase):
+    """
+    Pic files are stored by SHA-256 of their content, that is hashed while the upload is written to disk.
+    Content, that is already stored, only gets another reference, so its upload is dropped along with making
+    renditions, that are keyed by the same hash.
+    The upload is spooled by Starlette before the use case runs, so oversized bodies are rejected earlier
+    by `BodySizeLimitMiddleware`, and `PIC_MAX_SIZE` is checked here on the file itself
+    """
+
+    def __init__(
+        self, file: UploadFile, filename: str, timezone: str | None, user: Users, zone: str | None = None
+    ) -> None:
+        super().__init__()
         self.file = file
         self.filename = filename
         self.timezone = timezone
+        self.zone = zone
         self.user = user
+        self.upload_path = Path()
+        self.sha256 = ''
+        self.size = 0
 
-    async def execute(self) -> None:
+    async def execute(self) -> None:  # type: ignore
         from app.core.init_app import settings
 
+        if self.zone is not None:
+            if get_zone(self.zone) is None:
+                raise BadRequestException(detail=f'Unknown time zone {self.zone}')
+        elif parse_utc_offset(self.timezone) is None:
+            raise BadRequestException(detail='Timezone should be +HH:MM or -HH:MM')
+        self.upload_path = Path(settings.PICS_DIRECTORY) / f'.{uuid.uuid4()}.upload'
         try:
-            contents = self.file.file.read()
-            filename = f'{self.filename}-{str(uuid.uuid4())}.{self.file.filename.split(".")[-1]}'
-            with open(f'{settings.PICS_DIRECTORY}/{filename}', 'wb') as f:
-                f.write(contents)
+            self.sha256, self.size = await run_in_threadpool(
+                copy_file_hashed, source=self.file.file, destination=self.upload_path, max_size=settings.PIC_MAX_SIZE
+            )
+        except FileTooLargeError:
+            raise BadRequestException(detail=f'File is too large, max size is {settings.PIC_MAX_SIZE} bytes')
         except Exception:
             raise BadRequestException(detail='There was an error uploading the file')
         else:
-            await CreatePicForUserUseCase(
-                pic=PicsDTO(filename=filename, timezone=self.timezone), user=self.user
-            ).execute()
+            try:
+                filename = await self._store()
+            finally:
+                self.upload_path.unlink(missing_ok=True)
+            if filename is None:
+                logger.info(f'Pic {self.sha256} is already stored, reusing it')
+                return
+            try:
+                await create_renditions(settings.PICS_DIRECTORY, filename)
+            except Exception as e:
+                # Not fatal, the original is going to be used instead
+                logger.warning(f'Error creating renditions for {filename}: {e}')
         finally:
-            self.file.file.close()
+            await self.file.close()
+
+    @alchemy_session_decorator
+    async def _store(self, session: AsyncSession) -> str | None:
+        """
+        Adds the pic and a reference to its file, the upload is moved into place only if the content is new.
+        Returns the filename of the moved upload, `None` if the content was already stored
+        """
+        from app.core.init_app import settings
+
+        q = (
+            pg_insert(PicFiles)
+            .values(
+                sha256=self.sha256,
+                filename=f'{self.sha256}{Path(self.file.filename).suffix.lower()}',
+                size=self.size,
+                refs=1,
+            )
+            .on_conflict_do_update(index_elements=[PicFiles.sha256], set_={'refs': PicFiles.refs + 1})
+            .returning(PicFiles.filename, PicFiles.refs)
+        )
+        filename, refs = (await session.execute(q)).one()
+        pic = PicsDTO(timezone=self.timezone, zone=self.zone)
+        session.add(Pics(user_id=self.user.id, filename=filename, sha256=self.sha256, **get_pic_columns(pic)))
+        await track_pic_zones(session=session, zones=[self.zone])
+        path = Path(settings.PICS_DIRECTORY) / filename
+        # Files lost from the disk are stored again
+        if refs > 1 and await run_in_threadpool(path.exists):
+            return None
+        await run_in_threadpool(os.replace, self.upload_path, path)
+        return filename
+
+
+class BackfillPicFilesUseCase(SQLAlchemySessionBaseUseCase):
+    """
+    Pics uploaded before files were stored by content have no `sha256`, so their files were never removed.
+    Their files are hashed and get `pic_files` rows referenced by all pics using them, so they're released as usual.
+    A file with content, that is already stored, is dropped and its pics share the stored one
+    """
+
+    def __init__(self, pics_directory: str) -> None:
+        super().__init__()
+        self.pics_directory = pics_directory
+        self.filename = ''
+        self.sha256 = ''
+        self.size = 0
+
+    async def execute(self) -> int:  # type: ignore
+        backfilled = 0
+        for filename in await self._get_filenames():
+            path = Path(self.pics_directory) / filename
+            # Pics created with a filename as is may point anywhere, only files of the directory itself are owned
+            if Path(filename).name != filename or not await run_in_threadpool(path.is_file):
+                logger.info(f'Skipping pics of {filename}: not a stored file')
+                continue
+            self.filename = filename
+            self.sha256, self.size = await run_in_threadpool(hash_file, path)
+            stored_filename = await self._register()
+            if stored_filename is None:
+                continue
+            if stored_filename != filename:
+                await run_in_threadpool(remove_pic_file, self.pics_directory, filename)
+            backfilled += 1
+        return backfilled
+
+    @alchemy_session_decorator
+    async def _get_filenames(self, session: AsyncSession) -> list[str]:
+        return list(await session.scalars(select(Pics.filename).where(Pics.sha256.is_(None)).distinct()))
+
+    @alchemy_session_decorator
+    async def _register(self, session: AsyncSession) -> str | None:
+        """Filename, that pics of the file now reference, `None` if they were deleted or backfilled meanwhile"""
+        legacy_pics = select(Pics.id).where(Pics.filename == self.filename, Pics.sha256.is_(None)).with_for_update()
+        pic_ids = list(await session.scalars(legacy_pics))
+        if not pic_ids:
+            return None
+        q = (
+            pg_insert(PicFiles)
+            .values(sha256=self.sha256, filename=self.filename, size=self.size, refs=len(pic_ids))
+            .on_conflict_do_update(index_elements=[PicFiles.sha256], set_={'refs': PicFiles.refs + len(pic_ids)})
+            .returning(PicFiles.filename)
+        )
+        stored_filename = (await session.scalars(q)).one()
+        await session.execute(
+            update(Pics).where(Pics.id.in_(pic_ids)).values(filename=stored_filename, sha256=self.sha256),
+            execution_options={'synchronize_session': False},
+        )
+        return stored_filename
 
 
 class ReturnPicFileByIdUseCase(SQLAlchemySessionBaseUseCase):
-    def __init__(self, pic_id: str) -> None:
+    """
+    Pics are served with an ETag, so repeat views are answered with a bodiless 304.
+    Urls with `version`, that is the `sha256` of the pic, never change their content, so clients cache them for good
+    """
+
+    def __init__(self, pic_id: str, thumbnail: bool = False, version: str | None = None) -> None:
         super().__init__()
         self.pic_id = pic_id
+        self.thumbnail = thumbnail
+        self.version = version
 
     @alchemy_session_decorator
     async def execute(self, session: AsyncSession) -> FileResponse:
         from app.core.init_app import settings
 
-        q = select(Pics).where(Pics.id == self.pic_id)
-        pic = (await session.scalars(q)).first()
+        q = select(Pics.filename, Pics.sha256).where(Pics.id == self.pic_id)
+        pic = (await session.execute(q)).first()
         if not pic:
             raise BadRequestException(detail='There was an error uploading the picture')
-        pic_path = f"{settings.PICS_DIRECTORY}/{pic.filename}"
-        return FileResponse(pic_path)
+        pic_path = Path(settings.PICS_DIRECTORY) / pic.filename
+        # Hash is cleared, once the pic gets another file, so content of the served file is only known with it.
+        # Otherwise the response is validated by the file itself and never cached for good
+        etag = f'"{pic.sha256}"' if pic.sha256 else None
+        versioned = pic.sha256 is not None and self.version == pic.sha256
+        if self.thumbnail:
+            thumbnail_path = get_thumbnail_path(settings.PICS_DIRECTORY, pic.filename)
+            if await run_in_threadpool(thumbnail_path.is_file):
+                pic_path, etag = thumbnail_path, f'"{pic.sha256}.thumbnail"' if pic.sha256 else None
+            else:
+                # The original is served until the thumbnail is made, so the url isn't cached for good meanwhile
+                versioned = False
+        return CachedFileResponse(
+            pic_path,
+            etag=etag,
+            cache_control=IMMUTABLE_CACHE_CONTROL if versioned else REVALIDATED_CACHE_CONTROL,
+        )
 
 
 class UserSendVerificationUseCase:
@@ -278,3 +1220,13 @@ class UserConfirmCodeUseCase(SQLAlchemySessionBaseUseCase):
             raise BadRequestException(detail='Error connecting to Telegram')
         except Exception as e:
             raise BadRequestException(detail='Error singing in')
+
+
+if __name__ == '__main__':
+    import asyncio
+
+    from app.core.config import get_settings
+
+    settings = get_settings()
+    count = asyncio.run(BackfillPicFilesUseCase(settings.PICS_DIRECTORY).execute())
+    logger.info(f'Backfilled {count} pic files in {settings.PICS_DIRECTORY}')
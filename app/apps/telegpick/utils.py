@@ -0,0 +1,137 @@
+import base64
+import binascii
+import functools
+import re
+from datetime import datetime, timedelta
+from uuid import UUID
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+MINUTES_IN_HOUR = 60
+MINUTES_IN_DAY = MINUTES_IN_HOUR * 24
+DAYS_IN_WEEK = 7
+ALL_DAYS = (1 << DAYS_IN_WEEK) - 1
+
+# Offsets of real timezones are between -12:00 and +14:00
+UTC_OFFSET_PATTERN = re.compile(r'^([+-])(0\d|1[0-4]):([0-5]\d)$')
+DAY_TIME_PATTERN = re.compile(r'^([01]\d|2[0-3]):([0-5]\d)$')
+
+
+def parse_utc_offset(timezone: str | None) -> int | None:
+    """Parse `+HH:MM`/`-HH:MM` timezone into signed minutes, `None` if it is malformed"""
+    if not timezone or not (offset_match := UTC_OFFSET_PATTERN.match(timezone)):
+        return None
+    sign, hours, minutes = offset_match.groups()
+    offset = int(hours) * MINUTES_IN_HOUR + int(minutes)
+    return -offset if sign == '-' else offset
+
+
+def format_utc_offset(offset: int) -> str:
+    hours, minutes = divmod(abs(offset), MINUTES_IN_HOUR)
+    return f'{"-" if offset < 0 else "+"}{hours:02}:{minutes:02}'
+
+
+@functools.lru_cache(maxsize=1024)
+def get_zone(name: str) -> ZoneInfo | None:
+    """IANA time zone, e.g. `Europe/Berlin`, loaded once for the process, `None` if it's unknown"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError, OSError):
+        return None
+
+
+def get_zone_offset(name: str, at: datetime) -> int | None:
+    """Signed UTC offset in minutes, that is in effect in a zone at `at`, `None` if the zone is unknown"""
+    if (zone := get_zone(name)) is None or (offset := at.astimezone(zone).utcoffset()) is None:
+        return None
+    return int(offset.total_seconds()) // 60
+
+
+def parse_day_time(day_time: str | None) -> int | None:
+    """Parse `HH:MM` day time into minutes since midnight, `None` if it is malformed"""
+    if not day_time or not (day_time_match := DAY_TIME_PATTERN.match(day_time)):
+        return None
+    hours, minutes = day_time_match.groups()
+    return int(hours) * MINUTES_IN_HOUR + int(minutes)
+
+
+def format_day_time(day_minute: int) -> str:
+    return '{:02}:{:02}'.format(*divmod(day_minute, MINUTES_IN_HOUR))
+
+
+def get_fire_minute(day_minute: int | None, offset: int | None) -> int | None:
+    """
+    UTC minute of day at which a schedule should fire.
+    `None` means the schedule can't be fired at all, since its pic timezone or day time are broken
+    """
+    if day_minute is None or offset is None:
+        return None
+    return (day_minute - offset) % MINUTES_IN_DAY
+
+
+def parse_days_of_week(days_of_week: str) -> int:
+    """Parse `1010000` days, Monday first, into a bitmask with Monday as the lowest bit"""
+    return sum(1 << day for day, selected in enumerate(days_of_week) if selected == '1')
+
+
+def format_days_of_week(days_of_week: int) -> str:
+    return ''.join('1' if days_of_week & (1 << day) else '0' for day in range(DAYS_IN_WEEK))
+
+
+def get_fire_days(days_of_week: int, day_minute: int | None, offset: int | None) -> int | None:
+    """
+    UTC weekdays bitmask at which a schedule should fire, no days selected means every day.
+    Days are shifted, when the timezone moves the fire minute to the previous or the next UTC day
+    """
+    if day_minute is None or offset is None:
+        return None
+    days = days_of_week or ALL_DAYS
+    shift = (day_minute - offset) // MINUTES_IN_DAY % DAYS_IN_WEEK
+    return ((days << shift) | (days >> (DAYS_IN_WEEK - shift))) & ALL_DAYS
+
+
+def get_run_times(fire_minute: int, fire_days: int, start: datetime, end: datetime) -> list[datetime]:
+    """UTC times from `start` to `end` inclusive, that a schedule fires at, both are expected to be in UTC"""
+    run_times = []
+    day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    while day <= end:
+        run_time = day + timedelta(minutes=fire_minute)
+        if start <= run_time <= end and fire_days & (1 << day.weekday()):
+            run_times.append(run_time)
+        day += timedelta(days=1)
+    return run_times
+
+
+def get_next_run_at(fire_minute: int | None, fire_days: int | None, after: datetime) -> datetime | None:
+    """First UTC time after `after`, that a schedule fires at, `None` if it never fires"""
+    if fire_minute is None or not fire_days:
+        return None
+    start = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    run_times = get_run_times(fire_minute, fire_days, start, start + timedelta(days=DAYS_IN_WEEK))
+    return run_times[0]
+
+
+def get_shard(user_id: UUID, shards: int) -> int:
+    """
+    Jump consistent hash of the user, so changing the number of shards moves as few users as possible
+    between them
+    """
+    key = user_id.int & 0xFFFFFFFFFFFFFFFF
+    shard, next_shard = -1, 0
+    while next_shard < shards:
+        shard = next_shard
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        next_shard = int((shard + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return shard
+
+
+def encode_cursor(last_id: UUID) -> str:
+    """Opaque cursor pointing right after `last_id`"""
+    return base64.urlsafe_b64encode(last_id.bytes).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> UUID:
+    """Id encoded into a cursor, raises `ValueError` if it is malformed"""
+    try:
+        return UUID(bytes=base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise ValueError(f'Invalid cursor {cursor}')
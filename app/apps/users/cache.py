@@ -0,0 +1,116 @@
+import json
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+
+from prometheus_client import Counter
+from redis import asyncio as aioredis
+
+from app.apps.users.models import Users
+from app.core.logging_conf import get_logger
+
+logger = get_logger(__name__)
+
+USER_CACHE_REQUESTS = Counter('user_cache_requests', 'Lookups of authenticated users in cache', ['result'])
+
+
+class LocalUserCache:
+    """
+    In-process TTL/LRU cache of users keyed by username, which is the token subject.
+    Other workers aren't invalidated, so a changed user may be served by them until `ttl` is over
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self._max_size = max_size
+        self._ttl = ttl
+        self._users: OrderedDict[str, tuple[Users, float]] = OrderedDict()
+
+    async def get(self, username: str) -> Users | None:
+        if (cached := self._users.get(username)) is None:
+            return None
+        user, expires_at = cached
+        if expires_at < time.monotonic():
+            del self._users[username]
+            return None
+        self._users.move_to_end(username)
+        return user
+
+    async def set(self, user: Users) -> None:
+        self._users[user.username] = (user, time.monotonic() + self._ttl)
+        self._users.move_to_end(user.username)
+        while len(self._users) > self._max_size:
+            self._users.popitem(last=False)
+
+    async def invalidate(self, username: str) -> None:
+        self._users.pop(username, None)
+
+
+class RedisUserCache:
+    """
+    Cache shared by all workers, so invalidation reaches every one of them.
+    Only the fields needed by API are kept, the password hash never leaves the database
+    """
+
+    KEY_PREFIX = 'users:token-subject:'
+    FIELDS = ('id', 'username', 'phone', 'phone_hash')
+
+    def __init__(self, redis_url: str, ttl: int) -> None:
+        self._redis = aioredis.from_url(redis_url)
+        self._ttl = ttl
+
+    async def get(self, username: str) -> Users | None:
+        if (cached := await self._redis.get(self._get_key(username))) is None:
+            return None
+        data = json.loads(cached)
+        return Users(**{**data, 'id': uuid.UUID(data['id'])})
+
+    async def set(self, user: Users) -> None:
+        data = {field: getattr(user, field) for field in self.FIELDS}
+        await self._redis.set(self._get_key(user.username), json.dumps(data, default=str), ex=self._ttl)
+
+    async def invalidate(self, username: str) -> None:
+        await self._redis.delete(self._get_key(username))
+
+    def _get_key(self, username: str) -> str:
+        return f'{self.KEY_PREFIX}{username}'
+
+
+class UserCache:
+    """Failures of the cache are only logged, so the database is used instead of failing authentication"""
+
+    def __init__(self, backend: LocalUserCache | RedisUserCache) -> None:
+        self._backend = backend
+
+    async def get(self, username: str) -> Users | None:
+        try:
+            user = await self._backend.get(username)
+        except Exception as e:
+            logger.warning(f'Error getting user {username} from cache: {e}')
+            user = None
+        USER_CACHE_REQUESTS.labels('hit' if user else 'miss').inc()
+        return user
+
+    async def set(self, user: Users) -> None:
+        try:
+            await self._backend.set(user)
+        except Exception as e:
+            logger.warning(f'Error caching user {user.username}: {e}')
+
+    async def invalidate(self, username: str) -> None:
+        try:
+            await self._backend.invalidate(username)
+        except Exception as e:
+            logger.warning(f'Error invalidating user {username} in cache: {e}')
+
+
+@lru_cache
+def get_user_cache() -> UserCache:
+    from app.core.init_app import settings
+
+    backend: LocalUserCache | RedisUserCache
+    if settings.USER_CACHE_REDIS_URL:
+        backend = RedisUserCache(redis_url=settings.USER_CACHE_REDIS_URL, ttl=settings.USER_CACHE_TTL)
+    else:
+        backend = LocalUserCache(max_size=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+    return UserCache(backend)
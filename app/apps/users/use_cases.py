@@ -7,6 +7,7 @@ from pydantic import SecretStr
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from app.apps.users.cache import get_user_cache
 from app.apps.users.dtos import JWTTokenData, RegistrationData
 from app.apps.users.models import Users
 from app.core.config import get_settings
@@ -17,6 +18,7 @@ from app.lib.classes import (
     SQLAlchemySessionBaseUseCase,
     alchemy_session_decorator,
 )
+from app.lib.passwords import get_password_hasher
 
 settings = get_settings()
 
@@ -40,7 +42,7 @@ class RegisterUserUseCase(SQLAlchemySessionBaseUseCase):
             )
 
         user = Users(username=self._registration_data.username, phone=self._registration_data.phone)
-        user.hash_password(password=self._registration_data.password.get_secret_value())
+        user.hashed_pass = await get_password_hasher().hash(self._registration_data.password.get_secret_value())
         session.add(user)
         await session.flush()
         return user
@@ -65,8 +67,14 @@ class AuthenticateUserUseCase(SQLAlchemySessionBaseUseCase):
         if not user:
             error = 'User not found'
         else:
-            if not user.verify_password(password=self._password):
+            verified, new_hash = await get_password_hasher().verify_and_update(
+                self._password.get_secret_value(), user.hashed_pass
+            )
+            if not verified:
                 error = 'Wrong credentials'
+            elif new_hash:
+                # Hashed with another cost, that was changed since
+                user.hashed_pass = new_hash
 
         if error:
             raise HTTPException(
@@ -113,6 +121,10 @@ class GetUserFromTokenUseCase(AbstractUseCase):
 
         token_data = JWTTokenData(username=username)
 
+        cache = get_user_cache()
+        if cached_user := await cache.get(username):
+            return cached_user
+
         async with self._session_maker() as session:
             q = select(Users).where(Users.username == token_data.username)
             user: Users | None = (await session.scalars(q)).first()
@@ -120,7 +132,8 @@ class GetUserFromTokenUseCase(AbstractUseCase):
                 exception.detail = 'Token is not valid.'
                 raise exception
 
-            return user
+        await cache.set(user)
+        return user
 
 
 class UpdatePhoneHashUseCase(SQLAlchemySessionBaseUseCase):
@@ -129,8 +142,13 @@ class UpdatePhoneHashUseCase(SQLAlchemySessionBaseUseCase):
         self.user = user
         self.phone_hash = phone_hash
 
+    async def execute(self) -> None:  # type: ignore
+        await self._update()
+        # Only after commit, otherwise a concurrent request could cache the old row again
+        await get_user_cache().invalidate(self.user.username)
+
     @alchemy_session_decorator
-    async def execute(self, session: AsyncSession) -> None:
+    async def _update(self, session: AsyncSession) -> None:
         q = update(Users).where(Users.id == self.user.id).values(**{'phone_hash': self.phone_hash})
         await session.execute(q)
         await session.flush()
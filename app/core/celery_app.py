@@ -7,14 +7,18 @@ settings = get_settings()
 
 celery_app = Celery('worker', broker=settings.CELERY_BROKER_URL, backend=settings.CELERY_RESULT_BACKEND)
 
-celery_app.conf.task_routes = {'app.apps.telegpick.tasks.*': 'main-queue'}
-
-celery_app.conf.beat_schedule = {
-    'process_all_pics_task': {
-        'task': 'app.apps.telegpick.tasks.process_all_pics_task',
-        'schedule': crontab(minute="*"),
-    },
-}
+MAIN_QUEUE = 'main-queue'
+
+celery_app.conf.task_routes = {'app.apps.telegpick.tasks.*': MAIN_QUEUE}
+
+# Ticks are run by `app.apps.telegpick.scheduler`, beat is only kept for deployments that don't run it yet
+if settings.SCHEDULER_CELERY_BEAT:
+    celery_app.conf.beat_schedule = {
+        'process_all_pics_task': {
+            'task': 'app.apps.telegpick.tasks.process_all_pics_task',
+            'schedule': crontab(minute="*"),
+        },
+    }
 
 celery_app.conf.timezone = 'UTC'
 
@@ -39,18 +39,67 @@ class AppSettings(BaseSettings):
     WEB_CONCURRENCY: int = 10
 
     # DB
-    MAX_DB_CONNECTIONS = 100
+    # Shared by all `WEB_CONCURRENCY` worker processes
+    MAX_DB_CONNECTIONS: int = 100
     DB_HOST: str
     DB_USER: str
     DB_PASSWORD: SecretStr
     DB_NAME: str
     DB_PORT: int
+    DB_POOL_SIZE: int = 5
+    DB_POOL_MAX_OVERFLOW: int = 5
+    DB_POOL_TIMEOUT: int = ONE_SECOND * 30
+    DB_POOL_RECYCLE: int = ONE_MINUTE * 30
+    DB_POOL_PRE_PING: bool = True
+
+    # Users
+    # bcrypt cost, existing hashes are rehashed to it on login once it's changed
+    PASSWORD_HASH_ROUNDS: int = 18
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_CONCURRENCY: int = 16
+    # Authenticated users are cached in Redis if its url is set, and in every process otherwise
+    USER_CACHE_TTL: int = ONE_MINUTE * 5
+    USER_CACHE_SIZE: int = 10_000
+    USER_CACHE_REDIS_URL: str | None = None
 
     # telegram
     TELEGRAM_API_ID: int = 123123
     TELEGRAM_API_HASH: str = 'test'
     PICS_DIRECTORY: str = '/pics'
+    PIC_MAX_SIZE: int = 10 * 1024 * 1024
+    RENDITIONS_WORKERS: int = 2
+    # Only used to import legacy `.session` files into the database
     SESSIONS_DIRECTORY: str = '/opt/sessions'
+    TELEGRAM_POOL_SIZE: int = 100
+    TELEGRAM_POOL_IDLE_TTL: int = ONE_MINUTE * 10
+    # Sessions are cached in every process, a session replaced by another one is picked up after that long
+    TELEGRAM_SESSION_CACHE_TTL: int = ONE_MINUTE
+    # Calls per second. Global limit is shared by all processes through Redis if its url is set,
+    # and is per process otherwise, so it's then multiplied by the number of processes. Account limits are per process
+    TELEGRAM_GLOBAL_RATE: float = 20
+    TELEGRAM_GLOBAL_BURST: int = 20
+    TELEGRAM_ACCOUNT_RATE: float = 1
+    TELEGRAM_ACCOUNT_BURST: int = 3
+    TELEGRAM_LIMITER_REDIS_URL: str | None = None
+
+    # Scheduler
+    SCHEDULER_CONCURRENCY: int = 50
+    SCHEDULER_CHANGE_TIMEOUT: int = ONE_SECOND * 30
+    # Due schedules are looked up in Redis if its url is set, and in the database otherwise
+    SCHEDULER_REDIS_URL: str | None = None
+    SCHEDULER_CELERY_BEAT: bool = False
+    # Ticks are that far apart, changes due in between are made by the next tick
+    SCHEDULER_INTERVAL: int = ONE_MINUTE
+    # Changes missed by a stopped or lagging scheduler are caught up to that far back, older ones are dropped
+    SCHEDULER_MAX_LOOKBACK: int = ONE_HOUR
+    # Due changes are split by user into that many Celery tasks, so workers on several nodes share them,
+    # 0 makes them in the tick itself
+    SCHEDULER_SHARDS: int = 0
+    # Shard `n` is sent to `main-queue-shard-n` instead of `main-queue`, so shards could be pinned to workers
+    SCHEDULER_SHARD_QUEUES: bool = False
+    # With shards, changes due that far ahead are sent right away with a Celery `eta`, so ticks may be rarer.
+    # Keep it under the broker visibility timeout, since workers hold such tasks unacknowledged until then
+    SCHEDULER_DISPATCH_AHEAD: int = 0
 
     # Celery
     CELERY_BROKER_URL: str = 'test'
@@ -66,6 +115,13 @@ class AppSettings(BaseSettings):
     def get_apps_list(self) -> tuple[str, ...]:
         return tuple(f'{self.APPLICATIONS_MODULE}.{app}' for app in self.APPLICATIONS)
 
+    @property
+    def db_pool_limits(self) -> tuple[int, int]:
+        """Pool size and overflow of a single process, so all workers together don't exceed `MAX_DB_CONNECTIONS`"""
+        process_limit = max(self.MAX_DB_CONNECTIONS // self.WEB_CONCURRENCY, 1)
+        pool_size = min(self.DB_POOL_SIZE, process_limit)
+        return pool_size, min(self.DB_POOL_MAX_OVERFLOW, process_limit - pool_size)
+
     @property
     def db_url(self) -> str:
         return (
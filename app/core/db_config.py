@@ -1,17 +1,51 @@
 import importlib
+import time
+from typing import Any
 
-from sqlalchemy import NullPool
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import AsyncAdaptedQueuePool, event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlalchemy.ext.asyncio.session import async_sessionmaker
 
-from app.core.config import get_settings
+from app.core.config import AppSettings, get_settings
 from app.core.logging_conf import get_logger
+from app.core.metrics import DB_POOL_CHECKOUT_SECONDS, DB_POOL_CONNECTIONS
 
 settings = get_settings()
 logger = get_logger(__name__)
 
 
-engine = create_async_engine(settings.db_url, poolclass=NullPool)
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self) -> Any:
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started_at)
+
+
+def create_engine(app_settings: AppSettings) -> AsyncEngine:
+    pool_size, max_overflow = app_settings.db_pool_limits
+    engine = create_async_engine(
+        app_settings.db_url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=app_settings.DB_POOL_TIMEOUT,
+        pool_recycle=app_settings.DB_POOL_RECYCLE,
+        pool_pre_ping=app_settings.DB_POOL_PRE_PING,
+    )
+    DB_POOL_CONNECTIONS.labels('limit').set(pool_size + max_overflow)
+
+    # Pool counters are only updated after `checkin` events fire, so connections are counted by the events instead
+    pool = engine.sync_engine.pool
+    event.listen(pool, 'connect', lambda *args: DB_POOL_CONNECTIONS.labels('open').inc())
+    event.listen(pool, 'close', lambda *args: DB_POOL_CONNECTIONS.labels('open').dec())
+    event.listen(pool, 'checkout', lambda *args: DB_POOL_CONNECTIONS.labels('in_use').inc())
+    event.listen(pool, 'checkin', lambda *args: DB_POOL_CONNECTIONS.labels('in_use').dec())
+    return engine
+
+
+engine = create_engine(settings)
 # noinspection PyTypeChecker
 AsyncSessionMaker = async_sessionmaker(
     bind=engine,
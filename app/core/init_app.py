@@ -4,7 +4,12 @@ from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
 from app.apps.routes import api_v1_to_routers_map
+from app.apps.telegpick.connectors.pool import get_client_pool
 from app.core.config import get_settings
+from app.core.db_config import engine
+from app.core.metrics import create_metrics_app
+from app.lib.middlewares import BodySizeLimitMiddleware
+from app.lib.processes import shutdown_process_pools
 
 settings = get_settings()
 
@@ -18,12 +23,16 @@ def create_on_startup_handler(app: FastAPI) -> Callable:
 
 def create_on_shutdown_handler(app: FastAPI) -> Callable:
     async def on_shutdown():
-        pass
+        await get_client_pool().close()
+        shutdown_process_pools()
+        await engine.dispose()
 
     return on_shutdown
 
 
 def init_middlewares(app: FastAPI) -> None:
+    # Uploads are the largest bodies, multipart boundaries and form fields come on top of the file
+    app.add_middleware(BodySizeLimitMiddleware, max_size=settings.PIC_MAX_SIZE + 64 * 1024)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=['*'],
@@ -39,6 +48,10 @@ def register_routers(app: FastAPI) -> None:
             app.include_router(router, prefix=f'{settings.API_PREFIX}/{api_v}')
 
 
+def init_metrics(app: FastAPI) -> None:
+    app.mount('/metrics', create_metrics_app())
+
+
 def register_events(app: FastAPI) -> None:
     app.add_event_handler('startup', create_on_startup_handler(app))
     app.add_event_handler('shutdown', create_on_shutdown_handler(app))
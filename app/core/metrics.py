@@ -0,0 +1,28 @@
+import os
+
+from prometheus_client import CollectorRegistry, Gauge, Histogram, make_asgi_app, multiprocess
+from starlette.types import ASGIApp
+
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    'db_pool_checkout_seconds',
+    'Time spent waiting for a connection from the DB pool, including connecting',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'db_pool_connections',
+    'Connections of the DB pool: `open`, `in_use` and `limit`, which is the most a process can open',
+    ['state'],
+    multiprocess_mode='livesum',
+)
+
+
+def create_metrics_app() -> ASGIApp:
+    """
+    Prometheus endpoint.
+    With several gunicorn workers `PROMETHEUS_MULTIPROC_DIR` should be set, so metrics of all of them are collected
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return make_asgi_app()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return make_asgi_app(registry=registry)
@@ -1,11 +1,29 @@
+from typing import Any
+
 import orjson
 from pydantic import BaseModel as PydanticBaseModel
+from pydantic.utils import GetterDict
+from sqlalchemy import inspect
+from sqlalchemy.exc import NoInspectionAvailable
 
 
 def _orjson_dumps(v, *, default):
     return orjson.dumps(v, default=default).decode()
 
 
+class ORMGetterDict(GetterDict):
+    """Attributes, that weren't loaded, are left out instead of being lazy loaded, which can't be done in async code"""
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        try:
+            unloaded = inspect(self._obj).unloaded
+        except NoInspectionAvailable:
+            unloaded = set()
+        if key in unloaded:
+            return default
+        return super().get(key, default)
+
+
 class BaseModel(PydanticBaseModel):
     class Config:
         json_loads = orjson.loads
@@ -16,3 +34,4 @@ class BaseModel(PydanticBaseModel):
 class BaseModelORM(BaseModel):
     class Config(BaseModel.Config):
         orm_mode = True
+        getter_dict = ORMGetterDict
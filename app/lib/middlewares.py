@@ -0,0 +1,41 @@
+from starlette import status
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class BodySizeLimitMiddleware:
+    """
+    Rejects requests with a body larger than `max_size` with 413, before the app spools it to memory or disk.
+    Declared `Content-Length` is checked upfront, and the body is counted as it's received,
+    so a chunked or understated one is cut off as soon as it goes over the limit
+    """
+
+    def __init__(self, app: ASGIApp, max_size: int) -> None:
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        detail = f'Request body is too large, max size is {self.max_size} bytes'
+        content_length = Headers(scope=scope).get('content-length', '')
+        if content_length.isdigit() and int(content_length) > self.max_size:
+            response = JSONResponse({'detail': detail}, status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            await response(scope, receive, send)
+            return
+        received = 0
+
+        async def receive_limited() -> Message:
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > self.max_size:
+                    # Raised while the app reads the body, so its exception handlers answer with 413
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+            return message
+
+        await self.app(scope, receive_limited, send)
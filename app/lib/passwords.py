@@ -0,0 +1,57 @@
+import asyncio
+from functools import lru_cache
+from typing import Any, Callable, TypeVar
+
+from passlib.context import CryptContext
+
+from app.lib.processes import ProcessPool
+
+T = TypeVar('T')
+
+
+@lru_cache
+def get_password_context(rounds: int) -> CryptContext:
+    """Hashes with other rounds are reported by `verify_and_update`, so they are rehashed to `rounds` on login"""
+    return CryptContext(schemes=['bcrypt_sha256'], deprecated=['auto'], bcrypt_sha256__rounds=rounds)
+
+
+def hash_password(password: str, rounds: int) -> str:
+    return get_password_context(rounds).hash(secret=password)
+
+
+def verify_and_update_password(password: str, hashed_password: str, rounds: int) -> tuple[bool, str | None]:
+    return get_password_context(rounds).verify_and_update(secret=password, hash=hashed_password)
+
+
+class PasswordHasher:
+    """
+    Hashing is CPU bound and takes up to seconds, so it's done in a process pool instead of blocking the event loop.
+    No more than `concurrency` passwords are hashed or wait for a worker at once, the rest of callers wait on the loop
+    """
+
+    def __init__(self, rounds: int, workers: int, concurrency: int) -> None:
+        self.rounds = rounds
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._pool = ProcessPool(workers)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password, self.rounds)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """Whether the password is correct and its new hash, if the old one should be replaced"""
+        return await self._run(verify_and_update_password, password, hashed_password, self.rounds)
+
+    async def _run(self, func: Callable[..., T], *args: Any) -> T:
+        async with self._semaphore:
+            return await self._pool.run(func, *args)
+
+
+@lru_cache
+def get_password_hasher() -> PasswordHasher:
+    from app.core.init_app import settings
+
+    return PasswordHasher(
+        rounds=settings.PASSWORD_HASH_ROUNDS,
+        workers=settings.PASSWORD_HASH_WORKERS,
+        concurrency=settings.PASSWORD_HASH_CONCURRENCY,
+    )
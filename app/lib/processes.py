@@ -0,0 +1,40 @@
+import asyncio
+import multiprocessing
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, TypeVar
+
+T = TypeVar('T')
+
+_pools: weakref.WeakSet['ProcessPool'] = weakref.WeakSet()
+
+
+class ProcessPool:
+    """
+    Runs CPU bound functions in worker processes, so they don't block the event loop.
+    Workers are started on first use, so processes, that never need them, don't pay for them
+    """
+
+    def __init__(self, workers: int) -> None:
+        self._workers = workers
+        self._executor: ProcessPoolExecutor | None = None
+        _pools.add(self)
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        if self._executor is None:
+            # Forking a process with running threads (e.g. logging queue listener) may deadlock, so spawn instead
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def shutdown_process_pools() -> None:
+    """Stops workers of every pool, pools start them again if they're used afterwards"""
+    for pool in list(_pools):
+        pool.shutdown()
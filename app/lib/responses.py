@@ -0,0 +1,148 @@
+import os
+import re
+import stat
+from email.utils import formatdate
+from typing import Any, BinaryIO
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, JSONResponse
+from starlette.types import Receive, Scope, Send
+
+BYTE_RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+ZERO_COPY_EXTENSION = 'http.response.zerocopysend'
+
+
+class RangeNotSatisfiableError(ValueError):
+    pass
+
+
+def get_byte_range(range_header: str, size: int) -> tuple[int, int] | None:
+    """
+    Inclusive first and last byte of a single `bytes=` range, clamped to `size`. `None` if it's malformed
+    or has several ranges, so the whole content is sent instead. Raises `RangeNotSatisfiableError` if it's past the end
+    """
+    if not (range_match := BYTE_RANGE_PATTERN.match(range_header.strip())):
+        return None
+    first, last = range_match.groups()
+    if not first:
+        if not last:
+            return None
+        # Suffix range, the last `n` bytes
+        if not (suffix := int(last)) or not size:
+            raise RangeNotSatisfiableError(f'Range {range_header} is not satisfiable for {size} bytes')
+        return max(size - suffix, 0), size - 1
+    if last and int(last) < int(first):
+        return None
+    if int(first) >= size:
+        raise RangeNotSatisfiableError(f'Range {range_header} is not satisfiable for {size} bytes')
+    return int(first), min(int(last), size - 1) if last else size - 1
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison, as `If-None-Match` requires, the header may list several tags or be `*`"""
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in tags or etag.removeprefix('W/') in tags
+
+
+def _open_file(path: str | os.PathLike[str]) -> BinaryIO:
+    """Blocking, so run it in a thread"""
+    return open(path, mode='rb')
+
+
+class CachedFileResponse(FileResponse):
+    """
+    File response for content, that never changes under its `etag`.
+    `If-None-Match` is answered with 304 without touching the file, and a single range of `Range` with 206.
+    Content without a known `etag` is validated by a weak one of the file modification time and size.
+    Anything but a regular file is answered with 404. Files are only touched in threads, and sent with
+    the ASGI zero-copy extension, if the server supports it, and read in chunks otherwise
+    """
+
+    def __init__(self, path: str | os.PathLike[str], etag: str | None, cache_control: str, **kwargs: Any) -> None:
+        super().__init__(path, headers={'cache-control': cache_control}, **kwargs)
+        if etag is not None:
+            self.headers['etag'] = etag
+        self.headers['accept-ranges'] = 'bytes'
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request_headers = Headers(scope=scope)
+        if_none_match = request_headers.get('if-none-match')
+        if if_none_match and 'etag' in self.headers and etag_matches(if_none_match, self.headers['etag']):
+            await self._send_not_modified(send)
+            return
+        if self.stat_result is None:
+            try:
+                self.stat_result = await anyio.to_thread.run_sync(os.stat, self.path)
+            except FileNotFoundError:
+                pass
+        if self.stat_result is None or not stat.S_ISREG(self.stat_result.st_mode):
+            await JSONResponse({'detail': 'Not Found'}, status_code=404)(scope, receive, send)
+            return
+        size = self.stat_result.st_size
+        if 'etag' not in self.headers:
+            self.headers['etag'] = f'W/"{self.stat_result.st_mtime_ns:x}-{size:x}"'
+            if if_none_match and etag_matches(if_none_match, self.headers['etag']):
+                await self._send_not_modified(send)
+                return
+        etag = self.headers['etag']
+        self.headers['content-length'] = str(size)
+        self.headers.setdefault('last-modified', formatdate(self.stat_result.st_mtime, usegmt=True))
+        first, last = 0, size - 1
+        # Range of another version of the content is ignored, so the client gets the whole current one.
+        # Weak tags don't tell the versions apart byte for byte, so they never match `If-Range`
+        if_range = request_headers.get('if-range')
+        fresh = if_range is None or (if_range == etag and not etag.startswith('W/'))
+        if (range_header := request_headers.get('range')) and fresh:
+            try:
+                byte_range = get_byte_range(range_header, size)
+            except RangeNotSatisfiableError:
+                await self._send_not_satisfiable(send, size)
+                return
+            if byte_range is not None:
+                first, last = byte_range
+                self.status_code = 206
+                self.headers['content-range'] = f'bytes {first}-{last}/{size}'
+                self.headers['content-length'] = str(last - first + 1)
+        await send({'type': 'http.response.start', 'status': self.status_code, 'headers': self.raw_headers})
+        if self.send_header_only:
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        else:
+            await self._send_file(scope, send, offset=first, count=last - first + 1)
+        if self.background is not None:
+            await self.background()
+
+    async def _send_file(self, scope: Scope, send: Send, offset: int, count: int) -> None:
+        if ZERO_COPY_EXTENSION in scope.get('extensions', {}):
+            raw_file = await anyio.to_thread.run_sync(_open_file, self.path)
+            try:
+                await send(
+                    {
+                        'type': ZERO_COPY_EXTENSION,
+                        'file': raw_file,
+                        'offset': offset,
+                        'count': count,
+                        'more_body': False,
+                    }
+                )
+            finally:
+                await anyio.to_thread.run_sync(raw_file.close)
+            return
+        async with await anyio.open_file(self.path, mode='rb') as file:
+            await file.seek(offset)
+            more_body = True
+            while more_body:
+                chunk = await file.read(min(self.chunk_size, count))
+                count -= len(chunk)
+                more_body = count > 0 and len(chunk) > 0
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': more_body})
+
+    async def _send_not_modified(self, send: Send) -> None:
+        headers = [(key, value) for key, value in self.raw_headers if key in (b'etag', b'cache-control')]
+        await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    async def _send_not_satisfiable(self, send: Send, size: int) -> None:
+        headers = [(b'content-range', f'bytes */{size}'.encode()), (b'content-length', b'0')]
+        await send({'type': 'http.response.start', 'status': 416, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
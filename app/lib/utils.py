@@ -1,10 +1,12 @@
+import hashlib
+import os
 from decimal import Decimal
 from functools import wraps
-from typing import Any, Awaitable, Callable
+from pathlib import Path
+from typing import Any, Awaitable, BinaryIO, Callable
 
 import orjson
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 
 
 def serialize_decimals(obj: Any) -> str:
@@ -32,5 +34,39 @@ def async_wrap(func: Callable) -> Callable:
     return wrapper
 
 
-pwd_context = CryptContext(schemes=['bcrypt_sha256'], deprecated=['auto'], bcrypt_sha256__rounds=18)
+class FileTooLargeError(ValueError):
+    pass
+
+
+def copy_file_hashed(
+    source: BinaryIO, destination: Path, max_size: int, chunk_size: int = 64 * 1024
+) -> tuple[str, int]:
+    """
+    Blocking, so run it in a thread.
+    Copies `source` chunk by chunk into `destination`, hashing chunks as they're written, so the content is read once.
+    Returns SHA-256 hex digest and size of the content. Gives up as soon as more than `max_size` bytes are read,
+    `destination` is removed if the copy fails
+    """
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(destination, 'wb') as f:
+            while chunk := source.read(chunk_size):
+                size += len(chunk)
+                if size > max_size:
+                    raise FileTooLargeError(f'File is larger than {max_size} bytes')
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        destination.unlink(missing_ok=True)
+        raise
+    return digest.hexdigest(), size
+
+
+def hash_file(path: Path) -> tuple[str, int]:
+    """Blocking, so run it in a thread. Returns SHA-256 hex digest and size of the file"""
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest(), os.fstat(f.fileno()).st_size
+
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='/api/v1/users/login')
@@ -4,7 +4,7 @@ import uvicorn
 from fastapi import FastAPI
 
 from app.core.config import get_settings
-from app.core.init_app import init_middlewares, register_events, register_routers
+from app.core.init_app import init_metrics, init_middlewares, register_events, register_routers
 from app.core.logging_conf import get_logger
 
 config = get_settings()
@@ -16,6 +16,7 @@ def create_app() -> FastAPI:
     app = FastAPI(title=config.APP_NAME)
     init_middlewares(app)
     register_routers(app)
+    init_metrics(app)
     register_events(app)
     logger.info('Done!')
     return app
@@ -0,0 +1,42 @@
+"""Schedules fire minute
+
+Revision ID: 3f6b2a9c1d7e
+Revises: 91d1eebd532b
+Create Date: 2026-10-18 10:12:41.513207
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '3f6b2a9c1d7e'
+down_revision = '91d1eebd532b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('schedules', sa.Column('fire_minute', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_schedules_fire_minute'), 'schedules', ['fire_minute'], unique=False)
+    # Rows with malformed `day_time` or pic timezone are left with NULL and never fire
+    op.execute(
+        """
+        UPDATE schedules AS s
+        SET fire_minute = (
+            (
+                (split_part(s.day_time, ':', 1)::int * 60 + split_part(s.day_time, ':', 2)::int)
+                - (CASE WHEN substr(p.timezone, 1, 1) = '-' THEN -1 ELSE 1 END)
+                * (substr(p.timezone, 2, 2)::int * 60 + substr(p.timezone, 5, 2)::int)
+            ) % 1440 + 1440
+        ) % 1440
+        FROM pics AS p
+        WHERE p.id = s.pic_id
+            AND p.timezone ~ '^[+-]\\d{2}:\\d{2}$'
+            AND s.day_time ~ '^([01]\\d|2[0-3]):[0-5]\\d$'
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_schedules_fire_minute'), table_name='schedules')
+    op.drop_column('schedules', 'fire_minute')
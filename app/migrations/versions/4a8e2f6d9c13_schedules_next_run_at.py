@@ -0,0 +1,44 @@
+"""Schedules next run at
+
+Revision ID: 4a8e2f6d9c13
+Revises: d7a0c3e81f94
+Create Date: 2026-10-18 22:03:17.604218
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '4a8e2f6d9c13'
+down_revision = 'd7a0c3e81f94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('schedules', sa.Column('next_run_at', sa.DateTime(timezone=True), nullable=True))
+    # First of the next 8 UTC days, that the schedule fires at after now, see `get_next_run_at`
+    op.execute(
+        """
+        UPDATE schedules AS s
+        SET next_run_at = (
+            SELECT min(d.day + make_interval(mins => s.fire_minute))
+            FROM generate_series(
+                date_trunc('day', now() AT TIME ZONE 'utc'),
+                date_trunc('day', now() AT TIME ZONE 'utc') + interval '7 days',
+                interval '1 day'
+            ) AS d(day)
+            WHERE (s.fire_days & (1 << (extract(isodow FROM d.day)::int - 1))) != 0
+                AND d.day + make_interval(mins => s.fire_minute) > now() AT TIME ZONE 'utc'
+        ) AT TIME ZONE 'utc'
+        WHERE s.fire_minute IS NOT NULL AND s.fire_days IS NOT NULL AND s.fire_days != 0
+        """
+    )
+    op.create_index(op.f('ix_schedules_next_run_at'), 'schedules', ['next_run_at'], unique=False)
+    op.drop_index('ix_schedules_fire_minute_fire_days', table_name='schedules')
+
+
+def downgrade() -> None:
+    op.create_index('ix_schedules_fire_minute_fire_days', 'schedules', ['fire_minute', 'fire_days'], unique=False)
+    op.drop_index(op.f('ix_schedules_next_run_at'), table_name='schedules')
+    op.drop_column('schedules', 'next_run_at')
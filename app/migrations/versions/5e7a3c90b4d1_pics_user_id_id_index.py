@@ -0,0 +1,25 @@
+"""Pics (user_id, id) index
+
+Revision ID: 5e7a3c90b4d1
+Revises: c2d9f4a61e05
+Create Date: 2026-10-18 18:21:09.413862
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '5e7a3c90b4d1'
+down_revision = 'c2d9f4a61e05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Covers lookups by `user_id` as well, so the single column index isn't needed anymore
+    op.create_index('ix_pics_user_id_id', 'pics', ['user_id', 'id'], unique=False)
+    op.drop_index(op.f('ix_pics_user_id'), table_name='pics')
+
+
+def downgrade() -> None:
+    op.create_index(op.f('ix_pics_user_id'), 'pics', ['user_id'], unique=False)
+    op.drop_index('ix_pics_user_id_id', table_name='pics')
@@ -0,0 +1,34 @@
+"""Telegram sessions
+
+Revision ID: 8c41e0d5b7a2
+Revises: 3f6b2a9c1d7e
+Create Date: 2026-10-18 13:40:09.208331
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '8c41e0d5b7a2'
+down_revision = '3f6b2a9c1d7e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'telegram_sessions',
+        sa.Column('session', sa.Text(), nullable=False),
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_telegram_sessions_id'), 'telegram_sessions', ['id'], unique=True)
+    op.create_index(op.f('ix_telegram_sessions_user_id'), 'telegram_sessions', ['user_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_telegram_sessions_user_id'), table_name='telegram_sessions')
+    op.drop_index(op.f('ix_telegram_sessions_id'), table_name='telegram_sessions')
+    op.drop_table('telegram_sessions')
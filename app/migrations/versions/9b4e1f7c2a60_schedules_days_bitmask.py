@@ -0,0 +1,66 @@
+"""Schedules days of week bitmask
+
+Revision ID: 9b4e1f7c2a60
+Revises: 5e7a3c90b4d1
+Create Date: 2026-10-18 20:04:37.118526
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '9b4e1f7c2a60'
+down_revision = '5e7a3c90b4d1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # `1010000` is Monday first, so it's reversed to make Monday the lowest bit, malformed days mean every day
+    op.alter_column(
+        'schedules',
+        'days_of_week',
+        type_=sa.Integer(),
+        postgresql_using="CASE WHEN days_of_week ~ '^[01]{7}$' THEN reverse(days_of_week)::bit(7)::int ELSE 0 END",
+    )
+    op.add_column('schedules', sa.Column('fire_days', sa.Integer(), nullable=True))
+    # Days are rotated by the day, that the timezone moves the fire minute to, see `get_fire_days`
+    op.execute(
+        """
+        UPDATE schedules AS s
+        SET fire_days = ((d.days << d.shift) | (d.days >> (7 - d.shift))) & 127
+        FROM (
+            SELECT
+                s.id,
+                CASE WHEN s.days_of_week = 0 THEN 127 ELSE s.days_of_week END AS days,
+                (
+                    floor(
+                        (
+                            (split_part(s.day_time, ':', 1)::int * 60 + split_part(s.day_time, ':', 2)::int)
+                            - (CASE WHEN substr(p.timezone, 1, 1) = '-' THEN -1 ELSE 1 END)
+                            * (substr(p.timezone, 2, 2)::int * 60 + substr(p.timezone, 5, 2)::int)
+                        ) / 1440.0
+                    )::int + 7
+                ) % 7 AS shift
+            FROM schedules AS s
+            JOIN pics AS p ON p.id = s.pic_id
+            WHERE p.timezone ~ '^[+-]\\d{2}:\\d{2}$'
+                AND s.day_time ~ '^([01]\\d|2[0-3]):[0-5]\\d$'
+        ) AS d
+        WHERE d.id = s.id
+        """
+    )
+    op.create_index('ix_schedules_fire_minute_fire_days', 'schedules', ['fire_minute', 'fire_days'], unique=False)
+    op.drop_index(op.f('ix_schedules_fire_minute'), table_name='schedules')
+
+
+def downgrade() -> None:
+    op.create_index(op.f('ix_schedules_fire_minute'), 'schedules', ['fire_minute'], unique=False)
+    op.drop_index('ix_schedules_fire_minute_fire_days', table_name='schedules')
+    op.drop_column('schedules', 'fire_days')
+    op.alter_column(
+        'schedules',
+        'days_of_week',
+        type_=sa.String(length=7),
+        postgresql_using='reverse(days_of_week::bit(7)::text)',
+    )
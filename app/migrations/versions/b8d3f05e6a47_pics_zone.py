@@ -0,0 +1,25 @@
+"""Pics IANA zone
+
+Revision ID: b8d3f05e6a47
+Revises: e5b19c7a3d28
+Create Date: 2026-10-18 23:37:12.584019
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'b8d3f05e6a47'
+down_revision = 'e5b19c7a3d28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('pics', sa.Column('zone', sa.String(length=64), nullable=True))
+    op.create_index('ix_pics_zone_timezone', 'pics', ['zone', 'timezone'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_pics_zone_timezone', table_name='pics')
+    op.drop_column('pics', 'zone')
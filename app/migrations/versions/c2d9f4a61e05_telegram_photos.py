@@ -0,0 +1,36 @@
+"""Telegram photos
+
+Revision ID: c2d9f4a61e05
+Revises: 8c41e0d5b7a2
+Create Date: 2026-10-18 15:02:55.720164
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'c2d9f4a61e05'
+down_revision = '8c41e0d5b7a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'telegram_photos',
+        sa.Column('photo_id', sa.BigInteger(), nullable=False),
+        sa.Column('access_hash', sa.BigInteger(), nullable=False),
+        sa.Column('file_reference', sa.LargeBinary(), nullable=False),
+        sa.Column('pic_id', sa.UUID(), nullable=False),
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.ForeignKeyConstraint(['pic_id'], ['pics.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_telegram_photos_id'), 'telegram_photos', ['id'], unique=True)
+    op.create_index(op.f('ix_telegram_photos_pic_id'), 'telegram_photos', ['pic_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_telegram_photos_pic_id'), table_name='telegram_photos')
+    op.drop_index(op.f('ix_telegram_photos_id'), table_name='telegram_photos')
+    op.drop_table('telegram_photos')
@@ -0,0 +1,42 @@
+"""Content-addressed pic files
+
+Revision ID: c41e7a9b2f58
+Revises: b8d3f05e6a47
+Create Date: 2026-10-19 00:26:03.871452
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'c41e7a9b2f58'
+down_revision = 'b8d3f05e6a47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'pic_files',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('filename', sa.String(length=256), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('refs', sa.Integer(), nullable=False),
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_pic_files_id'), 'pic_files', ['id'], unique=True)
+    op.create_index(op.f('ix_pic_files_sha256'), 'pic_files', ['sha256'], unique=True)
+    # Files uploaded before are kept as they are, they're not hashed, nor removed along with their pics
+    op.add_column('pics', sa.Column('sha256', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_pics_sha256'), 'pics', ['sha256'], unique=False)
+    op.create_foreign_key('pics_sha256_fkey', 'pics', 'pic_files', ['sha256'], ['sha256'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('pics_sha256_fkey', 'pics', type_='foreignkey')
+    op.drop_index(op.f('ix_pics_sha256'), table_name='pics')
+    op.drop_column('pics', 'sha256')
+    op.drop_index(op.f('ix_pic_files_sha256'), table_name='pic_files')
+    op.drop_index(op.f('ix_pic_files_id'), table_name='pic_files')
+    op.drop_table('pic_files')
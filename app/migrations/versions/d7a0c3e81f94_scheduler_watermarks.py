@@ -0,0 +1,33 @@
+"""Scheduler watermarks
+
+Revision ID: d7a0c3e81f94
+Revises: 9b4e1f7c2a60
+Create Date: 2026-10-18 21:12:45.530917
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'd7a0c3e81f94'
+down_revision = '9b4e1f7c2a60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'scheduler_watermarks',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('processed_minute', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_scheduler_watermarks_id'), 'scheduler_watermarks', ['id'], unique=True)
+    op.create_index(op.f('ix_scheduler_watermarks_name'), 'scheduler_watermarks', ['name'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_scheduler_watermarks_name'), table_name='scheduler_watermarks')
+    op.drop_index(op.f('ix_scheduler_watermarks_id'), table_name='scheduler_watermarks')
+    op.drop_table('scheduler_watermarks')
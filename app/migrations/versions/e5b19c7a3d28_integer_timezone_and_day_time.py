@@ -0,0 +1,77 @@
+"""Integer timezone and day time
+
+Revision ID: e5b19c7a3d28
+Revises: 4a8e2f6d9c13
+Create Date: 2026-10-18 22:48:51.207364
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'e5b19c7a3d28'
+down_revision = '4a8e2f6d9c13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Malformed values, e.g. the former `0` default, become `NULL`, see `parse_utc_offset` and `parse_day_time`
+    op.alter_column('pics', 'timezone', nullable=True)
+    op.alter_column('schedules', 'day_time', nullable=True)
+    op.alter_column(
+        'pics',
+        'timezone',
+        type_=sa.Integer(),
+        postgresql_using="""
+        CASE WHEN timezone ~ '^[+-](0\\d|1[0-4]):[0-5]\\d$'
+            THEN (CASE WHEN left(timezone, 1) = '-' THEN -1 ELSE 1 END)
+                * (substr(timezone, 2, 2)::int * 60 + substr(timezone, 5, 2)::int)
+        END
+        """,
+    )
+    op.alter_column(
+        'schedules',
+        'day_time',
+        type_=sa.Integer(),
+        postgresql_using="""
+        CASE WHEN day_time ~ '^([01]\\d|2[0-3]):[0-5]\\d$'
+            THEN split_part(day_time, ':', 1)::int * 60 + split_part(day_time, ':', 2)::int
+        END
+        """,
+    )
+    # Offsets beyond ±14:00 were accepted before, so such schedules are not fired anymore
+    op.execute(
+        """
+        UPDATE schedules AS s
+        SET fire_minute = NULL, fire_days = NULL, next_run_at = NULL
+        FROM pics AS p
+        WHERE p.id = s.pic_id AND (p.timezone IS NULL OR s.day_time IS NULL) AND s.fire_minute IS NOT NULL
+        """
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        'schedules',
+        'day_time',
+        type_=sa.String(length=7),
+        postgresql_using="""
+        CASE WHEN day_time IS NULL THEN ''
+            ELSE lpad((day_time / 60)::text, 2, '0') || ':' || lpad(mod(day_time, 60)::text, 2, '0')
+        END
+        """,
+    )
+    op.alter_column(
+        'pics',
+        'timezone',
+        type_=sa.String(length=6),
+        postgresql_using="""
+        CASE WHEN timezone IS NULL THEN '0'
+            ELSE (CASE WHEN timezone < 0 THEN '-' ELSE '+' END)
+                || lpad((abs(timezone) / 60)::text, 2, '0') || ':' || lpad(mod(abs(timezone), 60)::text, 2, '0')
+        END
+        """,
+    )
+    op.alter_column('schedules', 'day_time', nullable=False)
+    op.alter_column('pics', 'timezone', nullable=False)
@@ -0,0 +1,43 @@
+"""Pic zones
+
+Revision ID: f2a6d4c8e193
+Revises: c41e7a9b2f58
+Create Date: 2026-10-19 09:14:27.402518
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'f2a6d4c8e193'
+down_revision = 'c41e7a9b2f58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'pic_zones',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('utc_offset', sa.Integer(), nullable=False),
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_pic_zones_id'), 'pic_zones', ['id'], unique=True)
+    op.create_index(op.f('ix_pic_zones_name'), 'pic_zones', ['name'], unique=True)
+    # Zones, that are already in use, with the offset most of their pics have
+    op.execute(
+        """
+        INSERT INTO pic_zones (id, name, utc_offset)
+        SELECT gen_random_uuid(), zone, mode() WITHIN GROUP (ORDER BY timezone)
+        FROM pics
+        WHERE zone IS NOT NULL AND timezone IS NOT NULL
+        GROUP BY zone
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_pic_zones_name'), table_name='pic_zones')
+    op.drop_index(op.f('ix_pic_zones_id'), table_name='pic_zones')
+    op.drop_table('pic_zones')
@@ -41,3 +41,10 @@ max_requests = env.int('MAX_WORKER_REQUESTS', 1000)
 max_requests_jitter = env.int('MAX_WORKER_REQUESTS_JITTER', 500)
 timeout = env.int('TIMEOUT', 60)
 keepalive = env.int('KEEP_ALIVE', 5)
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -6,12 +6,15 @@ from fastapi.testclient import TestClient
 from pydantic import SecretStr
 from pytest_mock import MockerFixture
 from pytest_socket import socket_allow_hosts
-from sqlalchemy import select
+from sqlalchemy import NullPool, select
+from sqlalchemy.ext.asyncio import create_async_engine
 
+from app.apps.users.cache import get_user_cache
 from app.apps.users.models import Users
 from app.core.config import AppSettings, get_settings
 from app.core.db_config import AsyncSessionMaker
 from app.core.init_db import migrate_db_sync
+from app.lib.passwords import hash_password
 from app.main import create_app
 
 
@@ -26,6 +29,18 @@ def set_test_settings(mocker: MockerFixture) -> None:
     )
 
 
+@pytest.fixture(scope='session', autouse=True)
+def unpooled_db_engine():
+    # Every test and every `TestClient` call run in their own event loop, so connections can't be reused between them
+    AsyncSessionMaker.configure(bind=create_async_engine(get_settings().db_url, poolclass=NullPool))
+
+
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    # Users are recreated by every test, so the ones cached by previous tests are gone
+    get_user_cache.cache_clear()
+
+
 @pytest.fixture(autouse=True)
 def migrate():
     env = Env()
@@ -48,7 +63,7 @@ async def normal_user_token_headers(client: TestClient):
         user = (await session.scalars(select(Users).where(Users.username == 'login-user'))).first()
         if not user:
             user = Users(username='login-user')
-            user.hash_password('pass')
+            user.hashed_pass = hash_password('pass', get_settings().PASSWORD_HASH_ROUNDS)
             session.add(user)
             await session.flush()
             await session.commit()
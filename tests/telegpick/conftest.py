@@ -0,0 +1,13 @@
+import pytest
+
+from app.apps.users.models import Users
+from app.core.db_config import AsyncSessionMaker
+
+
+@pytest.fixture
+async def user() -> Users:
+    async with AsyncSessionMaker() as session:
+        user = Users(username='test', hashed_pass='133', phone='123')
+        session.add(user)
+        await session.commit()
+    return user
@@ -1,11 +1,22 @@
+import uuid
+
 import pytest
 from fastapi import Cookie
 from fastapi.testclient import TestClient
 from pytest_mock import MockerFixture
 
-from app.apps.telegpick.dtos import ListPicsDTO, PicsDTO
+from app.apps.telegpick.dtos import (
+    BulkErrorDTO,
+    BulkPicsResultDTO,
+    BulkSchedulesResultDTO,
+    ListPicsDTO,
+    PicsDTO,
+    SchedulesDTO,
+)
 from app.apps.telegpick.models import Pics, Schedules
 from app.apps.telegpick.use_cases import (
+    BulkPicsForUserUseCase,
+    BulkSchedulesForPicUseCase,
     CreatePicForUserUseCase,
     CreateScheduleForPicUseCase,
     DeletePicForUserUseCase,
@@ -13,6 +24,7 @@ from app.apps.telegpick.use_cases import (
     PatchPicForUserUseCase,
     PatchScheduleForPicUseCase,
 )
+from app.apps.telegpick.utils import encode_cursor
 from app.apps.users.dtos import UserDTO
 from tests.telegpick.test_use_cases import session_maker
 
@@ -60,6 +72,26 @@ async def test_get_pics_endpoint(client: TestClient, mocker: MockerFixture, auth
     assert response_json == ListPicsDTO(pics=pics).dict()
 
 
+@pytest.mark.asyncio
+async def test_get_pics_endpoint_returns_next_cursor(
+    client: TestClient, mocker: MockerFixture, auth_cookie: Cookie
+) -> None:
+    pics = [PicsDTO(id=uuid.uuid4(), filename="pic1.jpg"), PicsDTO(id=uuid.uuid4(), filename="pic2.jpg")]
+    mock = mocker.patch("app.apps.telegpick.use_cases.FetchPicsForUserUseCase.execute", return_value=pics)
+
+    response = client.get("/api/v1/telegpick/pic/list?limit=2", cookies=auth_cookie)
+
+    assert response.status_code == 200
+    assert response.json()["next_cursor"] == encode_cursor(pics[-1].id)
+
+    mock.return_value = pics[:1]
+    cursor = encode_cursor(pics[-1].id)
+    response = client.get(f"/api/v1/telegpick/pic/list?limit=2&cursor={cursor}", cookies=auth_cookie)
+
+    assert response.status_code == 200
+    assert response.json()["next_cursor"] is None
+
+
 @pytest.mark.asyncio
 async def test_create_pic_endpoint(client: TestClient, mocker: MockerFixture, auth_cookie: Cookie) -> None:
     mocker.patch.object(CreatePicForUserUseCase, "execute", return_value=PicsDTO())
@@ -70,6 +102,49 @@ async def test_create_pic_endpoint(client: TestClient, mocker: MockerFixture, au
     assert response.json() == PicsDTO().dict()
 
 
+@pytest.mark.asyncio
+async def test_bulk_pics_endpoint(client: TestClient, mocker: MockerFixture, auth_cookie: Cookie) -> None:
+    result = BulkPicsResultDTO(deleted=[uuid.uuid4()], errors=[BulkErrorDTO(operation="delete", index=1, detail="")])
+    mock = mocker.patch.object(BulkPicsForUserUseCase, "execute", return_value=result)
+
+    response = client.post(
+        "/api/v1/telegpick/pic/bulk", json={"delete": [str(pic_id) for pic_id in result.deleted]}, cookies=auth_cookie
+    )
+
+    assert response.status_code == 200
+    assert BulkPicsResultDTO(**response.json()) == result
+    mock.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_bulk_pics_endpoint_rejects_too_long_filename(
+    client: TestClient, mocker: MockerFixture, auth_cookie: Cookie
+) -> None:
+    mock = mocker.patch.object(BulkPicsForUserUseCase, "execute")
+
+    response = client.post(
+        "/api/v1/telegpick/pic/bulk",
+        json={"update": [{"id": str(uuid.uuid4()), "filename": "n" * 257}]},
+        cookies=auth_cookie,
+    )
+
+    assert response.status_code == 422
+    mock.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_bulk_schedules_endpoint(client: TestClient, mocker: MockerFixture, auth_cookie: Cookie) -> None:
+    result = BulkSchedulesResultDTO(created=[SchedulesDTO(id=uuid.uuid4(), day_time="10:00")])
+    mocker.patch.object(BulkSchedulesForPicUseCase, "execute", return_value=result)
+
+    response = client.post(
+        f"/api/v1/telegpick/{uuid.uuid4()}/schedule/bulk", json={"create": [{"day_time": "10:00"}]}, cookies=auth_cookie
+    )
+
+    assert response.status_code == 200
+    assert BulkSchedulesResultDTO(**response.json()) == result
+
+
 @pytest.mark.asyncio
 async def test_patch_pic_endpoint(client: TestClient, mocker: MockerFixture, auth_cookie: Cookie) -> None:
     mocker.patch.object(PatchPicForUserUseCase, "execute", return_value=PicsDTO())
@@ -152,7 +227,7 @@ async def test_delete_schedule_endpoint(
         pic = Pics(user_id=test_user.id, filename='test.jpg')
         session.add(pic)
         await session.flush()
-        schedule = Schedules(pic_id=pic.id, day_time='16:00')
+        schedule = Schedules(pic_id=pic.id, day_time=960)
         session.add(schedule)
         await session.flush()
     pic_id = str(pic.id)
@@ -0,0 +1,135 @@
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock
+from uuid import UUID
+
+import pytest
+from pytest_mock import MockerFixture
+from telethon.errors import AuthKeyUnregisteredError, FileReferenceExpiredError, FloodWaitError, PhotoIdInvalidError
+from telethon.sessions import StringSession
+from telethon.tl.functions.photos import DeletePhotosRequest, UpdateProfilePhotoRequest, UploadProfilePhotoRequest
+from telethon.tl.types import InputPhoto
+
+from app.apps.telegpick.connectors.limiter import TelegramRateLimiter
+from app.apps.telegpick.connectors.photos import LoadTelegramPhotoUseCase, SaveTelegramPhotoUseCase
+from app.apps.telegpick.connectors.telegram import TelegramConnector, TelegramException, TelegramFloodWaitException
+from app.apps.telegpick.models import Pics
+from app.apps.users.models import Users
+from app.core.db_config import AsyncSessionMaker
+
+PIC_ID = '11111111-1111-1111-1111-111111111111'
+
+
+@pytest.fixture(autouse=True)
+async def pic(user: Users) -> None:
+    async with AsyncSessionMaker() as session:
+        session.add(Pics(id=UUID(PIC_ID), user_id=user.id, filename='pic.jpg'))
+        await session.commit()
+
+
+@pytest.fixture
+def client(mocker: MockerFixture) -> AsyncMock:
+    client = AsyncMock()
+
+    @asynccontextmanager
+    async def _acquire_client(*args, **kwargs):
+        yield client
+
+    mocker.patch.object(TelegramConnector, '_acquire_client', _acquire_client)
+    return client
+
+
+def _photo(photo_id: int, file_reference: bytes = b'ref') -> MagicMock:
+    return MagicMock(photo=InputPhoto(id=photo_id, access_hash=2, file_reference=file_reference))
+
+
+@pytest.mark.asyncio
+async def test_set_avatar_uploads_new_pic(user: Users, client: AsyncMock) -> None:
+    client.return_value = _photo(1)
+
+    await TelegramConnector(user).set_avatar(pic_id=PIC_ID, filename='pic.jpg')
+
+    client.upload_file.assert_called_once()
+    assert isinstance(client.call_args.args[0], UploadProfilePhotoRequest)
+    assert (await LoadTelegramPhotoUseCase(PIC_ID).execute()).id == 1
+
+
+@pytest.mark.asyncio
+async def test_set_avatar_reuses_uploaded_pic(user: Users, client: AsyncMock) -> None:
+    await SaveTelegramPhotoUseCase(PIC_ID, InputPhoto(id=1, access_hash=2, file_reference=b'ref')).execute()
+    client.return_value = _photo(1, b'new-ref')
+
+    await TelegramConnector(user).set_avatar(pic_id=PIC_ID, filename='pic.jpg')
+
+    client.upload_file.assert_not_called()
+    assert isinstance(client.call_args.args[0], UpdateProfilePhotoRequest)
+    assert (await LoadTelegramPhotoUseCase(PIC_ID).execute()).file_reference == b'new-ref'
+
+
+@pytest.mark.asyncio
+async def test_set_avatar_refreshes_expired_file_reference(user: Users, client: AsyncMock) -> None:
+    await SaveTelegramPhotoUseCase(PIC_ID, InputPhoto(id=1, access_hash=2, file_reference=b'ref')).execute()
+    client.side_effect = [FileReferenceExpiredError(request=None), _photo(1, b'new-ref')]
+
+    async def iter_profile_photos(*args, **kwargs):
+        yield InputPhoto(id=1, access_hash=2, file_reference=b'new-ref')
+
+    client.iter_profile_photos = iter_profile_photos
+
+    await TelegramConnector(user).set_avatar(pic_id=PIC_ID, filename='pic.jpg')
+
+    client.upload_file.assert_not_called()
+    assert client.call_args.args[0].id.file_reference == b'new-ref'
+
+
+@pytest.mark.asyncio
+async def test_set_avatar_uploads_pic_again_if_photo_is_gone(user: Users, client: AsyncMock) -> None:
+    await SaveTelegramPhotoUseCase(PIC_ID, InputPhoto(id=1, access_hash=2, file_reference=b'ref')).execute()
+    client.side_effect = [PhotoIdInvalidError(request=None), _photo(3)]
+
+    await TelegramConnector(user).set_avatar(pic_id=PIC_ID, filename='pic.jpg')
+
+    client.upload_file.assert_called_once()
+    assert (await LoadTelegramPhotoUseCase(PIC_ID).execute()).id == 3
+
+
+@pytest.mark.asyncio
+async def test_delete_photos(user: Users, client: AsyncMock) -> None:
+    photo = InputPhoto(id=1, access_hash=2, file_reference=b'ref')
+
+    await TelegramConnector(user).delete_photos([photo])
+
+    request = client.call_args.args[0]
+    assert isinstance(request, DeletePhotosRequest) and request.id == [photo]
+
+
+@pytest.mark.asyncio
+async def test_flood_wait_blocks_account(user: Users, mocker: MockerFixture) -> None:
+    limiter = TelegramRateLimiter(global_rate=10, global_burst=10, account_rate=10, account_burst=10)
+    mocker.patch('app.apps.telegpick.connectors.telegram.get_rate_limiter', return_value=limiter)
+    mocker.patch('app.apps.telegpick.connectors.telegram.get_session_storage', return_value=AsyncMock())
+    telegram_client = AsyncMock(side_effect=FloodWaitError(request=None, capture=30))
+    mocker.patch.object(TelegramConnector, '_create_client', return_value=telegram_client)
+
+    with pytest.raises(TelegramFloodWaitException) as e:
+        await TelegramConnector(user).set_avatar(pic_id=PIC_ID, filename='pic.jpg')
+    assert e.value.seconds == 30
+    assert 29 < limiter.get_wait(str(user.id)) <= 30
+
+    telegram_client.reset_mock()
+    with pytest.raises(TelegramFloodWaitException):
+        await TelegramConnector(user).set_avatar(pic_id=PIC_ID, filename='pic.jpg')
+    telegram_client.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_auth_error_invalidates_cached_session(user: Users, mocker: MockerFixture) -> None:
+    storage = MagicMock(load=AsyncMock(return_value=StringSession()), save=AsyncMock())
+    mocker.patch('app.apps.telegpick.connectors.telegram.get_session_storage', return_value=storage)
+    telegram_client = AsyncMock(side_effect=AuthKeyUnregisteredError(request=None))
+    mocker.patch.object(TelegramConnector, '_create_client', return_value=telegram_client)
+
+    with pytest.raises(TelegramException):
+        await TelegramConnector(user).set_avatar(pic_id=PIC_ID, filename='pic.jpg')
+
+    storage.invalidate.assert_called_once_with(str(user.id))
+    storage.save.assert_not_called()
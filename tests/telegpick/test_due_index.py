@@ -0,0 +1,246 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from app.apps.telegpick.dtos import PicsDTO, SchedulesDTO
+from app.apps.telegpick.due_index import (
+    FireTime,
+    RebuildDueIndexUseCase,
+    ScheduleDueIndex,
+    get_due_index,
+    get_index_entries,
+    get_minute_of_week,
+    get_schedule_id,
+    get_week_ranges,
+)
+from app.apps.telegpick.models import Pics, SchedulerWatermarks, Schedules
+from app.apps.telegpick.use_cases import (
+    CreateScheduleForPicUseCase,
+    DeletePicForUserUseCase,
+    PatchPicForUserUseCase,
+    ProcessPicsTaskUseCase,
+)
+from app.apps.telegpick.utils import ALL_DAYS
+from app.apps.users.models import Users
+from app.core.db_config import AsyncSessionMaker
+from app.core.init_app import settings
+
+# Thursday
+TASK_TIME = datetime(2023, 6, 1, 7, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+async def pic_with_schedules(user: Users) -> tuple[Pics, list[Schedules]]:
+    async with AsyncSessionMaker() as session:
+        pic = Pics(user_id=user.id, filename='pic.jpg', timezone=180)
+        session.add(pic)
+        await session.flush()
+        schedules = [
+            Schedules(pic_id=pic.id, day_time=600, fire_minute=7 * 60, fire_days=ALL_DAYS, next_run_at=TASK_TIME),
+            Schedules(
+                pic_id=pic.id,
+                day_time=660,
+                fire_minute=8 * 60,
+                fire_days=ALL_DAYS,
+                next_run_at=TASK_TIME + timedelta(hours=1),
+            ),
+        ]
+        session.add_all(schedules)
+        await session.commit()
+    return pic, schedules
+
+
+@pytest.fixture
+def due_index(mocker: MockerFixture) -> MagicMock:
+    index = MagicMock(spec=ScheduleDueIndex)
+    mocker.patch('app.apps.telegpick.use_cases.get_due_index', return_value=index)
+    return index
+
+
+def test_get_minute_of_week() -> None:
+    assert get_minute_of_week(TASK_TIME) == 3 * 24 * 60 + 7 * 60
+    assert get_minute_of_week(datetime(2023, 6, 5, 0, 30, tzinfo=timezone.utc)) == 30
+
+
+@pytest.mark.parametrize(
+    'start, end, expected',
+    [
+        (TASK_TIME, TASK_TIME, [(4740, 4740)]),
+        (
+            datetime(2023, 6, 4, 23, 58, tzinfo=timezone.utc),
+            datetime(2023, 6, 5, 0, 1, tzinfo=timezone.utc),
+            [(10078, 10079), (0, 1)],
+        ),
+        (datetime(2023, 5, 1, tzinfo=timezone.utc), TASK_TIME, [(0, 10079)]),
+    ],
+)
+def test_get_week_ranges(start: datetime, end: datetime, expected: list[tuple[int, int]]) -> None:
+    assert get_week_ranges(start, end) == expected
+
+
+def test_get_index_entries() -> None:
+    schedule_id = uuid.uuid4()
+
+    entries = get_index_entries(FireTime(schedule_id, 7 * 60, ALL_DAYS))
+
+    assert len(entries) == 7
+    assert entries[f'{schedule_id}:3'] == get_minute_of_week(TASK_TIME)
+    assert get_index_entries(FireTime(schedule_id, 7 * 60, 0b0001001)).keys() == {
+        f'{schedule_id}:0',
+        f'{schedule_id}:3',
+    }
+    assert get_index_entries(FireTime(schedule_id, None, None)) == {}
+    assert {get_schedule_id(member.encode()) for member in entries} == {schedule_id}
+
+
+@pytest.mark.asyncio
+async def test_get_due_index_is_disabled_without_redis_url() -> None:
+    assert get_due_index() is None
+
+
+@pytest.mark.asyncio
+async def test_get_due_index_is_kept_for_loop(mocker: MockerFixture) -> None:
+    mocker.patch.object(settings, 'SCHEDULER_REDIS_URL', 'redis://localhost:6379/0')
+
+    index = get_due_index()
+
+    assert isinstance(index, ScheduleDueIndex)
+    assert get_due_index() is index
+
+
+@pytest.mark.asyncio
+async def test_rebuild_swaps_index_at_once() -> None:
+    index = ScheduleDueIndex('redis://localhost:6379/0')
+    redis = index._redis = MagicMock()
+    redis.delete, redis.zadd, redis.rename = AsyncMock(), AsyncMock(), AsyncMock()
+    redis.exists = AsyncMock(return_value=1)
+    schedule_id = uuid.uuid4()
+
+    fire_time = FireTime(schedule_id, 7 * 60, ALL_DAYS)
+
+    async def fire_times() -> AsyncIterator[FireTime]:
+        yield fire_time
+        yield FireTime(uuid.uuid4(), None, None)
+
+    count = await index.rebuild(fire_times())
+
+    assert count == 2
+    redis.zadd.assert_awaited_once_with(f'{index.KEY}:rebuild', get_index_entries(fire_time))
+    redis.rename.assert_awaited_once_with(f'{index.KEY}:rebuild', index.KEY)
+
+
+@pytest.mark.asyncio
+async def test_rebuild_use_case_streams_fire_times(
+    pic_with_schedules: tuple[Pics, list[Schedules]], mocker: MockerFixture
+) -> None:
+    _, schedules = pic_with_schedules
+    mocker.patch('app.apps.telegpick.due_index.REBUILD_CHUNK_SIZE', 1)
+    index = ScheduleDueIndex('redis://localhost:6379/0')
+    redis = index._redis = MagicMock()
+    redis.delete, redis.zadd, redis.rename = AsyncMock(), AsyncMock(), AsyncMock()
+    redis.exists = AsyncMock(return_value=1)
+
+    count = await RebuildDueIndexUseCase(index).execute()
+
+    assert count == 2
+    assert redis.zadd.await_count == 2
+    written = {member for call in redis.zadd.await_args_list for member in call.args[1]}
+    assert {get_schedule_id(member) for member in written} == {schedule.id for schedule in schedules}
+
+
+@pytest.mark.asyncio
+async def test_process_pics_hydrates_indexed_schedules(
+    pic_with_schedules: tuple[Pics, list[Schedules]], due_index: MagicMock, mocker: MockerFixture
+) -> None:
+    pic, schedules = pic_with_schedules
+    due_index.get_due = AsyncMock(return_value={schedules[0].id})
+    change = mocker.patch('app.apps.telegpick.use_cases.ChangeAvatarUseCase.execute', return_value=None)
+
+    await ProcessPicsTaskUseCase(TASK_TIME).execute()
+
+    due_index.get_due.assert_awaited_once_with(TASK_TIME, TASK_TIME)
+    change.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_process_pics_catches_up_schedules_left_behind_index(
+    pic_with_schedules: tuple[Pics, list[Schedules]], due_index: MagicMock, mocker: MockerFixture
+) -> None:
+    # Minute of the first schedule was already claimed, e.g. by a tick dispatching ahead before it was created
+    async with AsyncSessionMaker() as session:
+        session.add(SchedulerWatermarks(name=ProcessPicsTaskUseCase.WATERMARK, processed_minute=TASK_TIME))
+        await session.commit()
+    due_index.get_due = AsyncMock(return_value=set())
+    change = mocker.patch('app.apps.telegpick.use_cases.ChangeAvatarUseCase.execute', return_value=None)
+
+    await ProcessPicsTaskUseCase(TASK_TIME + timedelta(minutes=1)).execute()
+
+    change.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_process_pics_ignores_stale_index_entries(
+    pic_with_schedules: tuple[Pics, list[Schedules]], due_index: MagicMock, mocker: MockerFixture
+) -> None:
+    # Fires at 08:00, so it's not due at 07:00 anymore
+    due_index.get_due = AsyncMock(return_value={pic_with_schedules[1][1].id})
+    change = mocker.patch('app.apps.telegpick.use_cases.ChangeAvatarUseCase.execute', return_value=None)
+
+    await ProcessPicsTaskUseCase(TASK_TIME).execute()
+
+    change.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_process_pics_falls_back_to_database(
+    pic_with_schedules: tuple[Pics, list[Schedules]], due_index: MagicMock, mocker: MockerFixture
+) -> None:
+    due_index.get_due = AsyncMock(side_effect=ConnectionError)
+    change = mocker.patch('app.apps.telegpick.use_cases.ChangeAvatarUseCase.execute', return_value=None)
+
+    await ProcessPicsTaskUseCase(TASK_TIME).execute()
+
+    change.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_create_schedule_is_indexed(user: Users, mocker: MockerFixture) -> None:
+    index_schedules = mocker.patch('app.apps.telegpick.use_cases.index_schedules')
+    async with AsyncSessionMaker() as session:
+        pic = Pics(user_id=user.id, filename='pic.jpg', timezone=180)
+        session.add(pic)
+        await session.commit()
+
+    schedule = await CreateScheduleForPicUseCase(str(pic.id), SchedulesDTO(day_time='10:00')).execute()
+
+    index_schedules.assert_awaited_once_with([FireTime(schedule.id, 7 * 60, ALL_DAYS)])
+
+
+@pytest.mark.asyncio
+async def test_pic_timezone_change_reindexes_schedules(
+    user: Users, pic_with_schedules: tuple[Pics, list[Schedules]], mocker: MockerFixture
+) -> None:
+    index_schedules = mocker.patch('app.apps.telegpick.use_cases.index_schedules')
+    pic, schedules = pic_with_schedules
+
+    await PatchPicForUserUseCase(PicsDTO(id=pic.id, timezone='+00:00'), user).execute()
+
+    assert sorted(index_schedules.await_args.args[0]) == sorted(
+        [FireTime(schedules[0].id, 10 * 60, ALL_DAYS), FireTime(schedules[1].id, 11 * 60, ALL_DAYS)]
+    )
+
+
+@pytest.mark.asyncio
+async def test_delete_pic_unindexes_schedules(
+    user: Users, pic_with_schedules: tuple[Pics, list[Schedules]], mocker: MockerFixture
+) -> None:
+    unindex_schedules = mocker.patch('app.apps.telegpick.use_cases.unindex_schedules')
+    pic, schedules = pic_with_schedules
+
+    await DeletePicForUserUseCase(pic.id, user).execute()
+
+    assert sorted(unindex_schedules.await_args.args[0]) == sorted(schedule.id for schedule in schedules)
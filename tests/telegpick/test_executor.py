@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from app.apps.telegpick.dtos import TickStatsDTO
+from app.apps.telegpick.executor import ConcurrentUseCaseExecutor, UseCaseDeferred
+from app.lib.classes import AbstractUseCase
+
+
+class SleepingUseCase(AbstractUseCase):
+    running = 0
+    max_running = 0
+
+    def __init__(self, delay: float, fail: bool = False, defer: bool = False) -> None:
+        self.delay = delay
+        self.fail = fail
+        self.defer = defer
+
+    async def execute(self) -> None:
+        SleepingUseCase.running += 1
+        SleepingUseCase.max_running = max(SleepingUseCase.max_running, SleepingUseCase.running)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise ValueError('Telegram is down')
+            if self.defer:
+                raise UseCaseDeferred('Flood wait')
+        finally:
+            SleepingUseCase.running -= 1
+
+
+@pytest.mark.asyncio
+async def test_executor_collects_stats() -> None:
+    use_cases = [
+        SleepingUseCase(0),
+        SleepingUseCase(0),
+        SleepingUseCase(0, fail=True),
+        SleepingUseCase(0, defer=True),
+        SleepingUseCase(1),
+    ]
+
+    stats = await ConcurrentUseCaseExecutor(concurrency=10, timeout=0.1).run(use_cases)
+
+    assert stats == TickStatsDTO(done=2, failed=1, timed_out=1, deferred=1)
+
+
+@pytest.mark.asyncio
+async def test_executor_respects_concurrency_limit() -> None:
+    SleepingUseCase.max_running = 0
+
+    stats = await ConcurrentUseCaseExecutor(concurrency=3, timeout=1).run(SleepingUseCase(0.01) for _ in range(10))
+
+    assert stats.done == 10
+    assert SleepingUseCase.max_running == 3
@@ -0,0 +1,93 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.apps.telegpick.connectors.limiter import RedisTokenBucket, TelegramRateLimiter, TokenBucket
+
+
+def test_token_bucket_lets_burst_through() -> None:
+    bucket = TokenBucket(rate=1, capacity=3)
+
+    waits = [bucket.reserve() for _ in range(4)]
+
+    assert waits[:3] == [0, 0, 0]
+    assert 0.9 < waits[3] <= 1
+
+
+def test_token_bucket_queues_reserved_calls() -> None:
+    bucket = TokenBucket(rate=10, capacity=1)
+
+    waits = [bucket.reserve() for _ in range(3)]
+
+    assert waits[0] == 0
+    assert waits[1] < waits[2] <= 0.2
+
+
+def test_blocked_bucket_waits_until_block_is_over() -> None:
+    bucket = TokenBucket(rate=10, capacity=10)
+
+    bucket.block(30)
+
+    assert 29 < bucket.reserve() <= 30
+    assert not bucket.is_idle
+
+
+def test_rate_limiter_blocks_only_flooded_account() -> None:
+    limiter = TelegramRateLimiter(global_rate=10, global_burst=10, account_rate=1, account_burst=1)
+
+    limiter.block('1', 30)
+
+    assert 29 < limiter.get_wait('1') <= 30
+    assert limiter.get_wait('2') == 0
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_prunes_idle_accounts(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(TelegramRateLimiter, 'MAX_BUCKETS', 2)
+    limiter = TelegramRateLimiter(global_rate=100, global_burst=100, account_rate=1000, account_burst=1)
+    limiter.block('blocked', 30)
+    await limiter.acquire('idle')
+    await asyncio.sleep(0.01)
+
+    await limiter.acquire('new')
+
+    assert limiter.get_wait('blocked') > 0
+    assert set(limiter._accounts) == {'blocked', 'new'}
+
+
+@pytest.mark.asyncio
+async def test_redis_token_bucket_runs_script_with_its_limits() -> None:
+    bucket = RedisTokenBucket('redis://localhost:6379/0', rate=10, capacity=5)
+    script = bucket._scripts[asyncio.get_running_loop()] = AsyncMock(return_value=b'0.25')
+
+    assert await bucket.reserve() == 0.25
+    script.assert_awaited_once_with(keys=[RedisTokenBucket.KEY], args=[10, 5])
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_reserves_shared_global_token(monkeypatch: pytest.MonkeyPatch) -> None:
+    limiter = TelegramRateLimiter(
+        global_rate=1, global_burst=1, account_rate=10, account_burst=10, redis_url='redis://localhost:6379/0'
+    )
+    reserve = AsyncMock(return_value=0)
+    monkeypatch.setattr(limiter._shared, 'reserve', reserve)
+
+    await limiter.acquire('1')
+    await limiter.acquire('2')
+
+    assert reserve.await_count == 2
+    # Local bucket is left for Redis failures, so it's still full
+    assert limiter._global.reserve() == 0
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_falls_back_to_local_global_limit(monkeypatch: pytest.MonkeyPatch) -> None:
+    limiter = TelegramRateLimiter(
+        global_rate=1, global_burst=1, account_rate=10, account_burst=10, redis_url='redis://localhost:6379/0'
+    )
+    monkeypatch.setattr(limiter._shared, 'reserve', AsyncMock(side_effect=ConnectionError('Redis is down')))
+
+    await limiter.acquire('1')
+
+    assert limiter._global.reserve() > 0
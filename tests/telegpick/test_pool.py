@@ -0,0 +1,101 @@
+import pytest
+from telethon.errors import AuthKeyUnregisteredError
+
+from app.apps.telegpick.connectors.pool import TelegramClientPool
+
+
+class FakeClient:
+    def __init__(self) -> None:
+        self.connected = False
+        self.connects = 0
+
+    async def connect(self) -> None:
+        self.connected = True
+        self.connects += 1
+
+    async def disconnect(self) -> None:
+        self.connected = False
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_connected_client() -> None:
+    pool = TelegramClientPool(max_size=2, idle_ttl=60)
+
+    async with pool.acquire('user', FakeClient) as first:
+        pass
+    async with pool.acquire('user', FakeClient) as second:
+        pass
+
+    assert first is second
+    assert first.connects == 1
+    assert len(pool) == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_reconnects_dead_client() -> None:
+    pool = TelegramClientPool(max_size=2, idle_ttl=60)
+
+    async with pool.acquire('user', FakeClient) as client:
+        await client.disconnect()
+    async with pool.acquire('user', FakeClient) as reconnected:
+        pass
+
+    assert reconnected is client
+    assert client.is_connected()
+    assert client.connects == 2
+
+
+@pytest.mark.asyncio
+async def test_pool_discards_client_on_connection_error() -> None:
+    pool = TelegramClientPool(max_size=2, idle_ttl=60)
+
+    with pytest.raises(ConnectionError):
+        async with pool.acquire('user', FakeClient) as client:
+            raise ConnectionError
+
+    assert not client.is_connected()
+    assert len(pool) == 0
+
+
+@pytest.mark.asyncio
+async def test_pool_evicts_least_recently_used_client() -> None:
+    pool = TelegramClientPool(max_size=2, idle_ttl=60)
+
+    async with pool.acquire('first', FakeClient) as first:
+        pass
+    async with pool.acquire('second', FakeClient) as second:
+        pass
+    async with pool.acquire('first', FakeClient):
+        pass
+    async with pool.acquire('third', FakeClient):
+        pass
+
+    assert first.is_connected()
+    assert not second.is_connected()
+    assert len(pool) == 2
+
+
+@pytest.mark.asyncio
+async def test_pool_evicts_idle_clients() -> None:
+    pool = TelegramClientPool(max_size=2, idle_ttl=0)
+
+    async with pool.acquire('user', FakeClient) as client:
+        assert client.is_connected()
+
+    assert not client.is_connected()
+    assert len(pool) == 0
+
+
+@pytest.mark.asyncio
+async def test_pool_discards_client_on_auth_error() -> None:
+    pool = TelegramClientPool(max_size=2, idle_ttl=60)
+
+    with pytest.raises(AuthKeyUnregisteredError):
+        async with pool.acquire('user', FakeClient) as client:
+            raise AuthKeyUnregisteredError(request=None)
+
+    assert not client.is_connected()
+    assert len(pool) == 0
@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from app.apps.telegpick.renditions import (
+    AVATAR_SIZE,
+    THUMBNAIL_SIZE,
+    create_renditions,
+    get_avatar_path,
+    get_thumbnail_path,
+    make_renditions,
+)
+from app.lib.processes import shutdown_process_pools
+
+
+def test_make_renditions_crops_and_downscales(tmp_path: Path) -> None:
+    Image.new('RGBA', (2000, 1000), color='red').save(tmp_path / 'pic.png')
+
+    make_renditions(str(tmp_path), 'pic.png')
+
+    with Image.open(get_avatar_path(str(tmp_path), 'pic.png')) as avatar:
+        assert avatar.format == 'JPEG'
+        assert avatar.size == (AVATAR_SIZE, AVATAR_SIZE)
+    with Image.open(get_thumbnail_path(str(tmp_path), 'pic.png')) as thumbnail:
+        assert thumbnail.size == (THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+
+
+def test_make_renditions_does_not_upscale(tmp_path: Path) -> None:
+    Image.new('RGB', (300, 400)).save(tmp_path / 'pic.jpg')
+
+    make_renditions(str(tmp_path), 'pic.jpg')
+
+    with Image.open(get_avatar_path(str(tmp_path), 'pic.jpg')) as avatar:
+        assert avatar.size == (300, 300)
+
+
+@pytest.mark.asyncio
+async def test_create_renditions_in_process_pool(tmp_path: Path) -> None:
+    Image.new('RGB', (100, 100)).save(tmp_path / 'pic.jpg')
+
+    try:
+        await create_renditions(str(tmp_path), 'pic.jpg')
+    finally:
+        shutdown_process_pools()
+
+    assert get_avatar_path(str(tmp_path), 'pic.jpg').exists()
+    assert get_thumbnail_path(str(tmp_path), 'pic.jpg').exists()
@@ -0,0 +1,56 @@
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+from pytest_mock import MockerFixture
+
+from app.apps.telegpick.scheduler import MinuteScheduler, get_next_tick
+
+
+@pytest.mark.parametrize('now, expected', [(0, 60), (59.999, 60), (60, 120), (125.5, 180)])
+def test_get_next_tick(now: float, expected: float) -> None:
+    assert get_next_tick(now, 60) == expected
+
+
+@pytest.mark.asyncio
+async def test_scheduler_ticks_at_boundaries(mocker: MockerFixture) -> None:
+    mocker.patch.object(MinuteScheduler, 'INTERVAL', 0.05)
+    ticks: list[tuple[datetime, float]] = []
+
+    async def tick(tick_time: datetime) -> None:
+        ticks.append((tick_time, time.time()))
+        # Slower than the interval, so ticks overlap instead of delaying the next ones
+        await asyncio.sleep(0.08)
+
+    scheduler = MinuteScheduler(tick)
+    run = asyncio.create_task(scheduler.run())
+    await asyncio.sleep(0.32)
+    scheduler.stop()
+    await asyncio.wait_for(run, timeout=1)
+
+    assert len(ticks) >= 4
+    for tick_time, started_at in ticks:
+        assert tick_time.timestamp() / 0.05 == pytest.approx(round(tick_time.timestamp() / 0.05))
+        assert 0 <= started_at - tick_time.timestamp() < 0.05
+    intervals = [b[0].timestamp() - a[0].timestamp() for a, b in zip(ticks, ticks[1:])]
+    assert intervals == pytest.approx([0.05] * len(intervals), abs=1e-3)
+
+
+@pytest.mark.asyncio
+async def test_scheduler_survives_failing_tick(mocker: MockerFixture) -> None:
+    mocker.patch.object(MinuteScheduler, 'INTERVAL', 0.02)
+    calls = 0
+
+    async def tick(tick_time: datetime) -> None:
+        nonlocal calls
+        calls += 1
+        raise RuntimeError('broken tick')
+
+    scheduler = MinuteScheduler(tick)
+    run = asyncio.create_task(scheduler.run())
+    await asyncio.sleep(0.1)
+    scheduler.stop()
+    await asyncio.wait_for(run, timeout=1)
+
+    assert calls >= 2
@@ -0,0 +1,89 @@
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+from telethon.crypto import AuthKey
+from telethon.sessions import SQLiteSession, StringSession
+
+from app.apps.telegpick.connectors.sessions import (
+    LoadTelegramSessionUseCase,
+    SaveTelegramSessionUseCase,
+    TelegramSessionStorage,
+    import_session_files,
+)
+from app.apps.users.models import Users
+
+
+def _make_session(auth_key: bytes) -> StringSession:
+    telegram_session = StringSession()
+    telegram_session.set_dc(2, '149.154.167.51', 443)
+    telegram_session.auth_key = AuthKey(auth_key)
+    return telegram_session
+
+
+@pytest.mark.asyncio
+async def test_session_storage_saves_and_loads_session(user: Users) -> None:
+    telegram_session = _make_session(b'\x01' * 256)
+
+    await TelegramSessionStorage().save(str(user.id), telegram_session)
+    loaded = await TelegramSessionStorage().load(str(user.id))
+
+    assert loaded.save() == telegram_session.save()
+    assert loaded.dc_id == 2
+
+
+@pytest.mark.asyncio
+async def test_session_storage_overwrites_session(user: Users) -> None:
+    storage = TelegramSessionStorage()
+
+    await storage.save(str(user.id), _make_session(b'\x01' * 256))
+    await storage.save(str(user.id), _make_session(b'\x02' * 256))
+
+    assert await LoadTelegramSessionUseCase(str(user.id)).execute() == _make_session(b'\x02' * 256).save()
+
+
+@pytest.mark.asyncio
+async def test_session_storage_caches_sessions(user: Users, mocker: MockerFixture) -> None:
+    storage = TelegramSessionStorage()
+    load = mocker.patch.object(LoadTelegramSessionUseCase, 'execute', return_value=None)
+    save = mocker.patch.object(SaveTelegramSessionUseCase, 'execute', return_value=None)
+
+    empty = await storage.load(str(user.id))
+    await storage.load(str(user.id))
+    await storage.save(str(user.id), empty)
+    await storage.save(str(user.id), _make_session(b'\x01' * 256))
+    await storage.save(str(user.id), _make_session(b'\x01' * 256))
+
+    assert load.call_count == 1
+    assert save.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_session_storage_reloads_expired_and_invalidated_sessions(user: Users, mocker: MockerFixture) -> None:
+    load = mocker.patch.object(LoadTelegramSessionUseCase, 'execute', return_value=None)
+    save = mocker.patch.object(SaveTelegramSessionUseCase, 'execute', return_value=None)
+    storage = TelegramSessionStorage(ttl=0)
+
+    empty = await storage.load(str(user.id))
+    await storage.load(str(user.id))
+    await storage.save(str(user.id), empty)
+    assert (load.call_count, save.call_count) == (2, 0)
+
+    storage = TelegramSessionStorage(ttl=60)
+    await storage.load(str(user.id))
+    storage.invalidate(str(user.id))
+    await storage.load(str(user.id))
+    assert load.call_count == 4
+
+
+@pytest.mark.asyncio
+async def test_import_session_files(user: Users, tmp_path: Path) -> None:
+    file_session = SQLiteSession(str(tmp_path / str(user.id)))
+    file_session.set_dc(2, '149.154.167.51', 443)
+    file_session.auth_key = AuthKey(b'\x01' * 256)
+    file_session.save()
+    file_session.close()
+    SQLiteSession(str(tmp_path / 'unauthorized')).close()
+
+    assert await import_session_files(str(tmp_path)) == 1
+    assert await LoadTelegramSessionUseCase(str(user.id)).execute() == _make_session(b'\x01' * 256).save()
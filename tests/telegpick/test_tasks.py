@@ -2,7 +2,7 @@ from datetime import datetime, timedelta
 
 from pytest_mock import MockerFixture
 
-from app.apps.telegpick.tasks import process_all_pics_task
+from app.apps.telegpick.tasks import process_all_pics_task, process_pics_shard_task
 
 
 def test_process_all_pics_task(mocker: MockerFixture) -> None:
@@ -13,3 +13,10 @@ def test_process_all_pics_task(mocker: MockerFixture) -> None:
     mock = mocker.patch('app.apps.telegpick.tasks.ProcessPicsTaskUseCase.execute', return_value=True)
     process_all_pics_task()
     mock.assert_called_once()
+
+
+def test_process_pics_shard_task(mocker: MockerFixture) -> None:
+    mock = mocker.patch('app.apps.telegpick.tasks.ProcessPicsShardUseCase', autospec=True)
+    due_time = datetime(2023, 6, 1, 7, 0)
+    process_pics_shard_task(pic_ids=['pic-id'], due_time=due_time.isoformat())
+    mock.assert_called_once_with(['pic-id'], due_time)
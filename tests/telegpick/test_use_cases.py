@@ -1,32 +1,50 @@
+import hashlib
+import re
 import uuid
-from datetime import datetime
-from unittest import mock
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from pathlib import Path
+from typing import Iterator
 from unittest.mock import MagicMock, patch
 from uuid import UUID
 
 import pytest
 from fastapi import UploadFile
+from pydantic import ValidationError
 from pytest_mock import MockerFixture
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import event, select, update
+from telethon.tl.types import InputPhoto
 
-from app.apps.telegpick.dtos import PicsDTO, SchedulesDTO
-from app.apps.telegpick.models import Pics, Schedules
+from app.apps.telegpick.connectors.telegram import TelegramFloodWaitException
+from app.apps.telegpick.dtos import BulkPicsDTO, BulkSchedulesDTO, PicsDTO, SchedulesDTO
+from app.apps.telegpick.due_index import FireTime
+from app.apps.telegpick.executor import UseCaseDeferred
+from app.apps.telegpick.models import PicFiles, Pics, PicZones, SchedulerWatermarks, Schedules, TelegramPhotos
 from app.apps.telegpick.use_cases import (
+    BackfillPicFilesUseCase,
+    BulkPicsForUserUseCase,
+    BulkSchedulesForPicUseCase,
     ChangeAvatarUseCase,
+    ChangeDeferredAvatarUseCase,
     CreatePicForUserUseCase,
     CreateScheduleForPicUseCase,
     DeletePicForUserUseCase,
     DeleteScheduleForPicUseCase,
+    DeleteTelegramPhotosUseCase,
     FetchPicsForUserUseCase,
     PatchPicForUserUseCase,
     PatchScheduleForPicUseCase,
+    ProcessPicsShardUseCase,
     ProcessPicsTaskUseCase,
+    ReturnPicFileByIdUseCase,
     UploadPicOnDiskUseCase,
     UserSendVerificationUseCase,
+    get_fire_time,
 )
+from app.apps.telegpick.utils import ALL_DAYS, encode_cursor, get_next_run_at, parse_day_time, parse_days_of_week
 from app.apps.users.models import Users
 from app.core.db_config import AsyncSessionMaker
+from app.core.init_app import settings
 from app.lib.classes import BadRequestException
 
 session_maker = AsyncSessionMaker
@@ -37,16 +55,6 @@ async def pic():
     return PicsDTO(id=None, filename="test.jpg")
 
 
-@pytest.fixture
-async def user() -> Users:
-    async with session_maker() as session:
-        user = Users(username='test', hashed_pass='133', phone='123')
-        session.add(user)
-        await session.flush()
-        await session.commit()
-    return user
-
-
 @pytest.mark.asyncio
 async def test_fetch_pic_use_case_execute_with_existing_user() -> None:
     async with session_maker() as session:
@@ -72,6 +80,23 @@ async def test_fetch_pic_use_case_execute_with_existing_user() -> None:
         assert result[1].filename == "pic2.jpg"
 
 
+@pytest.mark.asyncio
+async def test_fetch_pic_use_case_execute_with_cursor(user: Users) -> None:
+    pic_ids = sorted(uuid.uuid4() for _ in range(3))
+    async with session_maker() as session:
+        session.add_all(Pics(id=pic_id, user_id=user.id, filename=f'{pic_id}.jpg') for pic_id in pic_ids)
+        await session.commit()
+
+    first_page = await FetchPicsForUserUseCase(user, 1, 2).execute()
+    second_page = await FetchPicsForUserUseCase(user, 1, 2, cursor=encode_cursor(pic_ids[1])).execute()
+
+    assert [pic.id for pic in first_page] == pic_ids[:2]
+    assert [pic.id for pic in second_page] == pic_ids[2:]
+
+    with pytest.raises(BadRequestException):
+        await FetchPicsForUserUseCase(user, 1, 2, cursor='invalid').execute()
+
+
 @pytest.mark.asyncio
 async def test_fetch_pic_use_case_execute_with_user_without_pics(user: Users) -> None:
     use_case = FetchPicsForUserUseCase(user, 1, 10)
@@ -129,11 +154,57 @@ async def test_delete_pic_use_case_execute_with_existing_pic(user: Users) -> Non
         assert deleted_pic is None
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize('filename, removed', [('new_pic.jpg', True), ('pic.jpg', False)])
+async def test_photo_of_replaced_or_deleted_pic_is_deleted_from_telegram(
+    user: Users, mocker: MockerFixture, filename: str, removed: bool
+) -> None:
+    pic_id = uuid.uuid4()
+    async with session_maker() as session:
+        session.add(Pics(id=pic_id, user_id=user.id, filename='pic.jpg'))
+        await session.flush()
+        session.add(TelegramPhotos(pic_id=pic_id, photo_id=1, access_hash=2, file_reference=b'ref'))
+        await session.commit()
+    send_task = mocker.patch('app.core.celery_app.celery_app.send_task')
+    photos_kwargs = {'user_id': str(user.id), 'photos': [[1, 2, b'ref'.hex()]]}
+
+    await PatchPicForUserUseCase(PicsDTO(id=pic_id, filename=filename), user).execute()
+
+    assert send_task.called == removed
+    if removed:
+        send_task.assert_called_once_with(
+            'app.apps.telegpick.tasks.delete_telegram_photos_task', kwargs=photos_kwargs, countdown=None
+        )
+        return
+    await DeletePicForUserUseCase(pic_id=pic_id, user=user).execute()
+    send_task.assert_called_once_with(
+        'app.apps.telegpick.tasks.delete_telegram_photos_task', kwargs=photos_kwargs, countdown=None
+    )
+
+
+@pytest.mark.asyncio
+async def test_delete_telegram_photos_use_case_requeues_on_flood_wait(user: Users, mocker: MockerFixture) -> None:
+    delete_photos = mocker.patch(
+        'app.apps.telegpick.use_cases.TelegramConnector.delete_photos', side_effect=TelegramFloodWaitException(30)
+    )
+    send_task = mocker.patch('app.core.celery_app.celery_app.send_task')
+    photo = InputPhoto(id=1, access_hash=2, file_reference=b'ref')
+
+    await DeleteTelegramPhotosUseCase(str(user.id), [photo]).execute()
+
+    delete_photos.assert_called_once_with([photo])
+    send_task.assert_called_once_with(
+        'app.apps.telegpick.tasks.delete_telegram_photos_task',
+        kwargs={'user_id': str(user.id), 'photos': [[1, 2, b'ref'.hex()]]},
+        countdown=30,
+    )
+
+
 @pytest.mark.asyncio
 async def test_create_schedule_use_case_execute(user: Users) -> None:
     schedule_data = {
         'days_of_week': '0010000',
-        'day_time': '09:00:00',
+        'day_time': '09:00',
     }
     schedule = SchedulesDTO(**schedule_data)
 
@@ -147,11 +218,48 @@ async def test_create_schedule_use_case_execute(user: Users) -> None:
         created_schedule = await use_case.execute()
 
     assert created_schedule.pic_id == '11111111-1111-1111-1111-111111111111'
-    assert created_schedule.days_of_week == '0010000'
-    assert created_schedule.day_time == '09:00:00'
+    assert created_schedule.days_of_week == 0b0000100
+    assert created_schedule.day_time == 9 * 60
     assert created_schedule.id is not None
 
 
+@pytest.mark.parametrize(
+    'dto, data',
+    [
+        (SchedulesDTO, {'day_time': '09:00:00'}),
+        (SchedulesDTO, {'day_time': '24:00'}),
+        (PicsDTO, {'timezone': '0'}),
+        (PicsDTO, {'zone': 'Nope/Zone'}),
+    ],
+)
+def test_dtos_reject_malformed_time(dto: type[SchedulesDTO | PicsDTO], data: dict) -> None:
+    with pytest.raises(ValidationError):
+        dto(**data)
+
+
+def test_dtos_format_stored_time() -> None:
+    assert SchedulesDTO.from_orm(Schedules(day_time=9 * 60 + 5)).day_time == '09:05'
+    assert PicsDTO.from_orm(Pics(filename='pic.jpg', timezone=-330)).timezone == '-05:30'
+    assert PicsDTO.from_orm(Pics(filename='pic.jpg', timezone=None)).timezone is None
+
+
+@pytest.mark.asyncio
+async def test_pic_zone_sets_its_current_offset(user: Users, mocker: MockerFixture) -> None:
+    mocker.patch('app.apps.telegpick.use_cases.get_zone_offset', return_value=120)
+
+    created = await CreatePicForUserUseCase(PicsDTO(filename='pic.jpg', zone='Europe/Berlin'), user).execute()
+
+    assert (created.zone, created.timezone) == ('Europe/Berlin', 120)
+    async with session_maker() as session:
+        pic_zone = (await session.scalars(select(PicZones))).one()
+    assert (pic_zone.name, pic_zone.utc_offset) == ('Europe/Berlin', 120)
+
+    patched = await PatchPicForUserUseCase(PicsDTO(id=created.id, timezone='+03:00'), user).execute()
+
+    # Fixed offset replaces the zone
+    assert (patched.zone, patched.timezone) == (None, 180)
+
+
 @pytest.mark.asyncio
 async def test_patch_schedule_use_case_execute(user: Users) -> None:
     async with session_maker() as session:
@@ -161,7 +269,7 @@ async def test_patch_schedule_use_case_execute(user: Users) -> None:
         await session.flush()
         await session.commit()
         schedule_id = '11111111-1111-1111-1111-111111111111'
-        schedule = Schedules(id=schedule_id, pic_id=pic_id, days_of_week='1000000', day_time='10:00')
+        schedule = Schedules(id=schedule_id, pic_id=pic_id, days_of_week=0b0000001, day_time=600)
         session.add(schedule)
         await session.flush()
         await session.commit()
@@ -176,7 +284,7 @@ async def test_patch_schedule_use_case_execute(user: Users) -> None:
     assert isinstance(updated_schedule, Schedules)
     assert updated_schedule.id == UUID(schedule_id)
     assert updated_schedule.pic_id == UUID(pic_id)
-    assert updated_schedule.days_of_week == updated_schedule_data['days_of_week']
+    assert updated_schedule.days_of_week == 0b0000010
     assert updated_schedule.day_time == schedule.day_time
 
 
@@ -189,7 +297,7 @@ async def test_delete_schedule_use_case_execute(user: Users) -> None:
         await session.flush()
         await session.commit()
         schedule_id = '11111111-1111-1111-1111-111111111111'
-        schedule = Schedules(id=schedule_id, pic_id=pic_id, days_of_week='1000000', day_time='10:00')
+        schedule = Schedules(id=schedule_id, pic_id=pic_id, days_of_week=0b0000001, day_time=600)
         session.add(schedule)
         await session.flush()
         await session.commit()
@@ -204,29 +312,622 @@ async def test_delete_schedule_use_case_execute(user: Users) -> None:
 
 @pytest.mark.asyncio
 async def test_process_pics_task_use_case(user: Users) -> None:
-    pic_mock = MagicMock(filename='123')
-    user_mock = MagicMock()
-
-    use_case = ProcessPicsTaskUseCase(datetime.now())
+    use_case = ProcessPicsTaskUseCase(datetime(2023, 6, 1, 7, 0, tzinfo=timezone.utc))
     async with session_maker() as session:
         pic_id = UUID('123e4567-e89b-12d3-a456-426655440000')
-        existing_pic = Pics(id=UUID('123e4567-e89b-12d3-a456-426655440000'), user_id=user.id, filename='pic.jpg')
+        existing_pic = Pics(id=pic_id, user_id=user.id, filename='pic.jpg', timezone=180)
         session.add(existing_pic)
         await session.flush()
         await session.commit()
-        schedule_id = UUID('11111111-1111-1111-1111-111111111111')
-        schedule = Schedules(id=schedule_id, pic_id=pic_id, days_of_week='1000000', day_time='10:00')
+        schedules = [
+            Schedules(
+                pic_id=pic_id,
+                days_of_week=0b0001000,
+                day_time=600,
+                fire_minute=7 * 60,
+                fire_days=0b0001000,
+                next_run_at=datetime(2023, 6, 1, 7, 0, tzinfo=timezone.utc),
+            ),
+            Schedules(
+                pic_id=pic_id,
+                days_of_week=0b0001000,
+                day_time=660,
+                fire_minute=8 * 60,
+                fire_days=0b0001000,
+                next_run_at=datetime(2023, 6, 1, 8, 0, tzinfo=timezone.utc),
+            ),
+        ]
+        session.add_all(schedules)
+        await session.flush()
+        await session.commit()
+
+    with patch('app.apps.telegpick.use_cases.ChangeAvatarUseCase.execute', return_value=None):
+        await use_case.execute()
+        ChangeAvatarUseCase.execute.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_process_pics_task_skips_days_not_selected(user: Users) -> None:
+    # Thursday
+    use_case = ProcessPicsTaskUseCase(datetime(2023, 6, 1, 7, 0, tzinfo=timezone.utc))
+    async with session_maker() as session:
+        pic = Pics(user_id=user.id, filename='pic.jpg', timezone=180)
+        session.add(pic)
+        await session.flush()
+        session.add(
+            Schedules(
+                pic_id=pic.id,
+                days_of_week=0b0000001,
+                day_time=600,
+                fire_minute=7 * 60,
+                fire_days=1,
+                next_run_at=datetime(2023, 6, 5, 7, 0, tzinfo=timezone.utc),
+            )
+        )
+        await session.commit()
+
+    with patch('app.apps.telegpick.use_cases.ChangeAvatarUseCase.execute', return_value=None):
+        await use_case.execute()
+        ChangeAvatarUseCase.execute.assert_not_called()
+
+
+async def _set_watermark(processed_minute: datetime) -> None:
+    async with session_maker() as session:
+        session.add(SchedulerWatermarks(name=ProcessPicsTaskUseCase.WATERMARK, processed_minute=processed_minute))
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_process_pics_task_catches_up_latest_change_of_user(user: Users) -> None:
+    other_user = Users(username='other', hashed_pass='133', phone='456')
+    async with session_maker() as session:
+        session.add(other_user)
+        await session.flush()
+        pics = [Pics(user_id=user.id, filename=f'{i}.jpg', timezone=0) for i in range(3)]
+        pics.append(Pics(user_id=other_user.id, filename='other.jpg', timezone=0))
+        session.add_all(pics)
+        await session.flush()
+        # The last pic of the user is due after the tick, so it's left for the next one
+        for pic, minute in zip(pics, [6 * 60 + 57, 6 * 60 + 58, 7 * 60 + 1, 6 * 60 + 56]):
+            next_run_at = datetime(2023, 6, 1, minute // 60, minute % 60, tzinfo=timezone.utc)
+            session.add(
+                Schedules(pic_id=pic.id, day_time=None, fire_minute=minute, fire_days=ALL_DAYS, next_run_at=next_run_at)
+            )
+        await session.commit()
+    await _set_watermark(datetime(2023, 6, 1, 6, 55, tzinfo=timezone.utc))
+    task_time = datetime(2023, 6, 1, 7, 0, 3, tzinfo=timezone.utc)
+
+    with patch('app.apps.telegpick.use_cases.ChangeAvatarUseCase.__init__', return_value=None) as change, patch(
+        'app.apps.telegpick.use_cases.ChangeAvatarUseCase.execute', return_value=None
+    ):
+        await ProcessPicsTaskUseCase(task_time).execute()
+        # Same minute again, e.g. from an overlapping tick
+        stats = await ProcessPicsTaskUseCase(task_time).execute()
+
+    assert sorted(call.args[1] for call in change.call_args_list) == sorted([pics[1].id, pics[3].id])
+    assert stats.done == 0
+    async with session_maker() as session:
+        watermark = (await session.scalars(select(SchedulerWatermarks))).one()
+    assert watermark.processed_minute == datetime(2023, 6, 1, 7, 0, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+async def test_process_pics_task_limits_lookback(user: Users, mocker: MockerFixture) -> None:
+    async with session_maker() as session:
+        pics = [Pics(user_id=user.id, filename=f'{i}.jpg', timezone=0) for i in range(2)]
+        session.add_all(pics)
+        await session.flush()
+        # Wednesday 23:30 and Thursday 00:30
+        for pic, fire_minute, fire_days in [(pics[0], 23 * 60 + 30, 0b0000100), (pics[1], 30, 0b0001000)]:
+            next_run_at = get_next_run_at(fire_minute, fire_days, datetime(2023, 5, 31, 20, 0, tzinfo=timezone.utc))
+            session.add(
+                Schedules(
+                    pic_id=pic.id, day_time=None, fire_minute=fire_minute, fire_days=fire_days, next_run_at=next_run_at
+                )
+            )
+        await session.commit()
+    await _set_watermark(datetime(2023, 5, 31, 20, 0, tzinfo=timezone.utc))
+    mocker.patch.object(settings, 'SCHEDULER_MAX_LOOKBACK', 2 * 60 * 60)
+    use_case = ProcessPicsTaskUseCase(datetime(2023, 6, 1, 1, 0, tzinfo=timezone.utc))
+
+    with patch('app.apps.telegpick.use_cases.ChangeAvatarUseCase.execute', return_value=None):
+        await use_case.execute()
+        ChangeAvatarUseCase.execute.assert_called_once()
+
+    assert use_case.first_minute == datetime(2023, 5, 31, 23, 0, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('days_of_week, winner', [(0, 2), (0b0001000, 0)])
+async def test_process_pics_task_coalesces_changes_of_user(user: Users, days_of_week: int, winner: int) -> None:
+    pic_ids = sorted(uuid.uuid4() for _ in range(3))
+    async with session_maker() as session:
+        session.add_all(Pics(id=pic_id, user_id=user.id, filename='pic.jpg', timezone=0) for pic_id in pic_ids)
+        await session.flush()
+        session.add_all(
+            Schedules(
+                pic_id=pic_id,
+                days_of_week=days,
+                day_time=420,
+                fire_minute=7 * 60,
+                fire_days=ALL_DAYS,
+                next_run_at=datetime(2023, 6, 1, 7, 0, tzinfo=timezone.utc),
+            )
+            for pic_id, days in zip(pic_ids, [days_of_week, 0, 0])
+        )
+        await session.commit()
+
+    with patch('app.apps.telegpick.use_cases.ChangeAvatarUseCase.__init__', return_value=None) as change, patch(
+        'app.apps.telegpick.use_cases.ChangeAvatarUseCase.execute', return_value=None
+    ):
+        stats = await ProcessPicsTaskUseCase(datetime(2023, 6, 1, 7, 0, tzinfo=timezone.utc)).execute()
+
+    change.assert_called_once()
+    assert change.call_args.args[1] == pic_ids[winner]
+    assert stats.coalesced == 2
+
+
+@pytest.mark.asyncio
+async def test_process_pics_task_dispatches_users_to_shards(mocker: MockerFixture) -> None:
+    task_time = datetime(2023, 6, 1, 7, 0, tzinfo=timezone.utc)
+    async with session_maker() as session:
+        users = [Users(username=f'user{i}', hashed_pass='133', phone=str(i)) for i in range(6)]
+        session.add_all(users)
+        await session.flush()
+        pics = [Pics(user_id=user.id, filename='pic.jpg', timezone=0) for user in users for _ in range(2)]
+        session.add_all(pics)
+        await session.flush()
+        session.add_all(
+            Schedules(pic_id=pic.id, day_time=420, fire_minute=7 * 60, fire_days=ALL_DAYS, next_run_at=task_time)
+            for pic in pics
+        )
+        await session.commit()
+    mocker.patch.object(settings, 'SCHEDULER_SHARDS', 3)
+    mocker.patch.object(settings, 'SCHEDULER_SHARD_QUEUES', True)
+    send_task = mocker.patch('app.core.celery_app.celery_app.send_task')
+
+    stats = await ProcessPicsTaskUseCase(task_time).execute()
+
+    # Both pics of a user are due, so only one of them is changed
+    assert stats.dispatched == 6
+    assert stats.coalesced == 6
+    pic_users = {str(pic.id): pic.user_id for pic in pics}
+    shard_users = {}
+    for call in send_task.call_args_list:
+        assert call.args == ('app.apps.telegpick.tasks.process_pics_shard_task',)
+        assert call.kwargs['kwargs']['due_time'] == task_time.isoformat()
+        shard_users[call.kwargs['queue']] = {pic_users[pic_id] for pic_id in call.kwargs['kwargs']['pic_ids']}
+    # Every user is in exactly one shard
+    assert sum(len(user_ids) for user_ids in shard_users.values()) == 6
+    assert set().union(*shard_users.values()) == {user.id for user in users}
+    assert all(queue.startswith('main-queue-shard-') for queue in shard_users)
+
+
+@pytest.mark.asyncio
+async def test_process_pics_task_moves_schedules_to_next_run(user: Users) -> None:
+    task_time = datetime(2023, 6, 1, 7, 0, tzinfo=timezone.utc)
+    async with session_maker() as session:
+        pic = Pics(user_id=user.id, filename='pic.jpg', timezone=0)
+        session.add(pic)
+        await session.flush()
+        schedule = Schedules(
+            pic_id=pic.id, day_time=None, fire_minute=7 * 60, fire_days=0b0001001, next_run_at=task_time
+        )
         session.add(schedule)
+        await session.commit()
+
+    with patch('app.apps.telegpick.use_cases.ChangeAvatarUseCase.execute', return_value=None):
+        await ProcessPicsTaskUseCase(task_time).execute()
+
+    async with session_maker() as session:
+        schedule = await session.get(Schedules, schedule.id)
+    # Next Monday
+    assert schedule.next_run_at == datetime(2023, 6, 5, 7, 0, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+async def test_process_pics_task_dispatches_ahead_with_eta(mocker: MockerFixture) -> None:
+    task_time = datetime(2023, 6, 1, 7, 0, 2, tzinfo=timezone.utc)
+    async with session_maker() as session:
+        users = [Users(username=f'user{i}', hashed_pass='133', phone=str(i)) for i in range(3)]
+        session.add_all(users)
         await session.flush()
+        pics = [Pics(user_id=user.id, filename='pic.jpg', timezone=0) for user in users]
+        session.add_all(pics)
+        await session.flush()
+        # Due now, in 5 minutes, and after the dispatched window
+        for pic, minute in zip(pics, [7 * 60, 7 * 60 + 5, 7 * 60 + 11]):
+            next_run_at = datetime(2023, 6, 1, minute // 60, minute % 60, tzinfo=timezone.utc)
+            session.add(
+                Schedules(pic_id=pic.id, day_time=None, fire_minute=minute, fire_days=ALL_DAYS, next_run_at=next_run_at)
+            )
+        await session.commit()
+    mocker.patch.object(settings, 'SCHEDULER_SHARDS', 1)
+    mocker.patch.object(settings, 'SCHEDULER_DISPATCH_AHEAD', 10 * 60)
+    send_task = mocker.patch('app.core.celery_app.celery_app.send_task')
+
+    stats = await ProcessPicsTaskUseCase(task_time).execute()
+
+    assert stats.dispatched == 2
+    sent = {call.kwargs['kwargs']['pic_ids'][0]: call.kwargs for call in send_task.call_args_list}
+    assert sent[str(pics[0].id)]['eta'] is None
+    assert sent[str(pics[0].id)]['kwargs']['due_time'] == task_time.isoformat()
+    later = datetime(2023, 6, 1, 7, 5, tzinfo=timezone.utc)
+    assert sent[str(pics[1].id)]['eta'] == later
+    assert sent[str(pics[1].id)]['kwargs']['due_time'] == later.isoformat()
+
+
+@pytest.mark.asyncio
+async def test_process_pics_task_moves_zones_switched_to_dst(user: Users, mocker: MockerFixture) -> None:
+    # Berlin switches to +02:00 at 01:00 UTC, so 09:00 is 07:00 UTC on the day of the switch
+    task_time = datetime(2023, 3, 26, 7, 0, tzinfo=timezone.utc)
+    async with session_maker() as session:
+        pics = [
+            Pics(user_id=user.id, filename='pic.jpg', timezone=60, zone='Europe/Berlin'),
+            Pics(user_id=user.id, filename='pic.jpg', timezone=60),
+        ]
+        session.add_all(pics)
+        session.add(PicZones(name='Europe/Berlin', utc_offset=60))
+        await session.flush()
+        schedules = [
+            Schedules(
+                pic_id=pic.id,
+                day_time=9 * 60,
+                fire_minute=8 * 60,
+                fire_days=ALL_DAYS,
+                next_run_at=datetime(2023, 3, 26, 8, 0, tzinfo=timezone.utc),
+            )
+            for pic in pics
+        ]
+        session.add_all(schedules)
+        await session.commit()
+    index_schedules = mocker.patch('app.apps.telegpick.use_cases.index_schedules')
+    change = mocker.patch('app.apps.telegpick.use_cases.ChangeAvatarUseCase.execute', return_value=None)
+
+    await ProcessPicsTaskUseCase(task_time).execute()
+
+    change.assert_called_once()
+    async with session_maker() as session:
+        moved, fixed = [await session.get(Pics, pic.id) for pic in pics]
+        schedule = await session.get(Schedules, schedules[0].id)
+        pic_zone = (await session.scalars(select(PicZones))).one()
+    assert (moved.timezone, fixed.timezone, pic_zone.utc_offset) == (120, 60, 120)
+    assert (schedule.fire_minute, schedule.next_run_at) == (7 * 60, datetime(2023, 3, 27, 7, 0, tzinfo=timezone.utc))
+    index_schedules.assert_awaited_once_with([FireTime(schedule.id, 7 * 60, ALL_DAYS)])
+
+
+@pytest.mark.asyncio
+async def test_process_pics_shard_use_case(user: Users) -> None:
+    async with session_maker() as session:
+        pic = Pics(user_id=user.id, filename='pic.jpg')
+        session.add(pic)
+        await session.commit()
+    task_time = datetime(2023, 6, 1, 7, 0, tzinfo=timezone.utc)
+
+    with patch('app.apps.telegpick.use_cases.ChangeAvatarUseCase.execute', return_value=None):
+        stats = await ProcessPicsShardUseCase([str(pic.id), str(uuid.uuid4())], task_time).execute()
+        ChangeAvatarUseCase.execute.assert_called_once()
+    assert stats.done == 1
+
+
+@pytest.mark.asyncio
+async def test_change_avatar_use_case_requeues_on_flood_wait(user: Users, mocker: MockerFixture) -> None:
+    due_time = datetime(2023, 6, 1, 7, 0, tzinfo=timezone.utc)
+    mocker.patch(
+        'app.apps.telegpick.use_cases.TelegramConnector.set_avatar', side_effect=TelegramFloodWaitException(30)
+    )
+    send_task = mocker.patch('app.core.celery_app.celery_app.send_task')
+
+    with pytest.raises(UseCaseDeferred):
+        await ChangeAvatarUseCase(user, 'pic-id', 'pic.jpg', due_time=due_time).execute()
+
+    send_task.assert_called_once_with(
+        'app.apps.telegpick.tasks.change_avatar_task',
+        kwargs={'pic_id': 'pic-id', 'due_time': due_time.isoformat()},
+        countdown=30,
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('task_minute, called', [(7 * 60 + 30, True), (8 * 60 + 30, False)])
+async def test_change_deferred_avatar_use_case(user: Users, task_minute: int, called: bool) -> None:
+    deferred_pic_id, later_pic_id = uuid.uuid4(), uuid.uuid4()
+    async with session_maker() as session:
+        session.add_all(
+            [
+                Pics(id=deferred_pic_id, user_id=user.id, filename='deferred.jpg', timezone=0),
+                Pics(id=later_pic_id, user_id=user.id, filename='later.jpg', timezone=0),
+            ]
+        )
+        await session.flush()
+        session.add_all(
+            [
+                Schedules(pic_id=deferred_pic_id, days_of_week=0, day_time=420, fire_minute=7 * 60, fire_days=ALL_DAYS),
+                Schedules(pic_id=later_pic_id, days_of_week=0, day_time=480, fire_minute=8 * 60, fire_days=ALL_DAYS),
+            ]
+        )
         await session.commit()
-        q = (select(Pics).options(selectinload(Pics.schedules), selectinload(Pics.user))).limit(1)
-        pic = (await session.scalars(q)).first()
+    due_time = datetime(2023, 6, 1, 7, 0, tzinfo=timezone.utc)
+    task_time = datetime(2023, 6, 1, task_minute // 60, task_minute % 60, tzinfo=timezone.utc)
 
-    with patch('app.apps.telegpick.use_cases.ProcessPicsTaskUseCase._pic_for_change', return_value=True):
-        with patch('app.apps.telegpick.use_cases.ChangeAvatarUseCase.execute', return_value=None):
-            await use_case.execute()
-            ProcessPicsTaskUseCase._pic_for_change.assert_called_once()
-            ChangeAvatarUseCase.execute.assert_called_once()
+    with patch('app.apps.telegpick.use_cases.ChangeAvatarUseCase.execute', return_value=None):
+        await ChangeDeferredAvatarUseCase(str(deferred_pic_id), due_time, task_time).execute()
+        assert ChangeAvatarUseCase.execute.called is called
+
+
+@pytest.mark.asyncio
+async def test_create_schedule_use_case_sets_fire_minute(user: Users) -> None:
+    pic_id = '11111111-1111-1111-1111-111111111111'
+    async with session_maker() as session:
+        session.add(Pics(id=UUID(pic_id), user_id=user.id, filename='pic.jpg', timezone=180))
+        await session.commit()
+
+    schedule = await CreateScheduleForPicUseCase(pic_id=pic_id, schedule=SchedulesDTO(day_time='02:30')).execute()
+
+    assert schedule.fire_minute == 23 * 60 + 30
+    assert datetime.now(timezone.utc) < schedule.next_run_at <= datetime.now(timezone.utc) + timedelta(days=1)
+    assert (schedule.next_run_at.hour, schedule.next_run_at.minute) == (23, 30)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'timezone_offset, day_time, days_of_week',
+    [(0, '10:00', '0000000'), (180, '02:30', '1000001'), (-330, '22:15', '0010000'), (840, '23:59', '0000001')],
+)
+async def test_patched_schedule_fire_time_matches_get_fire_time(
+    user: Users, timezone_offset: int, day_time: str, days_of_week: str
+) -> None:
+    pic_id = uuid.uuid4()
+    async with session_maker() as session:
+        session.add(Pics(id=pic_id, user_id=user.id, filename='pic.jpg', timezone=timezone_offset))
+        await session.flush()
+        schedule = Schedules(pic_id=pic_id, days_of_week=0, day_time=0)
+        session.add(schedule)
+        await session.commit()
+    before = datetime.now(timezone.utc)
+
+    patched = await PatchScheduleForPicUseCase(
+        str(pic_id), SchedulesDTO(id=schedule.id, day_time=day_time, days_of_week=days_of_week)
+    ).execute()
+
+    expected = [
+        get_fire_time(parse_day_time(day_time), parse_days_of_week(days_of_week), timezone_offset, after=after)
+        for after in (before, datetime.now(timezone.utc))
+    ]
+    fire_time = {'fire_minute': patched.fire_minute, 'fire_days': patched.fire_days, 'next_run_at': patched.next_run_at}
+    assert fire_time in expected
+
+
+@pytest.mark.asyncio
+async def test_schedule_of_pic_with_malformed_timezone_is_never_due(user: Users) -> None:
+    async with session_maker() as session:
+        pic = Pics(user_id=user.id, filename='pic.jpg')
+        session.add(pic)
+        await session.flush()
+        # Explicit `None` would be replaced by the column default
+        await session.execute(update(Pics).where(Pics.id == pic.id).values(timezone=None))
+        await session.commit()
+
+    schedule = await CreateScheduleForPicUseCase(pic_id=str(pic.id), schedule=SchedulesDTO(day_time='02:30')).execute()
+
+    assert (schedule.fire_minute, schedule.fire_days, schedule.next_run_at) == (None, None, None)
+
+
+@pytest.mark.asyncio
+async def test_create_schedule_use_case_shifts_fire_days(user: Users) -> None:
+    pic_id = '11111111-1111-1111-1111-111111111111'
+    async with session_maker() as session:
+        session.add(Pics(id=UUID(pic_id), user_id=user.id, filename='pic.jpg', timezone=180))
+        await session.commit()
+
+    schedule = await CreateScheduleForPicUseCase(
+        pic_id=pic_id, schedule=SchedulesDTO(days_of_week='1000000', day_time='01:00')
+    ).execute()
+
+    # Monday 01:00 at +03:00 is Sunday 22:00 in UTC
+    assert schedule.days_of_week == 0b0000001
+    assert (schedule.fire_minute, schedule.fire_days) == (22 * 60, 0b1000000)
+
+
+@pytest.mark.asyncio
+async def test_create_schedule_use_case_fails_for_missing_pic(user: Users) -> None:
+    use_case = CreateScheduleForPicUseCase(pic_id=str(uuid.uuid4()), schedule=SchedulesDTO(day_time='02:30'))
+    with pytest.raises(BadRequestException) as e:
+        await use_case.execute()
+    assert 'Pic not found' in str(e.value.detail)
+
+
+@pytest.mark.asyncio
+async def test_patch_schedules_updates_fire_minute(user: Users) -> None:
+    pic_id = UUID('123e4567-e89b-12d3-a456-426655440000')
+    schedule_id = UUID('11111111-1111-1111-1111-111111111111')
+    async with session_maker() as session:
+        session.add(Pics(id=pic_id, user_id=user.id, filename='pic.jpg', timezone=0))
+        await session.flush()
+        session.add(Schedules(id=schedule_id, pic_id=pic_id, day_time=600, fire_minute=10 * 60))
+        await session.commit()
+
+    await PatchScheduleForPicUseCase(str(pic_id), SchedulesDTO(id=schedule_id, day_time='12:15')).execute()
+    async with session_maker() as session:
+        assert (await session.get(Schedules, schedule_id)).fire_minute == 12 * 60 + 15
+
+    await PatchPicForUserUseCase(PicsDTO(id=pic_id, timezone='-01:00'), user).execute()
+    async with session_maker() as session:
+        assert (await session.get(Schedules, schedule_id)).fire_minute == 13 * 60 + 15
+
+
+@pytest.fixture
+def statements() -> Iterator[list[str]]:
+    engine = session_maker.kw['bind'].sync_engine
+    statements: list[str] = []
+
+    def _before_cursor_execute(conn, cursor, statement, *args) -> None:
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', _before_cursor_execute)
+
+
+@pytest.mark.asyncio
+async def test_patch_pic_and_schedule_use_update_returning(user: Users, statements: list[str]) -> None:
+    pic_id = UUID('123e4567-e89b-12d3-a456-426655440000')
+    schedule_id = UUID('11111111-1111-1111-1111-111111111111')
+    async with session_maker() as session:
+        session.add(Pics(id=pic_id, user_id=user.id, filename='pic.jpg', timezone=0))
+        await session.flush()
+        session.add(Schedules(id=schedule_id, pic_id=pic_id, days_of_week=0b0000001, day_time=600))
+        await session.commit()
+    statements.clear()
+
+    pic = await PatchPicForUserUseCase(PicsDTO(id=pic_id, filename='new_pic.jpg'), user).execute()
+    schedule = await PatchScheduleForPicUseCase(
+        str(pic_id), SchedulesDTO(id=schedule_id, days_of_week='0100000')
+    ).execute()
+
+    # Another filename drops the Telegram photo of the previous one within the pic update
+    assert len(statements) == 2
+    assert all(re.match(r'(WITH .+\)\s+)?UPDATE .+ RETURNING ', statement, re.DOTALL) for statement in statements)
+    assert PicsDTO.from_orm(pic).filename == 'new_pic.jpg'
+    assert SchedulesDTO.from_orm(schedule).days_of_week == '0100000'
+
+
+@pytest.mark.asyncio
+async def test_patch_fails_for_missing_rows(user: Users) -> None:
+    with pytest.raises(BadRequestException) as e:
+        await PatchPicForUserUseCase(PicsDTO(id=uuid.uuid4(), filename='pic.jpg'), user).execute()
+    assert 'Pic not found' in str(e.value.detail)
+
+    with pytest.raises(BadRequestException) as e:
+        await PatchScheduleForPicUseCase(str(uuid.uuid4()), SchedulesDTO(id=uuid.uuid4(), day_time='10:00')).execute()
+    assert 'Schedule not found' in str(e.value.detail)
+
+
+@pytest.mark.asyncio
+async def test_bulk_pics_use_case(user: Users) -> None:
+    pic_id, scheduled_pic_id = uuid.uuid4(), uuid.uuid4()
+    async with session_maker() as session:
+        session.add_all(
+            [
+                Pics(id=pic_id, user_id=user.id, filename='pic.jpg'),
+                Pics(id=scheduled_pic_id, user_id=user.id, filename='scheduled.jpg'),
+            ]
+        )
+        await session.flush()
+        session.add(Schedules(pic_id=scheduled_pic_id, day_time=600))
+        await session.commit()
+    missing_id = uuid.uuid4()
+    operations = BulkPicsDTO(
+        create=[PicsDTO(filename='new1.jpg'), PicsDTO(filename='new2.jpg', timezone='+01:00'), PicsDTO(id=pic_id)],
+        update=[PicsDTO(id=pic_id, filename='renamed.jpg'), PicsDTO(id=missing_id, filename='missing.jpg')],
+        delete=[scheduled_pic_id, missing_id],
+    )
+
+    result = await BulkPicsForUserUseCase(operations=operations, user=user).execute()
+
+    assert [pic.filename for pic in result.created] == ['new1.jpg', 'new2.jpg']
+    assert [pic.filename for pic in result.updated] == ['renamed.jpg']
+    assert result.deleted == [scheduled_pic_id]
+    assert [(error.operation, error.index) for error in result.errors] == [('create', 2), ('update', 1), ('delete', 1)]
+    async with session_maker() as session:
+        filenames = set(await session.scalars(select(Pics.filename).where(Pics.user_id == user.id)))
+    assert filenames == {'new1.jpg', 'new2.jpg', 'renamed.jpg'}
+
+
+@pytest.mark.asyncio
+async def test_bulk_pics_use_case_reports_invalid_created_pics(user: Users) -> None:
+    operations = BulkPicsDTO(
+        create=[
+            PicsDTO(filename='new1.jpg'),
+            PicsDTO(timezone='+01:00'),
+            PicsDTO(filename='new2.jpg'),
+        ]
+    )
+
+    result = await BulkPicsForUserUseCase(operations=operations, user=user).execute()
+
+    assert [pic.filename for pic in result.created] == ['new1.jpg', 'new2.jpg']
+    assert [(error.operation, error.index, error.detail) for error in result.errors] == [
+        ('create', 1, 'Pic filename is required'),
+    ]
+    async with session_maker() as session:
+        filenames = set(await session.scalars(select(Pics.filename).where(Pics.user_id == user.id)))
+    assert filenames == {'new1.jpg', 'new2.jpg'}
+
+
+@pytest.mark.asyncio
+async def test_bulk_schedules_use_case(user: Users) -> None:
+    pic_id, schedule_id = uuid.uuid4(), uuid.uuid4()
+    async with session_maker() as session:
+        session.add(Pics(id=pic_id, user_id=user.id, filename='pic.jpg', timezone=120))
+        await session.flush()
+        session.add(Schedules(id=schedule_id, pic_id=pic_id, day_time=600))
+        await session.commit()
+    operations = BulkSchedulesDTO(
+        create=[SchedulesDTO(day_time='09:00'), SchedulesDTO(days_of_week='0000001', day_time='12:30')],
+        update=[SchedulesDTO(id=schedule_id, day_time='11:00'), SchedulesDTO(day_time='11:00')],
+        delete=[uuid.uuid4()],
+    )
+
+    result = await BulkSchedulesForPicUseCase(pic_id=str(pic_id), operations=operations, user=user).execute()
+
+    assert [schedule.day_time for schedule in result.created] == ['09:00', '12:30']
+    assert [schedule.day_time for schedule in result.updated] == ['11:00']
+    assert [(error.operation, error.index) for error in result.errors] == [('update', 1), ('delete', 0)]
+    async with session_maker() as session:
+        fire_minutes = set(await session.scalars(select(Schedules.fire_minute).where(Schedules.pic_id == pic_id)))
+    assert fire_minutes == {7 * 60, 9 * 60, 10 * 60 + 30}
+
+    missing_pic_use_case = BulkSchedulesForPicUseCase(pic_id=str(uuid.uuid4()), operations=operations, user=user)
+    with pytest.raises(BadRequestException):
+        await missing_pic_use_case.execute()
+
+
+@pytest.mark.asyncio
+async def test_return_pic_file_caches_versioned_url_for_good(user: Users) -> None:
+    sha256 = hashlib.sha256(b'picture').hexdigest()
+    async with session_maker() as session:
+        session.add(PicFiles(sha256=sha256, filename=f'{sha256}.jpg', size=7))
+        await session.flush()
+        pic = Pics(user_id=user.id, filename=f'{sha256}.jpg', sha256=sha256)
+        session.add(pic)
+        await session.commit()
+
+    response = await ReturnPicFileByIdUseCase(str(pic.id), version=sha256).execute()
+
+    assert response.headers['etag'] == f'"{sha256}"'
+    assert response.headers['cache-control'] == 'private, max-age=31536000, immutable'
+
+    response = await ReturnPicFileByIdUseCase(str(pic.id), version='outdated').execute()
+
+    assert response.headers['cache-control'] == 'private, no-cache'
+
+
+@pytest.mark.asyncio
+async def test_return_pic_file_after_patched_filename(user: Users, mocker: MockerFixture, tmp_path: Path) -> None:
+    mocker.patch.object(settings, 'PICS_DIRECTORY', str(tmp_path))
+    mocker.patch('app.apps.telegpick.use_cases.create_renditions')
+    await UploadPicOnDiskUseCase(
+        user=user, filename='test', file=UploadFile(filename='pic.jpg', file=BytesIO(b'picture')), timezone='+01:00'
+    ).execute()
+    sha256 = hashlib.sha256(b'picture').hexdigest()
+    async with session_maker() as session:
+        pic = (await session.scalars(select(Pics).where(Pics.user_id == user.id))).one()
+    (tmp_path / 'other.jpg').write_bytes(b'other picture')
+    await PatchPicForUserUseCase(PicsDTO(id=pic.id, filename='other.jpg'), user).execute()
+    messages: list[dict] = []
+
+    async def send(message: dict) -> None:
+        messages.append(message)
+
+    response = await ReturnPicFileByIdUseCase(str(pic.id), version=sha256).execute()
+    await response({'type': 'http', 'headers': [(b'if-none-match', f'"{sha256}"'.encode())]}, MagicMock(), send)
+
+    headers = dict(messages[0]['headers'])
+    assert messages[0]['status'] == 200
+    assert messages[1]['body'] == b'other picture'
+    assert headers[b'etag'] != f'"{sha256}"'.encode()
+    assert headers[b'cache-control'] == b'private, no-cache'
 
 
 @pytest.mark.asyncio
@@ -252,7 +953,7 @@ async def test_get_pic_fails_if_no_pic(user: Users) -> None:
 async def test_pic_upload_failed(user: Users, mocker: MockerFixture) -> None:
     test_file = 'test_file.docx'
     use_case = UploadPicOnDiskUseCase(
-        user=user, filename=test_file, file=UploadFile(filename=test_file, file=MagicMock()), timezone='+1'
+        user=user, filename=test_file, file=UploadFile(filename=test_file, file=MagicMock()), timezone='+01:00'
     )
     with pytest.raises(BadRequestException) as e:
         await use_case.execute()
@@ -260,17 +961,151 @@ async def test_pic_upload_failed(user: Users, mocker: MockerFixture) -> None:
 
 
 @pytest.mark.asyncio
-async def test_pic_upload_faile(user: Users, mocker: MockerFixture) -> None:
-    file_mock = mock.Mock(write=mock.Mock())
-    open_mock = mock.Mock(return_value=file_mock)
-    mocker.patch('builtins.open')
-    patched = mocker.patch('app.apps.telegpick.use_cases.CreatePicForUserUseCase.execute')
-    test_file = 'test_file.docx'
+async def test_pic_upload_faile(user: Users, mocker: MockerFixture, tmp_path: Path) -> None:
+    mocker.patch.object(settings, 'PICS_DIRECTORY', str(tmp_path))
+    test_file = 'test_file.JPG'
     use_case = UploadPicOnDiskUseCase(
-        user=user, filename=test_file, file=UploadFile(filename=test_file, file=open_mock), timezone='+1'
+        user=user, filename='test', file=UploadFile(filename=test_file, file=BytesIO(b'picture')), timezone='+01:00'
     )
     await use_case.execute()
-    patched.assert_called_once()
+    sha256 = hashlib.sha256(b'picture').hexdigest()
+    [uploaded] = tmp_path.iterdir()
+    assert uploaded.name == f'{sha256}.jpg'
+    assert uploaded.read_bytes() == b'picture'
+    async with session_maker() as session:
+        pic = (await session.scalars(select(Pics).where(Pics.user_id == user.id))).one()
+    assert (pic.filename, pic.sha256, pic.timezone) == (uploaded.name, sha256, 60)
+
+
+@pytest.mark.asyncio
+async def test_pic_upload_stores_content_once(user: Users, mocker: MockerFixture, tmp_path: Path) -> None:
+    mocker.patch.object(settings, 'PICS_DIRECTORY', str(tmp_path))
+    create_renditions = mocker.patch('app.apps.telegpick.use_cases.create_renditions')
+    for filename in ['first.jpg', 'second.png']:
+        await UploadPicOnDiskUseCase(
+            user=user, filename='test', file=UploadFile(filename=filename, file=BytesIO(b'picture')), timezone='+01:00'
+        ).execute()
+
+    sha256 = hashlib.sha256(b'picture').hexdigest()
+    assert [path.name for path in tmp_path.iterdir()] == [f'{sha256}.jpg']
+    create_renditions.assert_awaited_once()
+    async with session_maker() as session:
+        pic_file = (await session.scalars(select(PicFiles))).one()
+        pics = (await session.scalars(select(Pics).where(Pics.sha256 == sha256))).all()
+    assert (pic_file.refs, pic_file.size) == (2, len(b'picture'))
+    assert [pic.filename for pic in pics] == [pic_file.filename] * 2
+
+    await DeletePicForUserUseCase(pics[0].id, user).execute()
+
+    assert (tmp_path / pic_file.filename).exists()
+
+    result = await BulkPicsForUserUseCase(BulkPicsDTO(delete=[pics[1].id]), user).execute()
+
+    assert result.deleted == [pics[1].id]
+    assert not list(tmp_path.iterdir())
+    async with session_maker() as session:
+        assert (await session.scalars(select(PicFiles))).first() is None
+
+
+@pytest.mark.asyncio
+async def test_patched_filename_releases_pic_file(user: Users, mocker: MockerFixture, tmp_path: Path) -> None:
+    mocker.patch.object(settings, 'PICS_DIRECTORY', str(tmp_path))
+    mocker.patch('app.apps.telegpick.use_cases.create_renditions')
+    for _ in range(2):
+        await UploadPicOnDiskUseCase(
+            user=user, filename='test', file=UploadFile(filename='pic.jpg', file=BytesIO(b'picture')), timezone='+01:00'
+        ).execute()
+    async with session_maker() as session:
+        first, second = (await session.scalars(select(Pics).where(Pics.user_id == user.id))).all()
+
+    pic = await PatchPicForUserUseCase(PicsDTO(id=first.id, filename=first.filename), user).execute()
+
+    assert pic.sha256 == first.sha256
+
+    pic = await PatchPicForUserUseCase(PicsDTO(id=first.id, filename='other.jpg'), user).execute()
+
+    assert (pic.filename, pic.sha256) == ('other.jpg', None)
+    assert (tmp_path / second.filename).exists()
+
+    result = await BulkPicsForUserUseCase(
+        BulkPicsDTO(update=[PicsDTO(id=second.id, filename='other.jpg')]), user
+    ).execute()
+
+    assert not result.errors
+    assert not list(tmp_path.iterdir())
+    async with session_maker() as session:
+        assert (await session.scalars(select(PicFiles))).first() is None
+        assert set(await session.scalars(select(Pics.sha256).where(Pics.user_id == user.id))) == {None}
+
+
+@pytest.mark.asyncio
+async def test_backfill_pic_files(user: Users, mocker: MockerFixture, tmp_path: Path) -> None:
+    mocker.patch.object(settings, 'PICS_DIRECTORY', str(tmp_path))
+    mocker.patch('app.apps.telegpick.use_cases.create_renditions')
+    await UploadPicOnDiskUseCase(
+        user=user, filename='test', file=UploadFile(filename='pic.jpg', file=BytesIO(b'picture')), timezone='+01:00'
+    ).execute()
+    (tmp_path / 'legacy.jpg').write_bytes(b'legacy')
+    (tmp_path / 'copy.jpg').write_bytes(b'picture')
+    async with session_maker() as session:
+        session.add_all(
+            Pics(user_id=user.id, filename=filename)
+            for filename in ['legacy.jpg', 'legacy.jpg', 'copy.jpg', 'missing.jpg', '../outside.jpg']
+        )
+        await session.commit()
+
+    assert await BackfillPicFilesUseCase(str(tmp_path)).execute() == 2
+
+    legacy_sha256, stored_sha256 = hashlib.sha256(b'legacy').hexdigest(), hashlib.sha256(b'picture').hexdigest()
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(['legacy.jpg', f'{stored_sha256}.jpg'])
+    async with session_maker() as session:
+        pic_files = {
+            pic_file.sha256: (pic_file.filename, pic_file.refs) for pic_file in await session.scalars(select(PicFiles))
+        }
+        pics = (await session.execute(select(Pics.filename, Pics.sha256).where(Pics.user_id == user.id))).all()
+    assert pic_files == {legacy_sha256: ('legacy.jpg', 2), stored_sha256: (f'{stored_sha256}.jpg', 2)}
+    assert sorted(pics, key=str) == sorted(
+        [
+            ('legacy.jpg', legacy_sha256),
+            ('legacy.jpg', legacy_sha256),
+            (f'{stored_sha256}.jpg', stored_sha256),
+            (f'{stored_sha256}.jpg', stored_sha256),
+            ('missing.jpg', None),
+            ('../outside.jpg', None),
+        ],
+        key=str,
+    )
+
+
+@pytest.mark.asyncio
+async def test_pic_upload_rejects_too_large_file(user: Users, mocker: MockerFixture, tmp_path: Path) -> None:
+    mocker.patch.object(settings, 'PICS_DIRECTORY', str(tmp_path))
+    mocker.patch.object(settings, 'PIC_MAX_SIZE', 4)
+    store = mocker.patch.object(UploadPicOnDiskUseCase, '_store')
+    use_case = UploadPicOnDiskUseCase(
+        user=user, filename='test', file=UploadFile(filename='test.jpg', file=BytesIO(b'picture')), timezone='+01:00'
+    )
+    with pytest.raises(BadRequestException) as e:
+        await use_case.execute()
+    assert 'File is too large' in str(e.value.detail)
+    store.assert_not_called()
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.asyncio
+async def test_pic_upload_rejects_unknown_zone(user: Users, mocker: MockerFixture) -> None:
+    store = mocker.patch.object(UploadPicOnDiskUseCase, '_store')
+    use_case = UploadPicOnDiskUseCase(
+        user=user,
+        filename='test',
+        file=UploadFile(filename='test.jpg', file=BytesIO(b'picture')),
+        timezone=None,
+        zone='Nope/Zone',
+    )
+    with pytest.raises(BadRequestException) as e:
+        await use_case.execute()
+    assert 'Unknown time zone' in str(e.value.detail)
+    store.assert_not_called()
 
 
 @pytest.mark.asyncio
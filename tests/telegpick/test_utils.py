@@ -0,0 +1,158 @@
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from app.apps.telegpick.utils import (
+    ALL_DAYS,
+    decode_cursor,
+    encode_cursor,
+    format_day_time,
+    format_days_of_week,
+    format_utc_offset,
+    get_fire_days,
+    get_fire_minute,
+    get_next_run_at,
+    get_run_times,
+    get_shard,
+    get_zone,
+    get_zone_offset,
+    parse_day_time,
+    parse_days_of_week,
+    parse_utc_offset,
+)
+
+
+@pytest.mark.parametrize(
+    'timezone, expected',
+    [('+03:00', 180), ('-05:30', -330), ('+00:00', 0), ('0', None), ('+1', None), ('+15:00', None), (None, None)],
+)
+def test_parse_utc_offset(timezone: str | None, expected: int | None) -> None:
+    assert parse_utc_offset(timezone) == expected
+    if expected is not None:
+        assert format_utc_offset(expected) == timezone
+
+
+@pytest.mark.parametrize(
+    'name, at, expected',
+    [
+        ('Europe/Berlin', datetime(2023, 1, 15, tzinfo=timezone.utc), 60),
+        ('Europe/Berlin', datetime(2023, 7, 15, tzinfo=timezone.utc), 120),
+        # Switches at 01:00 UTC
+        ('Europe/Berlin', datetime(2023, 3, 26, 0, 59, tzinfo=timezone.utc), 60),
+        ('Europe/Berlin', datetime(2023, 3, 26, 1, 0, tzinfo=timezone.utc), 120),
+        ('America/St_Johns', datetime(2023, 1, 15, tzinfo=timezone.utc), -210),
+        ('Nope/Zone', datetime(2023, 1, 15, tzinfo=timezone.utc), None),
+        ('Europe', datetime(2023, 1, 15, tzinfo=timezone.utc), None),
+        ('../etc/passwd', datetime(2023, 1, 15, tzinfo=timezone.utc), None),
+    ],
+)
+def test_get_zone_offset(name: str, at: datetime, expected: int | None) -> None:
+    assert get_zone_offset(name, at) == expected
+
+
+def test_get_zone_is_cached() -> None:
+    assert get_zone('Europe/Berlin') is get_zone('Europe/Berlin')
+    assert get_zone('Nope/Zone') is None
+
+
+@pytest.mark.parametrize(
+    'day_time, expected', [('00:00', 0), ('10:15', 615), ('23:59', 1439), ('25:00', None), ('09:00:00', None)]
+)
+def test_parse_day_time(day_time: str, expected: int | None) -> None:
+    assert parse_day_time(day_time) == expected
+    if expected is not None:
+        assert format_day_time(expected) == day_time
+
+
+@pytest.mark.parametrize(
+    'day_minute, offset, expected', [(600, 180, 420), (60, 180, 1320), (1350, -120, 30), (600, None, None)]
+)
+def test_get_fire_minute(day_minute: int, offset: int | None, expected: int | None) -> None:
+    assert get_fire_minute(day_minute, offset) == expected
+
+
+@pytest.mark.parametrize('days, expected', [('1000000', 0b0000001), ('0000001', 0b1000000), ('0000000', 0)])
+def test_days_of_week_round_trip(days: str, expected: int) -> None:
+    assert parse_days_of_week(days) == expected
+    assert format_days_of_week(expected) == days
+
+
+@pytest.mark.parametrize(
+    'days_of_week, day_minute, offset, expected',
+    [
+        (0b0000001, 600, 180, 0b0000001),
+        (0b0000001, 60, 180, 0b1000000),
+        (0b1000000, 1350, -120, 0b0000001),
+        (0, 600, 180, ALL_DAYS),
+        (0b0000001, 600, None, None),
+    ],
+)
+def test_get_fire_days(days_of_week: int, day_minute: int, offset: int | None, expected: int | None) -> None:
+    assert get_fire_days(days_of_week, day_minute, offset) == expected
+
+
+@pytest.mark.parametrize(
+    'fire_minute, fire_days, after, expected',
+    [
+        # Thursday 07:00 itself is not after it
+        (
+            7 * 60,
+            ALL_DAYS,
+            datetime(2023, 6, 1, 7, 0, tzinfo=timezone.utc),
+            datetime(2023, 6, 2, 7, 0, tzinfo=timezone.utc),
+        ),
+        (
+            7 * 60,
+            ALL_DAYS,
+            datetime(2023, 6, 1, 6, 59, 30, tzinfo=timezone.utc),
+            datetime(2023, 6, 1, 7, 0, tzinfo=timezone.utc),
+        ),
+        # Thursday only
+        (
+            7 * 60,
+            0b0001000,
+            datetime(2023, 6, 1, 8, 0, tzinfo=timezone.utc),
+            datetime(2023, 6, 8, 7, 0, tzinfo=timezone.utc),
+        ),
+        (None, ALL_DAYS, datetime(2023, 6, 1, 8, 0, tzinfo=timezone.utc), None),
+    ],
+)
+def test_get_next_run_at(fire_minute: int | None, fire_days: int, after: datetime, expected: datetime | None) -> None:
+    assert get_next_run_at(fire_minute, fire_days, after) == expected
+
+
+def test_get_run_times() -> None:
+    start, end = datetime(2023, 5, 31, 6, 0, tzinfo=timezone.utc), datetime(2023, 6, 2, 6, 0, tzinfo=timezone.utc)
+
+    # Wednesday and Thursday 07:00, Friday's is after the end
+    assert get_run_times(7 * 60, ALL_DAYS, start, end) == [
+        datetime(2023, 5, 31, 7, 0, tzinfo=timezone.utc),
+        datetime(2023, 6, 1, 7, 0, tzinfo=timezone.utc),
+    ]
+    assert get_run_times(5 * 60, 0b0100000, start, end) == []
+
+
+def test_get_shard_is_stable_and_balanced() -> None:
+    user_ids = [uuid.uuid4() for _ in range(2000)]
+
+    shards = [get_shard(user_id, 4) for user_id in user_ids]
+
+    assert shards == [get_shard(user_id, 4) for user_id in user_ids]
+    assert all(400 < shards.count(shard) < 600 for shard in range(4))
+    # Adding a shard only moves users to the new one
+    moved = [(old, get_shard(user_id, 5)) for user_id, old in zip(user_ids, shards) if get_shard(user_id, 5) != old]
+    assert all(new == 4 for _, new in moved)
+    assert len(moved) < 550
+
+
+def test_cursor_round_trip() -> None:
+    pic_id = uuid.uuid4()
+
+    assert decode_cursor(encode_cursor(pic_id)) == pic_id
+
+
+@pytest.mark.parametrize('cursor', ['', 'abc', 'not a cursor!'])
+def test_decode_invalid_cursor(cursor: str) -> None:
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
@@ -1,7 +1,14 @@
 from uuid import UUID
 
 import pytest
+from fastapi.testclient import TestClient
+from pydantic import SecretStr
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
 
+from app.core.config import AppSettings
+from app.core.db_config import create_engine
+from app.core.metrics import DB_POOL_CHECKOUT_SECONDS, DB_POOL_CONNECTIONS
 from app.core.models import DBBaseModel
 
 
@@ -13,3 +20,45 @@ async def test_db_base_model():
 
     # assert that the repr string is correct
     assert repr(model) == '<DBBaseModel(id=UUID(\'123e4567-e89b-12d3-a456-426655440000\'))>'
+
+
+@pytest.mark.parametrize(
+    'web_concurrency, limits',
+    [(1, (5, 5)), (10, (5, 5)), (15, (5, 1)), (50, (2, 0)), (200, (1, 0))],
+)
+def test_db_pool_limits(web_concurrency: int, limits: tuple[int, int]) -> None:
+    settings = AppSettings(SECRET_KEY=SecretStr('test'), MAX_DB_CONNECTIONS=100, WEB_CONCURRENCY=web_concurrency)
+
+    assert settings.db_pool_limits == limits
+
+
+@pytest.mark.asyncio
+async def test_engine_reuses_pooled_connections() -> None:
+    engine = create_engine(AppSettings(SECRET_KEY=SecretStr('test')))
+    checkouts = DB_POOL_CHECKOUT_SECONDS.collect()[0].samples
+    checkouts_before = next(sample.value for sample in checkouts if sample.name.endswith('_count'))
+    try:
+        for _ in range(3):
+            async with engine.connect() as connection:
+                backend_pid = await connection.scalar(text('SELECT pg_backend_pid()'))
+                assert DB_POOL_CONNECTIONS.labels('in_use')._value.get() == 1
+        assert backend_pid == await _get_backend_pid(engine)
+    finally:
+        await engine.dispose()
+
+    checkouts = DB_POOL_CHECKOUT_SECONDS.collect()[0].samples
+    assert next(sample.value for sample in checkouts if sample.name.endswith('_count')) == checkouts_before + 4
+    assert DB_POOL_CONNECTIONS.labels('in_use')._value.get() == 0
+    assert DB_POOL_CONNECTIONS.labels('open')._value.get() == 0
+
+
+async def _get_backend_pid(engine: AsyncEngine) -> int:
+    async with engine.connect() as connection:
+        return await connection.scalar(text('SELECT pg_backend_pid()'))
+
+
+def test_metrics_endpoint(client: TestClient) -> None:
+    response = client.get('/metrics/')
+
+    assert response.status_code == 200
+    assert 'db_pool_checkout_seconds' in response.text
@@ -1,12 +1,27 @@
 import asyncio
+import hashlib
+import time
 from decimal import Decimal
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import AsyncMock
 
 import pytest
 from pytest_mock import MockerFixture
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
 
 from app.lib.classes import SQLAlchemySessionBaseUseCase, alchemy_session_decorator
-from app.lib.utils import async_wrap, orjson_dumps, serialize_decimals
+from app.lib.middlewares import BodySizeLimitMiddleware
+from app.lib.passwords import PasswordHasher
+from app.lib.processes import shutdown_process_pools
+from app.lib.responses import CachedFileResponse, RangeNotSatisfiableError, etag_matches, get_byte_range
+from app.lib.utils import FileTooLargeError, async_wrap, copy_file_hashed, orjson_dumps, serialize_decimals
 
 
 def test_serialize_decimals():
@@ -57,3 +72,176 @@ async def test_alchemy_session_decorator(mocker: MockerFixture):
     await test_use_case.execute()
 
     assert execute_mock.called
+
+
+def test_copy_file_hashed(tmp_path: Path):
+    destination = tmp_path / 'upload'
+
+    assert copy_file_hashed(BytesIO(b'picture'), destination, max_size=7, chunk_size=2) == (
+        hashlib.sha256(b'picture').hexdigest(),
+        7,
+    )
+    assert destination.read_bytes() == b'picture'
+
+    with pytest.raises(FileTooLargeError):
+        copy_file_hashed(BytesIO(b'picture'), destination, max_size=6, chunk_size=2)
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.parametrize(
+    'range_header, expected',
+    [
+        ('bytes=0-3', (0, 3)),
+        ('bytes=2-', (2, 6)),
+        ('bytes=-2', (5, 6)),
+        ('bytes=-20', (0, 6)),
+        ('bytes=3-100', (3, 6)),
+        ('bytes=3-1', None),
+        ('bytes=0-1,3-4', None),
+        ('items=0-1', None),
+    ],
+)
+def test_get_byte_range(range_header: str, expected: tuple[int, int] | None):
+    assert get_byte_range(range_header, 7) == expected
+
+
+@pytest.mark.parametrize('range_header', ['bytes=7-', 'bytes=-0'])
+def test_get_byte_range_fails_past_the_end(range_header: str):
+    with pytest.raises(RangeNotSatisfiableError):
+        get_byte_range(range_header, 7)
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"other", W/"abc"', '"abc"')
+    assert etag_matches('*', '"abc"')
+    assert not etag_matches('"other"', '"abc"')
+
+
+def test_cached_file_response(tmp_path: Path):
+    (tmp_path / 'pic.jpg').write_bytes(b'picture')
+    app = Starlette(
+        routes=[
+            Route('/', lambda request: CachedFileResponse(tmp_path / 'pic.jpg', etag='"abc"', cache_control='private'))
+        ]
+    )
+    client = TestClient(app)
+
+    response = client.get('/')
+    assert response.status_code == 200 and response.content == b'picture'
+    assert (response.headers['etag'], response.headers['cache-control']) == ('"abc"', 'private')
+    assert response.headers['accept-ranges'] == 'bytes'
+
+    response = client.get('/', headers={'if-none-match': '"abc"'})
+    assert response.status_code == 304 and response.content == b''
+    assert response.headers['etag'] == '"abc"' and 'content-length' not in response.headers
+
+    response = client.get('/', headers={'range': 'bytes=2-4'})
+    assert response.status_code == 206 and response.content == b'ctu'
+    assert response.headers['content-range'] == 'bytes 2-4/7'
+
+    response = client.get('/', headers={'range': 'bytes=2-4', 'if-range': '"other"'})
+    assert response.status_code == 200 and response.content == b'picture'
+
+    response = client.get('/', headers={'range': 'bytes=10-'})
+    assert response.status_code == 416
+    assert response.headers['content-range'] == 'bytes */7'
+
+
+def test_cached_file_response_without_etag_is_validated_by_file_stat(tmp_path: Path):
+    (tmp_path / 'pic.jpg').write_bytes(b'picture')
+    app = Starlette(
+        routes=[
+            Route('/', lambda request: CachedFileResponse(tmp_path / 'pic.jpg', etag=None, cache_control='private'))
+        ]
+    )
+    client = TestClient(app)
+
+    response = client.get('/')
+    etag = response.headers['etag']
+    assert response.status_code == 200 and etag.startswith('W/')
+
+    response = client.get('/', headers={'if-none-match': etag})
+    assert response.status_code == 304 and response.headers['etag'] == etag
+
+    response = client.get('/', headers={'range': 'bytes=2-4', 'if-range': etag})
+    assert response.status_code == 200 and response.content == b'picture'
+
+    (tmp_path / 'pic.jpg').write_bytes(b'another picture')
+
+    response = client.get('/', headers={'if-none-match': etag})
+    assert response.status_code == 200 and response.headers['etag'] != etag
+
+
+@pytest.mark.parametrize('name', ['missing.jpg', 'directory'])
+def test_cached_file_response_is_not_found_for_anything_but_regular_file(tmp_path: Path, name: str):
+    (tmp_path / 'directory').mkdir()
+    app = Starlette(
+        routes=[Route('/', lambda request: CachedFileResponse(tmp_path / name, etag='"abc"', cache_control='private'))]
+    )
+
+    response = TestClient(app).get('/')
+
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_cached_file_response_uses_zero_copy_extension(tmp_path: Path):
+    (tmp_path / 'pic.jpg').write_bytes(b'picture')
+    scope = {
+        'type': 'http',
+        'headers': [(b'range', b'bytes=1-')],
+        'extensions': {'http.response.zerocopysend': {}},
+    }
+    messages: list[dict] = []
+
+    async def send(message: dict) -> None:
+        messages.append({key: value for key, value in message.items() if key != 'file'})
+
+    await CachedFileResponse(tmp_path / 'pic.jpg', etag='"abc"', cache_control='private')(scope, AsyncMock(), send)
+
+    assert messages[0]['status'] == 206
+    assert messages[1] == {'type': 'http.response.zerocopysend', 'offset': 1, 'count': 6, 'more_body': False}
+
+
+def test_body_size_limit_middleware():
+    async def echo(request: Request) -> PlainTextResponse:
+        return PlainTextResponse(await request.body())
+
+    app = Starlette(
+        routes=[Route('/', echo, methods=['POST'])], middleware=[Middleware(BodySizeLimitMiddleware, max_size=4)]
+    )
+    client = TestClient(app)
+
+    response = client.post('/', content=b'pic')
+    assert response.status_code == 200 and response.content == b'pic'
+
+    response = client.post('/', content=b'picture')
+    assert response.status_code == 413
+
+    # Chunked, so there is no `Content-Length` and the body is only counted as it's received
+    response = client.post('/', content=iter([b'pic', b'ture']))
+    assert response.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_keeps_event_loop_responsive() -> None:
+    hasher = PasswordHasher(rounds=8, workers=1, concurrency=2)
+    lags: list[float] = []
+
+    async def _measure_loop_lag() -> None:
+        while True:
+            started_at = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - started_at - 0.005)
+
+    lag_task = asyncio.create_task(_measure_loop_lag())
+    try:
+        hashes = await asyncio.gather(*(hasher.hash(f'password{i}') for i in range(4)))
+        results = await asyncio.gather(*(hasher.verify_and_update(f'password{i}', h) for i, h in enumerate(hashes)))
+    finally:
+        lag_task.cancel()
+        shutdown_process_pools()
+
+    assert results == [(True, None)] * 4
+    assert max(lags) < 0.1
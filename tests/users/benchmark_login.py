@@ -0,0 +1,68 @@
+"""
+Login throughput under concurrency, against the database from settings with migrations applied:
+
+    python -m tests.users.benchmark_login --requests 200 --concurrency 50
+
+Besides logins per second it reports the longest event loop stall, which stays low as long as hashing is done off loop
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from pydantic import SecretStr
+
+import app.apps.telegpick.models  # noqa: F401, users relationships are resolved by name
+from app.apps.users.dtos import RegistrationData
+from app.apps.users.use_cases import AuthenticateUserUseCase, RegisterUserUseCase
+from app.lib.classes import BadRequestException
+from app.lib.passwords import get_password_hasher
+from app.lib.processes import shutdown_process_pools
+
+USERNAME = 'benchmark-user'
+PASSWORD = 'benchmark-password'
+
+
+async def _measure_loop_lag(interval: float, lags: list[float]) -> None:
+    while True:
+        started_at = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started_at - interval)
+
+
+async def _login(semaphore: asyncio.Semaphore, latencies: list[float]) -> None:
+    async with semaphore:
+        started_at = time.perf_counter()
+        await AuthenticateUserUseCase(username=USERNAME, password=SecretStr(PASSWORD)).execute()
+        latencies.append(time.perf_counter() - started_at)
+
+
+async def run(requests: int, concurrency: int) -> None:
+    try:
+        await RegisterUserUseCase(RegistrationData(username=USERNAME, password=PASSWORD, phone='0')).execute()
+    except BadRequestException:
+        pass
+
+    lags: list[float] = []
+    latencies: list[float] = []
+    lag_task = asyncio.create_task(_measure_loop_lag(0.01, lags))
+    semaphore = asyncio.Semaphore(concurrency)
+    started_at = time.perf_counter()
+    await asyncio.gather(*(_login(semaphore, latencies) for _ in range(requests)))
+    elapsed = time.perf_counter() - started_at
+    lag_task.cancel()
+    shutdown_process_pools()
+
+    latencies.sort()
+    print(f'rounds={get_password_hasher().rounds} requests={requests} concurrency={concurrency}')
+    print(f'throughput: {requests / elapsed:.1f} logins/s')
+    print(f'latency: p50={statistics.median(latencies):.3f}s p99={latencies[int(len(latencies) * 0.99) - 1]:.3f}s')
+    print(f'max event loop stall: {max(lags, default=0):.3f}s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(requests=args.requests, concurrency=args.concurrency))
@@ -1,40 +1,21 @@
-import pytest
-from passlib.context import CryptContext
-from pydantic import SecretStr
-from pytest_mock import MockerFixture
+from app.core.init_app import settings
+from app.lib.passwords import hash_password, verify_and_update_password
 
-from app.apps.users.models import Users
-from app.lib.utils import pwd_context
 
+def test_verify_password_returns_true_for_correct_pass() -> None:
+    hashed_pass = hash_password('password', settings.PASSWORD_HASH_ROUNDS)
 
-@pytest.mark.asyncio
-async def test_users_verify_password_returns_true_for_correct_pass() -> None:
-    test_pass = pwd_context.hash('password')
+    assert verify_and_update_password('password', hashed_pass, settings.PASSWORD_HASH_ROUNDS) == (True, None)
 
-    user = Users()
-    user.username = 'test_user'
-    user.hashed_pass = test_pass
 
-    assert user.verify_password(SecretStr('password')) is True
+def test_verify_password_returns_false_for_incorrect_pass() -> None:
+    hashed_pass = hash_password('password_test', settings.PASSWORD_HASH_ROUNDS)
 
+    assert verify_and_update_password('password', hashed_pass, settings.PASSWORD_HASH_ROUNDS) == (False, None)
 
-@pytest.mark.asyncio
-async def test_users_verify_password_returns_false_for_incorrect_pass() -> None:
-    test_pass = pwd_context.hash('password_test')
 
-    user = Users()
-    user.username = 'test_user'
-    user.hashed_pass = test_pass
+def test_hash_password_is_salted() -> None:
+    hashed_pass = hash_password('password', settings.PASSWORD_HASH_ROUNDS)
 
-    assert user.verify_password(SecretStr('password')) is False
-
-
-@pytest.mark.asyncio
-async def test_users_has_password_sets_value_to_model(mocker: MockerFixture) -> None:
-    mocker.patch.object(CryptContext, 'hash', return_value='hashed_password')
-
-    user = Users()
-    user.username = 'test_user'
-
-    user.hash_password('password')
-    assert user.hashed_pass == 'hashed_password'
+    assert hashed_pass != 'password'
+    assert hashed_pass != hash_password('password', settings.PASSWORD_HASH_ROUNDS)
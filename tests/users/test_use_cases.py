@@ -3,12 +3,21 @@ from fastapi import HTTPException, Response
 from jose import JWTError
 from pydantic import SecretStr
 from pytest_mock import MockerFixture
+from sqlalchemy import update
 from starlette import status
 
+from app.apps.users.cache import LocalUserCache
 from app.apps.users.dtos import JWTToken, RegistrationData
 from app.apps.users.models import Users
-from app.apps.users.use_cases import AuthenticateUserUseCase, GetUserFromTokenUseCase, RegisterUserUseCase
+from app.apps.users.use_cases import (
+    AuthenticateUserUseCase,
+    GetUserFromTokenUseCase,
+    RegisterUserUseCase,
+    UpdatePhoneHashUseCase,
+)
+from app.core.db_config import AsyncSessionMaker
 from app.lib.classes import BadRequestException
+from app.lib.passwords import get_password_context, get_password_hasher, hash_password
 
 
 @pytest.mark.asyncio
@@ -79,6 +88,25 @@ async def test_authenticate_user_use_case_wrong_password(mocker: MockerFixture)
     assert exc_info.value.detail == 'Wrong credentials'
 
 
+@pytest.mark.asyncio
+async def test_authenticate_user_use_case_rehashes_password(mocker: MockerFixture) -> None:
+    user = await RegisterUserUseCase(RegistrationData(username='test_user', password='password', phone='123')).execute()
+    rounds = get_password_hasher().rounds
+    async with AsyncSessionMaker() as session:
+        await session.execute(
+            update(Users).where(Users.id == user.id).values(hashed_pass=hash_password('password', rounds + 1))
+        )
+        await session.commit()
+    mocker.patch.object(AuthenticateUserUseCase, '_create_access_token', return_value='test_token')
+
+    await AuthenticateUserUseCase(username='test_user', password=SecretStr('password')).execute()
+
+    async with AsyncSessionMaker() as session:
+        hashed_pass = (await session.get(Users, user.id)).hashed_pass
+    assert f'r={rounds}$' in hashed_pass
+    assert get_password_context(rounds).verify('password', hashed_pass)
+
+
 @pytest.mark.asyncio
 async def test_get_user_from_token_use_case_success(mocker) -> None:
     user = await RegisterUserUseCase(RegistrationData(username='test_user', password='password', phone='123')).execute()
@@ -91,6 +119,44 @@ async def test_get_user_from_token_use_case_success(mocker) -> None:
     assert result.id == user.id
 
 
+@pytest.mark.asyncio
+async def test_get_user_from_token_use_case_caches_user(mocker) -> None:
+    user = await RegisterUserUseCase(RegistrationData(username='test_user', password='password', phone='123')).execute()
+    mocker.patch('jose.jwt.decode', return_value={'sub': 'test_user'})
+    await GetUserFromTokenUseCase(token='token').execute()
+
+    session_maker = mocker.patch('app.apps.users.use_cases.AsyncSessionMaker')
+    cached_user = await GetUserFromTokenUseCase(token='token').execute()
+
+    assert cached_user.id == user.id
+    session_maker.assert_not_called()
+
+    await UpdatePhoneHashUseCase(user, 'phone_hash').execute()
+    mocker.stopall()
+    mocker.patch('jose.jwt.decode', return_value={'sub': 'test_user'})
+    updated_user = await GetUserFromTokenUseCase(token='token').execute()
+
+    assert updated_user.phone_hash == 'phone_hash'
+
+
+@pytest.mark.asyncio
+async def test_local_user_cache_evicts_expired_and_least_recently_used_users() -> None:
+    cache = LocalUserCache(max_size=2, ttl=60)
+    users = [Users(username=f'user{i}') for i in range(3)]
+    for user in users[:2]:
+        await cache.set(user)
+    await cache.get('user0')
+
+    await cache.set(users[2])
+
+    assert await cache.get('user1') is None
+    assert await cache.get('user0') is users[0]
+
+    expired_cache = LocalUserCache(max_size=2, ttl=-1)
+    await expired_cache.set(users[0])
+    assert await expired_cache.get('user0') is None
+
+
 @pytest.mark.asyncio
 async def test_get_user_from_token_use_case_failure_jwt_error(mocker) -> None:
     mocker.patch('jose.jwt.decode', side_effect=JWTError)